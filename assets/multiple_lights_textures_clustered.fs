@@ -0,0 +1,99 @@
+#version 330 core
+
+in vec3 fragNormal;
+in vec3 fragPosition;
+in vec2 fragTexCoords;
+
+out vec4 fragColor;
+
+struct Material {
+    vec3 ambient;
+    vec3 diffuse;
+    vec3 specular;
+    float shininess;
+};
+
+uniform vec3 viewPosition;
+uniform mat4 view;
+uniform mat4 projection;
+
+// Lights binned by grafica.light_clusters.LightClusters, each light takes 5 texels of lights:
+// position + constant, direction + linear, diffuse + quadratic, specular + cutOff, outerCutOff
+uniform samplerBuffer lights;
+// Offset and length of the list of lights of each cluster, the lists are stored one after the other in lightIndices
+uniform usamplerBuffer clusters;
+uniform usamplerBuffer lightIndices;
+
+uniform ivec3 clusterGrid;
+uniform float clusterNear;
+uniform float clusterFar;
+
+// Ambient terms are not attenuated, the ones of all the lights are added on the CPU
+uniform vec3 ambient;
+
+uniform Material material;
+
+uniform sampler2D samplerTex;
+
+int ClusterIndex(vec3 fragPos);
+vec3 CalcLight(int light, vec3 normal, vec3 fragPos, vec3 viewDir);
+
+void main(){
+    vec3 norm = normalize(fragNormal);
+    vec3 viewDir = normalize(viewPosition - fragPosition);
+
+    vec3 result = ambient;
+
+    uvec2 cluster = texelFetch(clusters, ClusterIndex(fragPosition)).xy;
+    for(uint i = 0u; i < cluster.y; i++)
+        result += CalcLight(int(texelFetch(lightIndices, int(cluster.x + i)).x), norm, fragPosition, viewDir);
+
+    vec4 fragOriginalColor = texture(samplerTex, fragTexCoords);
+    vec3 resultFinal = result * fragOriginalColor.rgb;
+
+    fragColor = vec4(resultFinal, 1.0);
+
+}
+
+// cluster of the fragment: screen tile and exponential depth slice, numbered as in LightClusters
+int ClusterIndex(vec3 fragPos)
+{
+    vec4 viewPos = view * vec4(fragPos, 1.0);
+    vec4 clipPos = projection * viewPos;
+    vec2 ndc = clipPos.xy / clipPos.w;
+    ivec2 tile = clamp(ivec2(floor((ndc * 0.5 + 0.5) * vec2(clusterGrid.xy))), ivec2(0), clusterGrid.xy - 1);
+    float slice = log(-viewPos.z / clusterNear) / log(clusterFar / clusterNear) * float(clusterGrid.z);
+    int z = clamp(int(floor(slice)), 0, clusterGrid.z - 1);
+    return (z * clusterGrid.y + tile.y) * clusterGrid.x + tile.x;
+}
+
+// calculates the diffuse and specular color of a spot light, point lights are spot lights with a cone never cutting them
+vec3 CalcLight(int light, vec3 normal, vec3 fragPos, vec3 viewDir)
+{
+    vec4 positionConstant = texelFetch(lights, 5 * light);
+    vec4 directionLinear = texelFetch(lights, 5 * light + 1);
+    vec4 diffuseQuadratic = texelFetch(lights, 5 * light + 2);
+    vec4 specularCutOff = texelFetch(lights, 5 * light + 3);
+    float outerCutOff = texelFetch(lights, 5 * light + 4).x;
+
+    vec3 lightDir = normalize(positionConstant.xyz - fragPos);
+    // diffuse shading
+    float diff = max(dot(normal, lightDir), 0.0);
+    // specular shading
+    vec3 reflectDir = reflect(-lightDir, normal);
+    float spec = pow(max(dot(viewDir, reflectDir), 0.0), material.shininess);
+    // attenuation
+    float distance = length(positionConstant.xyz - fragPos);
+    float attenuation = 1.0 / (positionConstant.w + directionLinear.w * distance + diffuseQuadratic.w * (distance * distance));
+    // spotlight intensity
+    float theta = dot(lightDir, normalize(-directionLinear.xyz));
+    float epsilon = specularCutOff.w - outerCutOff;
+    float intensity = clamp((theta - outerCutOff) / epsilon, 0.0, 1.0);
+    // combine results
+    vec3 diffuse = diffuseQuadratic.rgb * diff;
+    vec3 specular = specularCutOff.rgb * spec;
+
+    diffuse *= attenuation * intensity;
+    specular *= attenuation * intensity;
+    return (diffuse + specular);
+}
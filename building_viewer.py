@@ -1,7 +1,6 @@
 # coding=utf-8
 
 import glfw
-import copy
 from OpenGL.GL import *
 import numpy as np
 import sys
@@ -15,6 +14,11 @@ import grafica.lighting_shaders as ls
 from grafica.assets_path import getAssetPath
 import tarea2modelos as modelo
 import grafica.scene_graph as sg
+import grafica.draw_queue as dq
+import grafica.uniform_blocks as ub
+import grafica.texture_loader as tl
+import grafica.texture_atlas as ta
+import grafica.texture_cache as tc
 
 LIGHT_FLAT = 0
 LIGHT_GOURAUD = 1
@@ -34,9 +38,24 @@ WILLIS_TOWER = 0
 EMPIRE_STATE = 1
 BURJ_AL_ARAB = 2
 
+# Sky color and lights (La, Ld, Ls) at day and at night, the ambient light of the day depends on the building
+SKY_DAY = (135 / 255, 206 / 255, 235 / 255)
+SKY_NIGHT = (42 / 255, 42 / 255, 53 / 255)
+
+LIGHTS_NIGHT = ((0.2, 0.2, 0.3), (0.3, 0.3, 0.35), (0.4, 0.4, 0.4))
+LIGHTS_DAY = {
+    WILLIS_TOWER: ((0.9, 0.94, 0.96), (1.0, 1.0, 1.0), (1.0, 1.0, 1.0)),
+    EMPIRE_STATE: ((0.9, 0.94, 0.96), (1.0, 1.0, 1.0), (1.0, 1.0, 1.0)),
+    BURJ_AL_ARAB: ((0.99, 0.81, 0.27), (1.0, 1.0, 1.0), (1.0, 1.0, 1.0)),
+}
+
 def linear_interpol(t, a, b):
     return a * t + b * (1 - t)
 
+
+def interpolateColor(t, a, b):
+    return tuple(linear_interpol(t, x, y) for x, y in zip(a, b))
+
 # A class to store the application control
 class Controller:
     def __init__(self):
@@ -184,7 +203,8 @@ if __name__ == "__main__":
     # Resize window
     def window_resize(window, width, height):
         glViewport(0, 0, width, height)
-        glUniformMatrix4fv(glGetUniformLocation(lightingPipeline.shaderProgram, "projection"), 1, GL_TRUE, projection)
+        camera.set("projection", projection)
+        camera.upload()
 
     glfw.make_context_current(window)
 
@@ -222,43 +242,82 @@ if __name__ == "__main__":
     # Note: the vertex attribute layout (stride) is the same for the 3 lighting pipelines in
     # this case: flatPipeline, gouraudPipeline and phongPipeline. Hence, the VAO setup can
     # be the same.
+    # Images are decoded in other threads while the rest is set up, and uploaded along the first frames
+    textureLoader = tl.defaultLoader()
+
+    # Every building texture is packed into one atlas, so each building is baked into a single draw call.
+    # Buildings are mostly seen from afar, so the atlas is sampled from mipmaps
+    atlas = ta.TextureAtlas([getAssetPath("dice" + str(i) + ".jpg") for i in range(2, 7)])
+
     shapeDice = createDice()
-    gpuDice = createGPUShape(textureGouraudPipeline, shapeDice)
-    gpuDice.texture = es.textureSimpleSetup(
-        getAssetPath("dice2.jpg"), GL_REPEAT, GL_REPEAT, GL_LINEAR, GL_LINEAR)
+    gpuDice = modelo.createTexturedGPUShape(textureGouraudPipeline, shapeDice, getAssetPath("dice2.jpg"), atlas)
     
     willisTower = modelo.createWillisTower(gpuDice)
 
 
-    # Since the only difference between both dices is the texture, we can just use the same
-    # GPU data, but with another texture.
-    # copy.deepcopy generate a true copy, so if we change gpuDiceBlue.texture (or any other
-    # member), we will not change gpuDice.texture
-    gpuDice3 = copy.deepcopy(gpuDice)
-    gpuDice3.texture = es.textureSimpleSetup(
-        getAssetPath("dice3.jpg"), GL_REPEAT, GL_REPEAT, GL_LINEAR, GL_LINEAR)
+    # The dices only differ in their texture, so each one has the texture coordinates
+    # of its own image in the atlas
+    gpuDice3 = modelo.createTexturedGPUShape(textureGouraudPipeline, shapeDice, getAssetPath("dice3.jpg"), atlas)
 
     empireState = modelo.createEmpireState(gpuDice3)
     
-    gpuDice4 = copy.deepcopy(gpuDice)
-    gpuDice4.texture = es.textureSimpleSetup(
-        getAssetPath("dice4.jpg"), GL_REPEAT, GL_REPEAT, GL_LINEAR, GL_LINEAR)
+    gpuDice4 = modelo.createTexturedGPUShape(textureGouraudPipeline, shapeDice, getAssetPath("dice4.jpg"), atlas)
     
     
     
-    burjAlArab = modelo.createBurjAlArab(gpuDice4, texturePhongPipeline)
+    burjAlArab = modelo.createBurjAlArab(gpuDice4, texturePhongPipeline, atlas)
     
     floor = modelo.create_floor(texturePhongPipeline)
+
+    # The buildings never change, so each one is baked into one draw call per texture.
+    # Phong transforms the normals with the model matrix, while Flat and Gouraud use them
+    # as they are, hence each building is baked once for each case.
+    def bakeBuilding(building):
+        return sg.bakeSceneGraphNode(building, texturePhongPipeline, 8, 5), \
+               sg.bakeSceneGraphNode(building, textureGouraudPipeline, 8)
+
+    bakedWillisTower = bakeBuilding(willisTower)
+    bakedEmpireState = bakeBuilding(empireState)
+    bakedBurjAlArab = bakeBuilding(burjAlArab)
     
     t0 = glfw.get_time()
     camera_theta = np.pi / 4
     cameraZ = 0
 
+    # Camera and lighting parameters, shared by the three lighting pipelines
+    camera = ub.cameraBlock()
+    lighting = ub.lightingBlock()
+
+    # Object is barely visible at only ambient. Bright white for diffuse and specular components.
+    lighting.set("Ka", (0.2, 0.2, 0.2))
+    lighting.set("Kd", (0.9, 0.9, 0.9))
+    lighting.set("Ks", (1.0, 1.0, 1.0))
+
+    # TO DO: Explore different parameter combinations to understand their effect!
+
+    lighting.set("lightPosition", (2, 2, 4))
+    lighting.set("shininess", 100)
+
+    lighting.set("constantAttenuation", 0.0001)
+    lighting.set("linearAttenuation", 0.03)
+    lighting.set("quadraticAttenuation", 0.01)
+
+    # Draws are collected along the frame and issued with the minimum number of binds
+    queue = dq.DrawQueue()
+    lastReport = ""
+
+    # Camera matrices are written in place on every frame
+    projection = np.empty((4, 4), dtype=np.float32)
+    view = np.empty((4, 4), dtype=np.float32)
+
     while not glfw.window_should_close(window):
 
         # Using GLFW to check for input events
         glfw.poll_events()
 
+        # Uploading the images already decoded, textures still loading show a placeholder
+        textureLoader.update()
+
         # Getting the time difference from the previous iteration
         t1 = glfw.get_time()
         dt = t1 - t0
@@ -280,10 +339,10 @@ if __name__ == "__main__":
 
         # Selecting projection
         if controller.projection == PERSPECTIVE:
-          projection = tr.perspective(45, float(width) / float(height), 0.1, 100)
+          projection = tr.perspective(45, float(width) / float(height), 0.1, 100, out=projection)
           
         elif controller.projection == ORTHOGRAPHIC:
-          projection = tr.ortho(1 * -float(width) / float(height), 1 * float(width) / float(height), -1, 1, 0.1, 100)
+          projection = tr.ortho(1 * -float(width) / float(height), 1 * float(width) / float(height), -1, 1, 0.1, 100, out=projection)
           
         # Selecting view
         
@@ -291,55 +350,60 @@ if __name__ == "__main__":
           camX = 0
           camY = -3
           camZ = 0.5
-          viewPos = np.array([camX, camY, camZ])
+          viewPos = (camX, camY, camZ)
           view = tr.lookAt(
             viewPos,
-            np.array([0, 0, camZ]),
-            np.array([0, 0, 1])
+            (0, 0, camZ),
+            (0, 0, 1),
+            out=view
         )
           
         elif controller.view == VIEW_2:
           camX = 3 * np.sin(camera_theta)
           camY = 3 * np.cos(camera_theta)
           camZ = cameraZ
-          viewPos = np.array([camX, camY, camZ])
+          viewPos = (camX, camY, camZ)
           view = tr.lookAt(
             viewPos,
-            np.array([0, 0, 0]),
-            np.array([0, 0, 1])
+            (0, 0, 0),
+            (0, 0, 1),
+            out=view
         )
           
         elif controller.view == VIEW_3:
           camX = 1
           camY = 0
           camZ = 3
-          viewPos = np.array([camX, camY, camZ])
+          viewPos = (camX, camY, camZ)
           view = tr.lookAt(
             viewPos,
-            np.array([0, 0, 0]),
-            np.array([0, 0, 1])
+            (0, 0, 0),
+            (0, 0, 1),
+            out=view
         )
           
         elif controller.view == VIEW_4:
           camX = 0.00000001
           camY = 0.00000001
           camZ = 3
-          viewPos = np.array([camX, camY, camZ])
+          viewPos = (camX, camY, camZ)
           view = tr.lookAt(
             viewPos,
-            np.array([0, 0, 0]),
-            np.array([0, 0, 1])
+            (0, 0, 0),
+            (0, 0, 1),
+            out=view
         )
           
         elif controller.view == VIEW_5:
           camX = 2 * np.sin(camera_theta)
           camY = 2 * np.cos(camera_theta)
           camZ = cameraZ
-          viewPos = np.array([camX, camY, camZ])
+          viewPos = (camX, camY, camZ)
           view = tr.lookAt(
             viewPos,
-            np.array([0, 0, camZ]),
-            np.array([0, 0, 1])
+            (0, 0, camZ),
+            (0, 0, 1),
+            out=view
         )
 
 
@@ -357,10 +421,9 @@ if __name__ == "__main__":
         # The axis is drawn without lighting effects
         if controller.showAxis:
             glUseProgram(colorPipeline.shaderProgram)
-            glUniformMatrix4fv(glGetUniformLocation(colorPipeline.shaderProgram, "projection"), 1, GL_TRUE, projection)
-            glUniformMatrix4fv(glGetUniformLocation(colorPipeline.shaderProgram, "view"), 1, GL_TRUE, view)
-            glUniformMatrix4fv(glGetUniformLocation(colorPipeline.shaderProgram, "model"), 1, GL_TRUE, tr.identity())
-            colorPipeline.drawCall(gpuAxis, GL_LINES)
+            glUniformMatrix4fv(colorPipeline.uniformLocation("projection"), 1, GL_TRUE, projection)
+            glUniformMatrix4fv(colorPipeline.uniformLocation("view"), 1, GL_TRUE, view)
+            queue.submit(colorPipeline, gpuAxis, tr.identity(), "model", GL_LINES)
 
         # Selecting the lighting shader program
         if controller.lightingModel == LIGHT_FLAT:
@@ -372,204 +435,62 @@ if __name__ == "__main__":
         else:
             raise Exception()
 
-        glUseProgram(lightingPipeline.shaderProgram)         
-
-
-        # Drawing
-        
-        if controller.building == WILLIS_TOWER:
-          if controller.day:
-              glClearColor(linear_interpol(time,135/255,42/255), linear_interpol(time,206/255,42/255), linear_interpol(time,235/255,53/255), 1.0) 
-              
-              
-              # Setting all uniform shader variables
-              # linear_interpol(time_frames[time_index],0.1,1.0)
-              # White light in all components: ambient, diffuse and specular.
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "La"), linear_interpol(time,0.9,0.2), linear_interpol(time,0.94,0.2), linear_interpol(time,0.96,0.3))
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ld"), linear_interpol(time,1.0,0.3), linear_interpol(time,1.0,0.3), linear_interpol(time,1.0,0.35))
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ls"), linear_interpol(time,1.0,0.4), linear_interpol(time,1.0,0.4), linear_interpol(time,1.0,0.4))
-
-              # Object is barely visible at only ambient. Bright white for diffuse and specular components.
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ka"), 0.2, 0.2, 0.2)
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Kd"), 0.9, 0.9, 0.9)
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ks"), 1.0, 1.0, 1.0)
-
-              # TO DO: Explore different parameter combinations to understand their effect!
-
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "lightPosition"), 2, 2, 4)
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "viewPosition"), viewPos[0], viewPos[1],
-                          viewPos[2])
-              glUniform1ui(glGetUniformLocation(lightingPipeline.shaderProgram, "shininess"), 100)
-
-              glUniform1f(glGetUniformLocation(lightingPipeline.shaderProgram, "constantAttenuation"), 0.0001)
-              glUniform1f(glGetUniformLocation(lightingPipeline.shaderProgram, "linearAttenuation"), 0.03)
-              glUniform1f(glGetUniformLocation(lightingPipeline.shaderProgram, "quadraticAttenuation"), 0.01)
-          
-          elif not controller.day:
-              glClearColor(linear_interpol(time,42/255,135/255), linear_interpol(time,42/255,206/255), linear_interpol(time,53/255,235/255), 1.0)
-              # Setting all uniform shader variables
-
-              # White light in all components: ambient, diffuse and specular.
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "La"), linear_interpol(time,0.2,0.9), linear_interpol(time,0.2,0.94), linear_interpol(time,0.3,0.96))
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ld"), linear_interpol(time,0.3,1.0), linear_interpol(time,0.3,1.0), linear_interpol(time,0.35,1.0))
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ls"), linear_interpol(time,0.4,1.0),  linear_interpol(time,0.4,1.0),  linear_interpol(time,0.4,1.0))
-
-              # Object is barely visible at only ambient. Bright white for diffuse and specular components.
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ka"), 0.2, 0.2, 0.2)
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Kd"), 0.9, 0.9, 0.9)
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ks"), 1.0, 1.0, 1.0)
+        bakedVersion = 0 if controller.lightingModel == LIGHT_PHONG else 1
 
-              # TO DO: Explore different parameter combinations to understand their effect!
-
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "lightPosition"), 2, 2, 4)
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "viewPosition"), viewPos[0], viewPos[1],
-                          viewPos[2])
-              glUniform1ui(glGetUniformLocation(lightingPipeline.shaderProgram, "shininess"), 100)
+        # Sky and lights go from night to day, or from day to night. Every lighting pipeline reads them
+        # from the same uniform blocks, so switching pipelines does not send anything again
+        if controller.day:
+            first, last = (SKY_DAY, LIGHTS_DAY[controller.building]), (SKY_NIGHT, LIGHTS_NIGHT)
+        else:
+            first, last = (SKY_NIGHT, LIGHTS_NIGHT), (SKY_DAY, LIGHTS_DAY[controller.building])
 
-              glUniform1f(glGetUniformLocation(lightingPipeline.shaderProgram, "constantAttenuation"), 0.0001)
-              glUniform1f(glGetUniformLocation(lightingPipeline.shaderProgram, "linearAttenuation"), 0.03)
-              glUniform1f(glGetUniformLocation(lightingPipeline.shaderProgram, "quadraticAttenuation"), 0.01)
-              
+        glClearColor(*interpolateColor(time, first[0], last[0]), 1.0)
+        for name, firstLight, lastLight in zip(["La", "Ld", "Ls"], first[1], last[1]):
+            lighting.set(name, interpolateColor(time, firstLight, lastLight))
+        lighting.upload()
 
+        camera.set("projection", projection)
+        camera.set("view", view)
+        camera.set("viewPosition", viewPos)
+        camera.upload()
 
-          
-          ##
-          glUniformMatrix4fv(glGetUniformLocation(lightingPipeline.shaderProgram, "projection"), 1, GL_TRUE, projection)
-          glUniformMatrix4fv(glGetUniformLocation(lightingPipeline.shaderProgram, "view"), 1, GL_TRUE, view)    
-          sg.drawSceneGraphNode(willisTower, lightingPipeline, "model")
-          sg.drawSceneGraphNode(floor, lightingPipeline, "model")
-          
+        # Drawing
+        if controller.building == WILLIS_TOWER:
+            queue.submitSceneGraphNode(bakedWillisTower[bakedVersion], lightingPipeline, "model")
         elif controller.building == EMPIRE_STATE:
-          if controller.day:
-              glClearColor(linear_interpol(time,135/255,42/255), linear_interpol(time,206/255,42/255), linear_interpol(time,235/255,53/255), 1.0) 
-              
-              
-              # Setting all uniform shader variables
-              # linear_interpol(time_frames[time_index],0.1,1.0)
-              # White light in all components: ambient, diffuse and specular.
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "La"), linear_interpol(time,0.9,0.2), linear_interpol(time,0.94,0.2), linear_interpol(time,0.96,0.3))
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ld"), linear_interpol(time,1.0,0.3), linear_interpol(time,1.0,0.3), linear_interpol(time,1.0,0.35))
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ls"), linear_interpol(time,1.0,0.4), linear_interpol(time,1.0,0.4), linear_interpol(time,1.0,0.4))
-
-              # Object is barely visible at only ambient. Bright white for diffuse and specular components.
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ka"), 0.2, 0.2, 0.2)
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Kd"), 0.9, 0.9, 0.9)
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ks"), 1.0, 1.0, 1.0)
-
-              # TO DO: Explore different parameter combinations to understand their effect!
-
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "lightPosition"), 2, 2, 4)
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "viewPosition"), viewPos[0], viewPos[1],
-                          viewPos[2])
-              glUniform1ui(glGetUniformLocation(lightingPipeline.shaderProgram, "shininess"), 100)
-
-              glUniform1f(glGetUniformLocation(lightingPipeline.shaderProgram, "constantAttenuation"), 0.0001)
-              glUniform1f(glGetUniformLocation(lightingPipeline.shaderProgram, "linearAttenuation"), 0.03)
-              glUniform1f(glGetUniformLocation(lightingPipeline.shaderProgram, "quadraticAttenuation"), 0.01)
-          
-          elif not controller.day:
-              glClearColor(linear_interpol(time,42/255,135/255), linear_interpol(time,42/255,206/255), linear_interpol(time,53/255,235/255), 1.0)
-              # Setting all uniform shader variables
-
-              # White light in all components: ambient, diffuse and specular.
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "La"), linear_interpol(time,0.2,0.9), linear_interpol(time,0.2,0.94), linear_interpol(time,0.3,0.96))
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ld"), linear_interpol(time,0.3,1.0), linear_interpol(time,0.3,1.0), linear_interpol(time,0.35,1.0))
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ls"), linear_interpol(time,0.4,1.0),  linear_interpol(time,0.4,1.0),  linear_interpol(time,0.4,1.0))
-
-              # Object is barely visible at only ambient. Bright white for diffuse and specular components.
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ka"), 0.2, 0.2, 0.2)
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Kd"), 0.9, 0.9, 0.9)
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ks"), 1.0, 1.0, 1.0)
-
-              # TO DO: Explore different parameter combinations to understand their effect!
-
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "lightPosition"), 2, 2, 4)
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "viewPosition"), viewPos[0], viewPos[1],
-                          viewPos[2])
-              glUniform1ui(glGetUniformLocation(lightingPipeline.shaderProgram, "shininess"), 100)
-
-              glUniform1f(glGetUniformLocation(lightingPipeline.shaderProgram, "constantAttenuation"), 0.0001)
-              glUniform1f(glGetUniformLocation(lightingPipeline.shaderProgram, "linearAttenuation"), 0.03)
-              glUniform1f(glGetUniformLocation(lightingPipeline.shaderProgram, "quadraticAttenuation"), 0.01)
-              
-
-
-          
-          ##
-          glUniformMatrix4fv(glGetUniformLocation(lightingPipeline.shaderProgram, "projection"), 1, GL_TRUE, projection)
-          glUniformMatrix4fv(glGetUniformLocation(lightingPipeline.shaderProgram, "view"), 1, GL_TRUE, view)    
-          sg.drawSceneGraphNode(empireState, lightingPipeline, "model")
-          sg.drawSceneGraphNode(floor, lightingPipeline, "model")
-          
+            queue.submitSceneGraphNode(bakedEmpireState[bakedVersion], lightingPipeline, "model")
         elif controller.building == BURJ_AL_ARAB:
-          if controller.day:
-              glClearColor(linear_interpol(time,135/255,42/255), linear_interpol(time,206/255,42/255), linear_interpol(time,235/255,53/255), 1.0)  
-              
-              
-              # Setting all uniform shader variables
-              # linear_interpol(time_frames[time_index],0.1,1.0)
-              # White light in all components: ambient, diffuse and specular.
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "La"), linear_interpol(time,0.99,0.2), linear_interpol(time,0.81,0.2), linear_interpol(time,0.27,0.3))
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ld"), linear_interpol(time,1.0,0.3), linear_interpol(time,1.0,0.3), linear_interpol(time,1.0,0.35))
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ls"), linear_interpol(time,1.0,0.4), linear_interpol(time,1.0,0.4), linear_interpol(time,1.0,0.4))
-
-              # Object is barely visible at only ambient. Bright white for diffuse and specular components.
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ka"), 0.2, 0.2, 0.2)
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Kd"), 0.9, 0.9, 0.9)
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ks"), 1.0, 1.0, 1.0)
-
-              # TO DO: Explore different parameter combinations to understand their effect!
-
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "lightPosition"), 2, 2, 4)
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "viewPosition"), viewPos[0], viewPos[1],
-                          viewPos[2])
-              glUniform1ui(glGetUniformLocation(lightingPipeline.shaderProgram, "shininess"), 100)
-
-              glUniform1f(glGetUniformLocation(lightingPipeline.shaderProgram, "constantAttenuation"), 0.0001)
-              glUniform1f(glGetUniformLocation(lightingPipeline.shaderProgram, "linearAttenuation"), 0.03)
-              glUniform1f(glGetUniformLocation(lightingPipeline.shaderProgram, "quadraticAttenuation"), 0.01)
-          
-          elif not controller.day:
-              glClearColor(linear_interpol(time,42/255,135/255), linear_interpol(time,42/255,206/255), linear_interpol(time,53/255,235/255), 1.0)
-              # Setting all uniform shader variables
-
-              # White light in all components: ambient, diffuse and specular.
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "La"), linear_interpol(time,0.2,0.99), linear_interpol(time,0.2,0.81), linear_interpol(time,0.3,0.27))
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ld"), linear_interpol(time,0.3,1.0), linear_interpol(time,0.3,1.0), linear_interpol(time,0.35,1.0))
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ls"), linear_interpol(time,0.4,1.0),  linear_interpol(time,0.4,1.0),  linear_interpol(time,0.4,1.0))
+            queue.submitSceneGraphNode(bakedBurjAlArab[bakedVersion], lightingPipeline, "model")
 
-              # Object is barely visible at only ambient. Bright white for diffuse and specular components.
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ka"), 0.2, 0.2, 0.2)
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Kd"), 0.9, 0.9, 0.9)
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ks"), 1.0, 1.0, 1.0)
+        queue.submitSceneGraphNode(floor, lightingPipeline, "model")
 
-              # TO DO: Explore different parameter combinations to understand their effect!
-
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "lightPosition"), 2, 2, 4)
-              glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "viewPosition"), viewPos[0], viewPos[1],
-                          viewPos[2])
-              glUniform1ui(glGetUniformLocation(lightingPipeline.shaderProgram, "shininess"), 100)
-
-              glUniform1f(glGetUniformLocation(lightingPipeline.shaderProgram, "constantAttenuation"), 0.0001)
-              glUniform1f(glGetUniformLocation(lightingPipeline.shaderProgram, "linearAttenuation"), 0.03)
-              glUniform1f(glGetUniformLocation(lightingPipeline.shaderProgram, "quadraticAttenuation"), 0.01)
-              
-
-
-          
-          ##
-          glUniformMatrix4fv(glGetUniformLocation(lightingPipeline.shaderProgram, "projection"), 1, GL_TRUE, projection)
-          glUniformMatrix4fv(glGetUniformLocation(lightingPipeline.shaderProgram, "view"), 1, GL_TRUE, view)    
-          sg.drawSceneGraphNode(burjAlArab, lightingPipeline, "model")
-          sg.drawSceneGraphNode(floor, lightingPipeline, "model")
+        # Everything is drawn at once, sorted by program, texture and VAO
+        queue.flush()
 
+        # The savings of the queue are shown in the title whenever they change
+        report = str(queue.stats)
+        if report != lastReport:
+            glfw.set_window_title(window, "Building viewer - " + report)
+            lastReport = report
         
         # Once the drawing is rendered, buffers are swap so an uncomplete drawing is never seen.
         glfw.swap_buffers(window)
 
     # freeing GPU memory
+    textureLoader.clear()
     gpuAxis.clear()
-    gpuDice.clear()
-    gpuDice3.clear()
+
+    # Baked shapes and the floor are used once each. The dices (and the bases of the Burj Al Arab) appear
+    # many times in the buildings, so each one is cleared once
+    for bakedBuilding in bakedWillisTower + bakedEmpireState + bakedBurjAlArab:
+        bakedBuilding.clear()
+    floor.clear()
+    buildingShapes = {id(leaf): leaf for building in [willisTower, empireState, burjAlArab]
+                      for leaf, _ in sg.collectLeaves(building)}
+    for gpuShape in buildingShapes.values():
+        gpuShape.clear()
+
+    # Released textures stay in the cache to be reused, the atlas and the floor texture are deleted here
+    tc.defaultCache().clear()
 
     glfw.terminate()
@@ -0,0 +1,49 @@
+# coding=utf-8
+"""
+Benchmark: parsing meshes from text against loading them from the binary assets cache.
+"""
+
+import os.path
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import grafica.basic_shapes as bs
+import grafica.assets_cache as ac
+from grafica.assets_path import getAssetPath
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+
+def measure(function, *args):
+    t0 = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - t0, result
+
+
+if __name__ == "__main__":
+
+    meshes = [
+        ('cilinder_triangle_base.obj', bs.readOBJ, ()),
+        ('bender_pillar.obj', bs.readOBJ, ()),
+        ('suzanne.obj', bs.readOBJ, ()),
+        ('sphere.off', bs.readOFF, ((1.0, 1.0, 1.0),)),
+        ('Maze.off', bs.readOFF, ((1.0, 1.0, 1.0),)),
+        ('alfa2.off', bs.readOFF, ((1.0, 1.0, 1.0),)),
+    ]
+
+    ac.clearCache()
+
+    print(f"{'mesh':28s} {'parse':>10s} {'cold':>10s} {'warm':>10s}  identical")
+    for assetName, loader, args in meshes:
+        filename = getAssetPath(assetName)
+        parseTime, shape = measure(loader, filename, *args)
+        coldTime, _ = measure(ac.getCachedShape, filename, loader, *args)
+        warmTime, cachedShape = measure(ac.getCachedShape, filename, loader, *args)
+
+        identical = np.array_equal(np.asarray(shape.vertices, dtype=np.float32), cachedShape.vertices) \
+            and np.array_equal(np.asarray(shape.indices, dtype=np.uint32), cachedShape.indices)
+
+        print(f"{assetName:28s} {parseTime * 1000:7.2f} ms {coldTime * 1000:7.2f} ms {warmTime * 1000:7.2f} ms  {identical}")
@@ -0,0 +1,71 @@
+# coding=utf-8
+"""
+Benchmark: building N model matrices with the scalar functions of grafica.transformations in a Python loop,
+against the batched versions which return a (N, 4, 4) stack.
+"""
+
+import os.path
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import grafica.transformations as tr
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+
+def scalarLayout(x, y, theta, height):
+    return np.array([tr.matmul([tr.translate(x[i], y[i], 0), tr.rotationZ(theta[i]), tr.scale(0.5, 0.5, height[i])])
+                     for i in range(len(x))])
+
+
+def batchedLayout(x, y, theta, height):
+    return tr.matmulStacks([tr.translations(x, y, 0), tr.rotationsZ(theta), tr.scales(0.5, 0.5, height)])
+
+
+def timeIt(function, *args, repetitions=5):
+    best = float('inf')
+    for _ in range(repetitions):
+        t0 = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+if __name__ == "__main__":
+
+    rng = np.random.default_rng(0)
+
+    print("Single constructors")
+    print(f"{'N':>7s} {'function':>14s} {'scalar loop':>14s} {'batched':>12s} {'speedup':>9s}  identical")
+    for N in [100, 10000]:
+        theta = rng.uniform(0, 2 * np.pi, N)
+        values = rng.uniform(-10, 10, (3, N))
+
+        constructors = [
+            ('translate', lambda: [tr.translate(*v) for v in values.T], lambda: tr.translations(*values)),
+            ('scale', lambda: [tr.scale(*v) for v in values.T], lambda: tr.scales(*values)),
+            ('rotationZ', lambda: [tr.rotationZ(t) for t in theta], lambda: tr.rotationsZ(theta)),
+        ]
+        for name, scalar, batched in constructors:
+            scalarTime, scalarResult = timeIt(scalar)
+            batchedTime, batchedResult = timeIt(batched)
+            identical = np.array_equal(np.array(scalarResult), batchedResult)
+            print(f"{N:7d} {name:>14s} {scalarTime * 1000:11.3f} ms {batchedTime * 1000:9.3f} ms"
+                  f" {scalarTime / batchedTime:8.1f}x  {identical}")
+
+    print()
+    print("Building layout: translate @ rotationZ @ scale")
+    print(f"{'N':>7s} {'scalar loop':>14s} {'batched':>12s} {'speedup':>9s}  identical")
+    for N in [10, 100, 1000, 10000, 100000]:
+        x, y = rng.uniform(-100, 100, (2, N))
+        theta = rng.uniform(0, 2 * np.pi, N)
+        height = rng.uniform(1, 10, N)
+
+        scalarTime, scalarResult = timeIt(scalarLayout, x, y, theta, height, repetitions=1 if N > 10000 else 5)
+        batchedTime, batchedResult = timeIt(batchedLayout, x, y, theta, height)
+        identical = np.array_equal(scalarResult, batchedResult)
+        print(f"{N:7d} {scalarTime * 1000:11.3f} ms {batchedTime * 1000:9.3f} ms"
+              f" {scalarTime / batchedTime:8.1f}x  {identical}")
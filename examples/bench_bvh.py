@@ -0,0 +1,157 @@
+# coding=utf-8
+"""
+Benchmark: spatial queries over the leaves of synthetic scene graphs with 10^3 to 10^5 leaves,
+using a BVH against testing every leaf (vectorized with numpy, and exact ray picking over every candidate box).
+Only the CPU side copy of the shapes is used, so no OpenGL context is needed.
+"""
+
+import os.path
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import grafica.transformations as tr
+import grafica.basic_shapes as bs
+import grafica.gpu_shape as gs
+import grafica.scene_graph as sg
+import grafica.bvh as bvh
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+QUERIES = 50
+REFITS = 5
+K = 8
+
+
+def createCubeShape():
+    # The same data fillBuffers would keep, with the stride set by the lighting texture pipelines
+    shape = bs.createTextureNormalsCube("")
+    gpuShape = gs.GPUShape()
+    gpuShape.vertexData = np.array(shape.vertices, dtype=np.float32)
+    gpuShape.indexData = np.array(shape.indices, dtype=np.uint32)
+    gpuShape.size = len(shape.indices)
+    gpuShape.stride = 8
+    return gpuShape
+
+
+def createScene(gpuShape, leaves, rng):
+    # Blocks of 100 randomly placed, rotated and scaled parts, over a square of side proportional to sqrt(leaves)
+    side = np.sqrt(leaves) * 2
+    scene = sg.SceneGraphNode("scene")
+    for i in range(leaves // 100):
+        block = sg.SceneGraphNode("block_" + str(i))
+        x, y = rng.uniform(-side / 2, side / 2, 2)
+        block.transform = tr.translate(x, y, 0)
+        for j in range(100):
+            part = sg.SceneGraphNode("part_" + str(i) + "_" + str(j))
+            dx, dy, dz = rng.uniform(-5, 5, 3)
+            part.transform = tr.matmul([tr.translate(dx, dy, dz), tr.rotationZ(rng.uniform(0, np.pi)),
+                                        tr.scale(*rng.uniform(0.2, 1.0, 3))])
+            part.childs += [gpuShape]
+            block.childs += [part]
+        scene.childs += [block]
+    return scene, side
+
+
+def bruteFrustum(tree, viewProjection):
+    planes = tr.frustumPlanes(viewProjection)
+    boxMin, boxMax = tree.leafBoxes[:, 0], tree.leafBoxes[:, 1]
+    distances = np.matmul((boxMin + boxMax) * 0.5, planes[:, 0:3].T) + planes[:, 3]
+    radius = np.matmul((boxMax - boxMin) * 0.5, np.abs(planes[:, 0:3]).T)
+    return np.flatnonzero(~(distances < -radius).any(axis=1))
+
+
+def bruteRay(tree, origin, direction):
+    # Every box is tested, then the exact test of the BVH runs over the candidates
+    with np.errstate(divide='ignore'):
+        inverse = 1.0 / direction
+    hit, near = bvh._rayBoxes(origin, inverse, tree.leafBoxes[:, 0], tree.leafBoxes[:, 1], np.inf)
+    best = None
+    for leaf in np.flatnonzero(hit)[np.argsort(near[hit], kind='stable')]:
+        if best is not None and near[leaf] > best[1]:
+            break
+        world = tree.scene.worldTransforms[tree.scene.leaves[leaf][0]]
+        local = np.linalg.inv(world)
+        t = bvh._rayTriangles(np.matmul(local[0:3, 0:3], origin) + local[0:3, 3], np.matmul(local[0:3, 0:3], direction),
+                              tree._leafTriangles(tree.scene.leaves[leaf][1]))
+        if t < np.inf and (best is None or t <= best[1]):
+            best = (int(leaf), float(t))
+    return best
+
+
+def bruteNearest(tree, point, k):
+    distances = bvh._boxDistances(point, tree.leafBoxes[:, 0], tree.leafBoxes[:, 1])
+    leaves = np.argsort(distances, kind='stable')[:k]
+    return leaves, distances[leaves]
+
+
+def timeQueries(function, queries):
+    t0 = time.perf_counter()
+    results = [function(*query) for query in queries]
+    return (time.perf_counter() - t0) / len(queries), results
+
+
+if __name__ == "__main__":
+
+    rng = np.random.default_rng(0)
+    gpuShape = createCubeShape()
+
+    print(f"{'leaves':>7s} {'build':>9s} {'refit all':>10s} {'refit one':>10s}"
+          f" {'query':>9s} {'linear':>10s} {'bvh':>10s} {'speedup':>8s}  same results")
+
+    for leaves in [1000, 10000, 100000]:
+        scene, side = createScene(gpuShape, leaves, rng)
+        compiled = sg.CompiledSceneGraph(scene)
+
+        t0 = time.perf_counter()
+        tree = bvh.BVH(compiled)
+        buildTime = time.perf_counter() - t0
+
+        # Moving the whole scene, every box changes
+        t0 = time.perf_counter()
+        for _ in range(REFITS):
+            scene.transform = tr.matmul([tr.translate(0.01, 0, 0), scene.transform])
+            compiled.markDirty(scene)
+            tree.refit()
+        refitAllTime = (time.perf_counter() - t0) / REFITS
+
+        # Moving one block of parts, as a building being dragged
+        block = scene.childs[0]
+        t0 = time.perf_counter()
+        for _ in range(QUERIES):
+            block.transform = tr.matmul([tr.translate(0.01, 0, 0), block.transform])
+            compiled.markDirty(block)
+            tree.refit()
+        refitOneTime = (time.perf_counter() - t0) / QUERIES
+
+        rays = []
+        for _ in range(QUERIES):
+            origin = np.array([*rng.uniform(-side / 2, side / 2, 2), 20.0])
+            target = np.array([*rng.uniform(-side / 2, side / 2, 2), 0.0])
+            rays += [(origin, (target - origin) / np.linalg.norm(target - origin))]
+
+        frustums = []
+        for _ in range(QUERIES):
+            eye = np.array([*rng.uniform(-side / 2, side / 2, 2), 3.0])
+            theta = rng.uniform(0, 2 * np.pi)
+            view = tr.lookAt(eye, eye + np.array([np.cos(theta), np.sin(theta), -0.2]), np.array([0, 0, 1]))
+            frustums += [(np.matmul(tr.perspective(60, 16 / 9, 0.1, 30), view),)]
+
+        points = [(np.array([*rng.uniform(-side / 2, side / 2, 2), 0.0]), K) for _ in range(QUERIES)]
+
+        queries = [
+            ("ray", rays, lambda o, d: bruteRay(tree, o, d), tree.rayQuery,
+             lambda a, b: a == b or (a is not None and b is not None and abs(a[1] - b[1]) < 1e-9)),
+            ("frustum", frustums, lambda vp: bruteFrustum(tree, vp), tree.frustumQuery, np.array_equal),
+            (f"{K} nearest", points, lambda p, k: bruteNearest(tree, p, k), tree.nearestQuery,
+             lambda a, b: np.allclose(a[1], b[1])),
+        ]
+
+        for name, arguments, linear, query, same in queries:
+            linearTime, linearResults = timeQueries(linear, arguments)
+            bvhTime, bvhResults = timeQueries(query, arguments)
+            allSame = all(same(a, b) for a, b in zip(linearResults, bvhResults))
+            print(f"{leaves:7d} {buildTime * 1000:6.1f} ms {refitAllTime * 1000:7.2f} ms {refitOneTime * 1000:7.3f} ms"
+                  f" {name:>9s} {linearTime * 1000:7.3f} ms {bvhTime * 1000:7.3f} ms {linearTime / bvhTime:7.1f}x  {allSame}")
@@ -0,0 +1,120 @@
+# coding=utf-8
+"""
+Benchmark: a city lit by many street lamps with ClusteredLightTexturePhongShaderProgram, binning the lamps
+into 16x9x24 clusters against a single cluster, where every fragment evaluates every lamp in the frustum.
+Reports the CPU time binning the lamps, the frame time and the difference between both images.
+A hidden GLFW window provides the OpenGL context.
+"""
+
+import glfw
+from OpenGL.GL import *
+import os.path
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import grafica.transformations as tr
+import grafica.basic_shapes as bs
+import grafica.easy_shaders as es
+import grafica.lighting_shaders as ls
+import grafica.light_clusters as lc
+from grafica.assets_path import getAssetPath
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+WIDTH = 640
+HEIGHT = 360
+CITY_SIZE = 40
+FRAMES = 3
+
+
+def createLamps(count):
+    rng = np.random.default_rng(0)
+    positions = np.column_stack([rng.uniform(-CITY_SIZE / 2, CITY_SIZE / 2, (count, 2)), np.full(count, 0.6)])
+    return positions
+
+
+def measure(drawFrame):
+    # A first frame, so the measured ones are warm
+    drawFrame()
+    glFinish()
+    t0 = time.perf_counter()
+    for _ in range(FRAMES):
+        drawFrame()
+    glFinish()
+    elapsed = (time.perf_counter() - t0) / FRAMES
+    image = np.frombuffer(glReadPixels(0, 0, WIDTH, HEIGHT, GL_RGB, GL_UNSIGNED_BYTE), dtype=np.uint8)
+    return elapsed, image.astype(np.int32)
+
+
+if __name__ == "__main__":
+
+    if not glfw.init():
+        sys.exit("GLFW could not be initialized")
+
+    glfw.window_hint(glfw.VISIBLE, glfw.FALSE)
+    window = glfw.create_window(WIDTH, HEIGHT, "Clustered lights", None, None)
+    if not window:
+        glfw.terminate()
+        sys.exit("An OpenGL context could not be created")
+    glfw.make_context_current(window)
+    glEnable(GL_DEPTH_TEST)
+
+    pipeline = ls.ClusteredLightTexturePhongShaderProgram()
+
+    def createGPUShape(shape, textureName):
+        gpuShape = es.GPUShape().initBuffers()
+        pipeline.setupVAO(gpuShape)
+        gpuShape.fillBuffers(shape.vertices, shape.indices, GL_STATIC_DRAW)
+        gpuShape.texture = es.textureSimpleSetup(
+            getAssetPath(textureName), GL_REPEAT, GL_REPEAT, GL_LINEAR, GL_LINEAR)
+        return gpuShape
+
+    gpuBuilding = createGPUShape(bs.createTextureNormalsCube(""), "bricks.jpg")
+    gpuFloor = createGPUShape(bs.createTextureQuadWithNormal(CITY_SIZE, CITY_SIZE), "bricks.jpg")
+
+    models = [(gpuFloor, tr.uniformScale(CITY_SIZE))]
+    for i in range(-6, 7):
+        for j in range(-6, 7):
+            models += [(gpuBuilding, tr.translate(3 * i, 3 * j, 0.5))]
+
+    viewPosition = np.array([0.0, -22.0, 10.0])
+    view = tr.lookAt(viewPosition, np.array([0.0, 0.0, 0.0]), np.array([0.0, 0.0, 1.0]))
+    projection = tr.perspective(60, float(WIDTH) / float(HEIGHT), 0.1, 100)
+
+    def drawFrame(lightClusters):
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        lightClusters.update(view, projection)
+        glUseProgram(pipeline.shaderProgram)
+        pipeline.setLightClusters(lightClusters)
+        pipeline.setUniform("projection", projection)
+        pipeline.setUniform("view", view)
+        pipeline.setUniform("viewPosition", viewPosition)
+        pipeline.setUniform("material.shininess", 32.0)
+        for gpuShape, model in models:
+            pipeline.setUniform("model", model)
+            pipeline.drawCall(gpuShape)
+
+    print(f"{'lamps':>6s} {'binning':>10s} {'clustered':>12s} {'one cluster':>12s} {'speedup':>8s}"
+          f" {'lights/cluster':>15s} {'max diff':>9s} {'mean diff':>10s}")
+
+    for count in [64, 256, 1024]:
+        results = []
+        for grid in [(16, 9, 24), (1, 1, 1)]:
+            lightClusters = lc.LightClusters(grid)
+            lightClusters.setPointLights(createLamps(count), diffuse=(0.9, 0.7, 0.4), specular=(0.5, 0.5, 0.5),
+                                         ambient=(0.0005, 0.0005, 0.0005), constant=1.0, linear=0.5, quadratic=8.0)
+            frameTime, image = measure(lambda: drawFrame(lightClusters))
+            results += [(frameTime, image, lightClusters.stats.time, lightClusters.stats.averagePerCluster())]
+            lightClusters.clear()
+
+        (clusteredTime, clusteredImage, binTime, average), (singleTime, singleImage, _, _) = results
+        difference = np.abs(clusteredImage - singleImage)
+        print(f"{count:6d} {binTime * 1000:7.2f} ms {clusteredTime * 1000:9.1f} ms {singleTime * 1000:9.1f} ms"
+              f" {singleTime / clusteredTime:7.1f}x {average:15.1f} {difference.max():9d} {difference.mean():10.3f}")
+
+    gpuBuilding.clear()
+    gpuFloor.clear()
+    glfw.terminate()
@@ -0,0 +1,129 @@
+# coding=utf-8
+"""
+Benchmark: drawing a scene graph with thousands of nodes by traversing it on every frame (drawSceneGraphNode),
+against drawing its CompiledSceneGraph, where world transforms are cached and only dirty subtrees are recomputed.
+A hidden GLFW window provides the OpenGL context.
+"""
+
+import glfw
+from OpenGL.GL import *
+import os.path
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import grafica.transformations as tr
+import grafica.basic_shapes as bs
+import grafica.easy_shaders as es
+import grafica.lighting_shaders as ls
+import grafica.scene_graph as sg
+from grafica.assets_path import getAssetPath
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+FLOORS = 4
+FRAMES = 20
+
+
+def createCity(gpuShape, size):
+    # city -> building -> floor -> leaf, every building rotates a bit around its own axis
+    city = sg.SceneGraphNode("city")
+    for i in range(size):
+        for j in range(size):
+            building = sg.SceneGraphNode("building_" + str(i) + "_" + str(j))
+            building.transform = tr.matmul([tr.translate(i, j, 0), tr.rotationZ((i + j) * 0.1)])
+
+            for k in range(FLOORS):
+                floor = sg.SceneGraphNode("floor_" + str(i) + "_" + str(j) + "_" + str(k))
+                floor.transform = tr.matmul([tr.translate(0, 0, k * 0.5), tr.scale(0.5, 0.5, 0.4)])
+                floor.childs += [gpuShape]
+                building.childs += [floor]
+
+            city.childs += [building]
+    return city
+
+
+def timeFrames(drawFrame):
+    glFinish()
+    t0 = time.perf_counter()
+    for _ in range(FRAMES):
+        drawFrame()
+    glFinish()
+    return (time.perf_counter() - t0) / FRAMES
+
+
+def timeIt(function, repetitions=FRAMES):
+    t0 = time.perf_counter()
+    for _ in range(repetitions):
+        function()
+    return (time.perf_counter() - t0) / repetitions
+
+
+if __name__ == "__main__":
+
+    if not glfw.init():
+        sys.exit("GLFW could not be initialized")
+
+    glfw.window_hint(glfw.VISIBLE, glfw.FALSE)
+    window = glfw.create_window(64, 64, "Compiled scene graph", None, None)
+    if not window:
+        glfw.terminate()
+        sys.exit("An OpenGL context could not be created")
+    glfw.make_context_current(window)
+
+    pipeline = ls.SimpleTextureGouraudShaderProgram()
+
+    shape = bs.createTextureNormalsCube("")
+    gpuShape = es.GPUShape().initBuffers()
+    pipeline.setupVAO(gpuShape)
+    gpuShape.fillBuffers(shape.vertices, shape.indices, GL_STATIC_DRAW)
+    gpuShape.texture = es.textureSimpleSetup(
+        getAssetPath("bricks.jpg"), GL_REPEAT, GL_REPEAT, GL_LINEAR, GL_LINEAR)
+
+    glUseProgram(pipeline.shaderProgram)
+    pipeline.setUniform("projection", tr.perspective(45, 1, 0.1, 100))
+    pipeline.setUniform("view", tr.lookAt(np.array([-5, -5, 10]), np.array([10, 10, 0]), np.array([0, 0, 1])))
+
+    print(f"{'nodes':>7s} {'leaves':>7s} {'compile':>10s} {'traverse':>12s} {'compiled':>12s} {'speedup':>8s}"
+          f" {'matmuls':>10s} {'1 dirty':>10s} {'all dirty':>10s}  same transforms")
+
+    for size in [10, 20, 40, 60]:
+        city = createCity(gpuShape, size)
+
+        t0 = time.perf_counter()
+        compiled = sg.CompiledSceneGraph(city)
+        compileTime = time.perf_counter() - t0
+
+        # Leaves are found in the same order by both, so their world transforms can be compared
+        reference = np.array([transform for _, transform in sg.collectLeaves(city)], dtype=np.float32)
+        sameTransforms = np.allclose(reference, compiled.leafTransforms, atol=1e-6)
+
+        traverseTime = timeFrames(lambda: sg.drawSceneGraphNode(city, pipeline, "model"))
+        compiledTime = timeFrames(lambda: compiled.draw(pipeline, "model"))
+
+        # Moving a single building only recomputes its subtree
+        building = city.childs[len(city.childs) // 2]
+
+        def moveBuilding():
+            building.transform = tr.matmul([building.transform, tr.translate(0, 0, 0.01)])
+            compiled.markDirty(building)
+            compiled.update()
+
+        def moveCity():
+            city.transform = tr.matmul([city.transform, tr.translate(0, 0, 0.01)])
+            compiled.markDirty(city)
+            compiled.update()
+
+        # CPU time of composing the transforms on every frame, without any OpenGL call
+        matmulTime = timeIt(lambda: sg.collectLeaves(city))
+        oneDirtyTime = timeIt(moveBuilding)
+        allDirtyTime = timeIt(moveCity)
+
+        print(f"{len(compiled.nodes):7d} {len(compiled.leaves):7d} {compileTime * 1000:7.1f} ms"
+              f" {traverseTime * 1000:9.2f} ms {compiledTime * 1000:9.2f} ms {traverseTime / compiledTime:7.2f}x"
+              f" {matmulTime * 1000:7.2f} ms {oneDirtyTime * 1000:7.3f} ms {allDirtyTime * 1000:7.2f} ms  {sameTransforms}")
+
+    gpuShape.clear()
+    glfw.terminate()
@@ -0,0 +1,144 @@
+# coding=utf-8
+"""
+Benchmark: OpenGL calls issued to draw a scene graph whose leaves alternate between shapes and textures,
+drawing each leaf with drawCall (drawSceneGraphNode) against a DrawQueue sorted by state.
+The resulting images are compared too. A hidden GLFW window provides the OpenGL context.
+"""
+
+import glfw
+from OpenGL.GL import *
+import collections
+import os.path
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import grafica.transformations as tr
+import grafica.basic_shapes as bs
+import grafica.easy_shaders as es
+import grafica.lighting_shaders as ls
+import grafica.scene_graph as sg
+import grafica.draw_queue as dq
+from grafica.assets_path import getAssetPath
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+CITY_SIZE = 30
+SIZE = 256
+
+# Every OpenGL call made from these modules is counted
+COUNTED_MODULES = [ls, sg, dq]
+COUNTED_FUNCTIONS = ['glUseProgram', 'glBindVertexArray', 'glBindTexture', 'glUniformMatrix4fv', 'glDrawElements']
+
+counts = collections.Counter()
+
+
+def counting(name, function):
+    def wrapper(*args, **kwargs):
+        counts[name] += 1
+        return function(*args, **kwargs)
+    return wrapper
+
+
+def instrument():
+    for module in COUNTED_MODULES:
+        for name in COUNTED_FUNCTIONS:
+            setattr(module, name, counting(name, getattr(module, name)))
+
+
+def createCity(gpuShapes, size):
+    # Neighbour blocks never share shape and texture, so drawing them in order rebinds everything
+    city = sg.SceneGraphNode("city")
+    for i in range(size):
+        for j in range(size):
+            block = sg.SceneGraphNode("block_" + str(i) + "_" + str(j))
+            block.transform = tr.matmul([tr.translate(i - size / 2, j - size / 2, 0), tr.uniformScale(0.8)])
+            block.childs += [gpuShapes[(i + 2 * j) % len(gpuShapes)]]
+            city.childs += [block]
+    return city
+
+
+def setUniforms(pipeline):
+    glUseProgram(pipeline.shaderProgram)
+    for name, value in [("La", (1.0, 1.0, 1.0)), ("Ld", (1.0, 1.0, 1.0)), ("Ls", (1.0, 1.0, 1.0)),
+                        ("Ka", (0.2, 0.2, 0.2)), ("Kd", (0.9, 0.9, 0.9)), ("Ks", (1.0, 1.0, 1.0)),
+                        ("lightPosition", (0, 0, 20)), ("viewPosition", (20, 20, 20)),
+                        ("shininess", 100), ("constantAttenuation", 0.001),
+                        ("linearAttenuation", 0.01), ("quadraticAttenuation", 0.001)]:
+        pipeline.setUniform(name, value)
+    pipeline.setUniform("projection", tr.perspective(45, 1, 0.1, 100))
+    pipeline.setUniform("view", tr.lookAt(np.array([20, 20, 20]), np.array([0, 0, 0]), np.array([0, 0, 1])))
+
+
+def measure(drawFrame):
+    counts.clear()
+    glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+    glFinish()
+    t0 = time.perf_counter()
+    drawFrame()
+    glFinish()
+    elapsed = time.perf_counter() - t0
+    image = glReadPixels(0, 0, SIZE, SIZE, GL_RGB, GL_UNSIGNED_BYTE)
+    return elapsed, dict(counts), image
+
+
+if __name__ == "__main__":
+
+    if not glfw.init():
+        sys.exit("GLFW could not be initialized")
+
+    glfw.window_hint(glfw.VISIBLE, glfw.FALSE)
+    window = glfw.create_window(SIZE, SIZE, "Draw queue", None, None)
+    if not window:
+        glfw.terminate()
+        sys.exit("An OpenGL context could not be created")
+    glfw.make_context_current(window)
+    glEnable(GL_DEPTH_TEST)
+
+    pipeline = ls.SimpleTexturePhongShaderProgram()
+
+    def createGPUShape(shape, textureName):
+        gpuShape = es.GPUShape().initBuffers()
+        pipeline.setupVAO(gpuShape)
+        gpuShape.fillBuffers(shape.vertices, shape.indices, GL_STATIC_DRAW)
+        gpuShape.texture = es.textureSimpleSetup(
+            getAssetPath(textureName), GL_REPEAT, GL_REPEAT, GL_LINEAR, GL_LINEAR)
+        return gpuShape
+
+    gpuShapes = [createGPUShape(bs.createTextureNormalsCube(""), name) for name in ["bricks.jpg", "dice.jpg"]] + \
+                [createGPUShape(bs.createTextureQuadWithNormal(1, 1), name) for name in ["bricks.jpg", "dice.jpg"]]
+    city = createCity(gpuShapes, CITY_SIZE)
+    queue = dq.DrawQueue()
+
+    def drawFrameDrawCall():
+        setUniforms(pipeline)
+        sg.drawSceneGraphNode(city, pipeline, "model")
+
+    def drawFrameQueue():
+        setUniforms(pipeline)
+        queue.submitSceneGraphNode(city, pipeline, "model")
+        queue.flush()
+
+    instrument()
+
+    # A first frame of each kind, so both measurements are warm
+    measure(drawFrameDrawCall)
+    measure(drawFrameQueue)
+
+    drawCallTime, drawCallCounts, drawCallImage = measure(drawFrameDrawCall)
+    queueTime, queueCounts, queueImage = measure(drawFrameQueue)
+
+    print(f"Leaves: {CITY_SIZE * CITY_SIZE}, 2 shapes x 2 textures")
+    print(f"{'GL function':24s} {'drawCall':>9s} {'queue':>8s}")
+    for name in COUNTED_FUNCTIONS:
+        print(f"{name:24s} {drawCallCounts.get(name, 0):9d} {queueCounts.get(name, 0):8d}")
+    print(f"{'total':24s} {sum(drawCallCounts.values()):9d} {sum(queueCounts.values()):8d}")
+    print(f"{'frame time':24s} {drawCallTime * 1000:6.2f} ms {queueTime * 1000:5.2f} ms")
+    print(f"Queue report: {queue.stats}")
+    print(f"Same image: {drawCallImage == queueImage}")
+
+    for gpuShape in gpuShapes:
+        gpuShape.clear()
+    glfw.terminate()
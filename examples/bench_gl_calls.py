@@ -0,0 +1,161 @@
+# coding=utf-8
+"""
+Benchmark: OpenGL calls issued to draw one frame of a scene graph, querying uniform locations
+on every call (as drawSceneGraphNode used to) against using the locations cached by the shader programs.
+SimplePhongShaderProgram is used as it keeps every parameter in plain uniforms: the textured pipelines read
+the camera and lighting ones from uniform blocks (grafica.uniform_blocks), set once for every program.
+A hidden GLFW window provides the OpenGL context.
+"""
+
+import glfw
+from OpenGL.GL import *
+import collections
+import os.path
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import grafica.transformations as tr
+import grafica.basic_shapes as bs
+import grafica.easy_shaders as es
+import grafica.lighting_shaders as ls
+import grafica.scene_graph as sg
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+CITY_SIZE = 30
+
+# Lighting uniforms set once per frame, as in building_viewer.py
+LIGHTING_UNIFORMS = [
+    ("La", (1.0, 1.0, 1.0)), ("Ld", (1.0, 1.0, 1.0)), ("Ls", (1.0, 1.0, 1.0)),
+    ("Ka", (0.2, 0.2, 0.2)), ("Kd", (0.9, 0.9, 0.9)), ("Ks", (1.0, 1.0, 1.0)),
+    ("lightPosition", (2, 2, 4)), ("viewPosition", (10, 10, 10))
+]
+
+# Every OpenGL call made from these modules is counted
+COUNTED_MODULES = [sys.modules[__name__], sg, ls]
+COUNTED_FUNCTIONS = ['glGetUniformLocation', 'glUniform1f', 'glUniform1ui', 'glUniform3f', 'glUniformMatrix4fv',
+                     'glUseProgram', 'glBindVertexArray', 'glDrawElements']
+
+counts = collections.Counter()
+
+
+def counting(name, function):
+    def wrapper(*args, **kwargs):
+        counts[name] += 1
+        return function(*args, **kwargs)
+    return wrapper
+
+
+def instrument():
+    for module in COUNTED_MODULES:
+        for name in COUNTED_FUNCTIONS:
+            setattr(module, name, counting(name, getattr(module, name)))
+
+
+def drawSceneGraphNodeReference(node, pipeline, transformName, parentTransform=tr.identity()):
+    """Original traversal, querying the location of the model uniform for every leaf."""
+    newTransform = np.matmul(parentTransform, node.transform)
+
+    if len(node.childs) == 1 and isinstance(node.childs[0], es.GPUShape):
+        glUniformMatrix4fv(glGetUniformLocation(pipeline.shaderProgram, transformName), 1, GL_TRUE, newTransform)
+        pipeline.drawCall(node.childs[0])
+    else:
+        for child in node.childs:
+            drawSceneGraphNodeReference(child, pipeline, transformName, newTransform)
+
+
+def drawFrameReference(pipeline, city, projection, view):
+    glUseProgram(pipeline.shaderProgram)
+    for name, value in LIGHTING_UNIFORMS:
+        glUniform3f(glGetUniformLocation(pipeline.shaderProgram, name), *value)
+    glUniform1ui(glGetUniformLocation(pipeline.shaderProgram, "shininess"), 100)
+    glUniform1f(glGetUniformLocation(pipeline.shaderProgram, "constantAttenuation"), 0.0001)
+    glUniform1f(glGetUniformLocation(pipeline.shaderProgram, "linearAttenuation"), 0.03)
+    glUniform1f(glGetUniformLocation(pipeline.shaderProgram, "quadraticAttenuation"), 0.01)
+    glUniformMatrix4fv(glGetUniformLocation(pipeline.shaderProgram, "projection"), 1, GL_TRUE, projection)
+    glUniformMatrix4fv(glGetUniformLocation(pipeline.shaderProgram, "view"), 1, GL_TRUE, view)
+    drawSceneGraphNodeReference(city, pipeline, "model")
+
+
+def drawFrameCached(pipeline, city, projection, view):
+    glUseProgram(pipeline.shaderProgram)
+    for name, value in LIGHTING_UNIFORMS:
+        glUniform3f(pipeline.uniformLocation(name), *value)
+    glUniform1ui(pipeline.uniformLocation("shininess"), 100)
+    glUniform1f(pipeline.uniformLocation("constantAttenuation"), 0.0001)
+    glUniform1f(pipeline.uniformLocation("linearAttenuation"), 0.03)
+    glUniform1f(pipeline.uniformLocation("quadraticAttenuation"), 0.01)
+    glUniformMatrix4fv(pipeline.uniformLocation("projection"), 1, GL_TRUE, projection)
+    glUniformMatrix4fv(pipeline.uniformLocation("view"), 1, GL_TRUE, view)
+    sg.drawSceneGraphNode(city, pipeline, "model")
+
+
+def createCity(gpuShape, size):
+    city = sg.SceneGraphNode("city")
+    for i in range(size):
+        for j in range(size):
+            block = sg.SceneGraphNode("block_" + str(i) + "_" + str(j))
+            block.transform = tr.translate(i, j, 0)
+            block.childs += [gpuShape]
+            city.childs += [block]
+    return city
+
+
+def measure(drawFrame, *args):
+    counts.clear()
+    glFinish()
+    t0 = time.perf_counter()
+    drawFrame(*args)
+    glFinish()
+    return time.perf_counter() - t0, dict(counts)
+
+
+if __name__ == "__main__":
+
+    if not glfw.init():
+        sys.exit("GLFW could not be initialized")
+
+    glfw.window_hint(glfw.VISIBLE, glfw.FALSE)
+    window = glfw.create_window(64, 64, "GL calls", None, None)
+    if not window:
+        glfw.terminate()
+        sys.exit("An OpenGL context could not be created")
+    glfw.make_context_current(window)
+
+    pipeline = ls.SimplePhongShaderProgram()
+
+    # Every uniform set per frame must be active, otherwise the frames would not set anything
+    for name in [name for name, _ in LIGHTING_UNIFORMS] + ["shininess", "constantAttenuation", "linearAttenuation",
+                                                           "quadraticAttenuation", "projection", "view", "model"]:
+        assert pipeline.uniformLocation(name) != -1, name + " is not a uniform of the pipeline."
+
+    shape = bs.createColorNormalsCube(0.8, 0.5, 0.3)
+    gpuShape = es.GPUShape().initBuffers()
+    pipeline.setupVAO(gpuShape)
+    gpuShape.fillBuffers(shape.vertices, shape.indices, GL_STATIC_DRAW)
+
+    city = createCity(gpuShape, CITY_SIZE)
+    projection = tr.perspective(45, 1, 0.1, 100)
+    view = tr.lookAt(np.array([10, 10, 10]), np.array([0, 0, 0]), np.array([0, 0, 1]))
+
+    instrument()
+
+    # A first frame of each kind, so both measurements are warm
+    measure(drawFrameReference, pipeline, city, projection, view)
+    measure(drawFrameCached, pipeline, city, projection, view)
+
+    referenceTime, referenceCounts = measure(drawFrameReference, pipeline, city, projection, view)
+    cachedTime, cachedCounts = measure(drawFrameCached, pipeline, city, projection, view)
+
+    print(f"Leaves: {CITY_SIZE * CITY_SIZE}")
+    print(f"{'GL function':24s} {'before':>8s} {'after':>8s}")
+    for name in COUNTED_FUNCTIONS:
+        print(f"{name:24s} {referenceCounts.get(name, 0):8d} {cachedCounts.get(name, 0):8d}")
+    print(f"{'total':24s} {sum(referenceCounts.values()):8d} {sum(cachedCounts.values()):8d}")
+    print(f"{'frame time':24s} {referenceTime * 1000:5.2f} ms {cachedTime * 1000:5.2f} ms")
+
+    gpuShape.clear()
+    glfw.terminate()
@@ -0,0 +1,61 @@
+# coding=utf-8
+"""
+Benchmark: merging many small shapes one at a time with merge, against a single mergeShapes call.
+"""
+
+import os.path
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import grafica.basic_shapes as bs
+import grafica.transformations as tr
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+STRIDE = 8
+
+
+def incrementalMerge(shapes, destination):
+    for shape in shapes:
+        bs.merge(destination, STRIDE, shape)
+    return destination
+
+
+def measure(function, *args):
+    t0 = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - t0, result
+
+
+if __name__ == "__main__":
+
+    print(f"{'shapes':>7s} {'merge (lists)':>16s} {'merge (arrays)':>16s} {'mergeShapes':>14s}"
+          f" {'per shape':>12s} {'+ transforms':>14s} {'ArrayShapes':>14s}")
+
+    for N in [1000, 2000, 5000, 10000, 20000]:
+        quads = [bs.createTextureQuadWithNormal(1, 1) for _ in range(N)]
+        transforms = [tr.translate(i % 100, i // 100, 0) for i in range(N)]
+
+        listTime, listShape = measure(incrementalMerge, quads, bs.Shape([], []))
+
+        # Merging arrays one at a time reallocates the whole destination on every call
+        if N <= 5000:
+            arrayTime, _ = measure(incrementalMerge, quads, bs.ArrayShape([], [], STRIDE))
+            arrayText = f"{arrayTime * 1000:13.1f} ms"
+        else:
+            arrayText = f"{'-':>16s}"
+
+        batchTime, batchShape = measure(bs.mergeShapes, quads, STRIDE)
+        transformTime, _ = measure(bs.mergeShapes, quads, STRIDE, transforms, 5)
+
+        arrayQuads = [bs.toArrayShape(quad, STRIDE) for quad in quads]
+        arrayBatchTime, _ = measure(bs.mergeShapes, arrayQuads, STRIDE)
+
+        assert np.array_equal(np.array(listShape.vertices, dtype=np.float32), batchShape.vertices)
+        assert np.array_equal(np.array(listShape.indices, dtype=np.uint32), batchShape.indices)
+
+        print(f"{N:7d} {listTime * 1000:13.1f} ms {arrayText} {batchTime * 1000:11.1f} ms"
+              f" {batchTime / N * 1e6:9.2f} us {transformTime * 1000:11.1f} ms {arrayBatchTime * 1000:11.1f} ms")
@@ -0,0 +1,120 @@
+# coding=utf-8
+"""
+Benchmark: mipmaps and anisotropic filtering.
+- Building the mipmap chain: with the CPU box filter, without and with the assets cache, against glGenerateMipmap.
+- Sampling: drawing a large tiled floor seen at a grazing angle, as the floor of the building viewer,
+  with the BILINEAR, TRILINEAR and ANISOTROPIC presets. Without mipmaps, distant texels are read far apart,
+  missing the texture cache of the GPU.
+A hidden GLFW window provides the OpenGL context.
+"""
+
+import glfw
+from OpenGL.GL import *
+import os
+import os.path
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import grafica.transformations as tr
+import grafica.basic_shapes as bs
+import grafica.easy_shaders as es
+import grafica.texture_cache as tc
+from grafica.assets_path import getAssetPath, getCachePath
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+IMAGES = ["grass.jfif", "bricks.jpg", "Road_001_basecolor.jpg"]
+TILES = 64
+FRAMES = 20
+WIDTH = 800
+HEIGHT = 600
+
+
+def loadTime(imgName, minFilterMode, cpuMipmaps):
+    cache = tc.TextureCache(cpuMipmaps=cpuMipmaps)
+    t0 = time.perf_counter()
+    texture = cache.acquire(imgName, GL_REPEAT, GL_REPEAT, minFilterMode, GL_LINEAR)
+    glFinish()
+    elapsed = time.perf_counter() - t0
+    size = texture.size
+    cache.clear()
+    return elapsed, size
+
+
+def clearCachedMipmaps(imgName):
+    prefix = os.path.basename(imgName) + "."
+    for name in os.listdir(getCachePath("")):
+        if name.startswith(prefix):
+            os.remove(getCachePath(name))
+
+
+def drawTime(pipeline, gpuFloor, texture):
+    gpuFloor.texture = texture
+    projection = tr.perspective(60, WIDTH / HEIGHT, 0.1, 200)
+    view = tr.lookAt(np.array([0, -50, 1.0]), np.array([0, 50, 0]), np.array([0, 0, 1]))
+
+    glUseProgram(pipeline.shaderProgram)
+    glUniformMatrix4fv(glGetUniformLocation(pipeline.shaderProgram, "projection"), 1, GL_TRUE, projection)
+    glUniformMatrix4fv(glGetUniformLocation(pipeline.shaderProgram, "view"), 1, GL_TRUE, view)
+    glUniformMatrix4fv(glGetUniformLocation(pipeline.shaderProgram, "model"), 1, GL_TRUE, tr.uniformScale(100))
+
+    # The first frame is not measured, it may include the upload of the texture
+    times = []
+    for i in range(FRAMES + 1):
+        t0 = time.perf_counter()
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        pipeline.drawCall(gpuFloor)
+        glFinish()
+        times += [time.perf_counter() - t0]
+    return np.median(times[1:])
+
+
+if __name__ == "__main__":
+
+    if not glfw.init():
+        sys.exit("GLFW could not be initialized")
+
+    glfw.window_hint(glfw.VISIBLE, glfw.FALSE)
+    window = glfw.create_window(WIDTH, HEIGHT, "Mipmaps", None, None)
+    if not window:
+        glfw.terminate()
+        sys.exit("An OpenGL context could not be created")
+    glfw.make_context_current(window)
+    os.makedirs(getCachePath(""), exist_ok=True)
+
+    print(f"{'Mipmap chain':<24s} {'level 0':>9s} {'CPU, cold':>10s} {'CPU, cached':>12s} {'GPU':>9s} {'size':>9s}")
+    for name in IMAGES:
+        imgName = getAssetPath(name)
+        baseTime, baseSize = loadTime(imgName, GL_LINEAR, True)
+        clearCachedMipmaps(imgName)
+        coldTime, size = loadTime(imgName, GL_LINEAR_MIPMAP_LINEAR, True)
+        warmTime, _ = loadTime(imgName, GL_LINEAR_MIPMAP_LINEAR, True)
+        gpuTime, _ = loadTime(imgName, GL_LINEAR_MIPMAP_LINEAR, False)
+        print(f"{name:<24s} {baseTime * 1000:6.1f} ms {coldTime * 1000:7.1f} ms {warmTime * 1000:9.1f} ms "
+              f"{gpuTime * 1000:6.1f} ms {size / baseSize:8.2f}x")
+
+    pipeline = es.SimpleTextureModelViewProjectionShaderProgram()
+    shape = bs.createTextureQuad(TILES, TILES)
+    gpuFloor = es.GPUShape().initBuffers()
+    pipeline.setupVAO(gpuFloor)
+    gpuFloor.fillBuffers(shape.vertices, shape.indices, GL_STATIC_DRAW)
+    glEnable(GL_DEPTH_TEST)
+
+    cache = tc.TextureCache()
+    print(f"Floor of {TILES}x{TILES} tiles at a grazing angle, {WIDTH}x{HEIGHT}, median of {FRAMES} frames")
+    for name in IMAGES:
+        results = []
+        for label, preset in [("bilinear", tc.BILINEAR), ("trilinear", tc.TRILINEAR), ("anisotropic", tc.ANISOTROPIC)]:
+            texture = cache.acquire(getAssetPath(name), GL_REPEAT, GL_REPEAT, *preset)
+            results += [(label, drawTime(pipeline, gpuFloor, texture))]
+        bilinearTime = results[0][1]
+        print(f"{name:<24s} " + "  ".join(f"{label} {elapsed * 1000:6.2f} ms ({bilinearTime / elapsed:.2f}x)"
+                                          for label, elapsed in results))
+
+    gpuFloor.texture = None
+    gpuFloor.clear()
+    cache.clear()
+    glfw.terminate()
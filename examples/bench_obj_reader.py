@@ -0,0 +1,138 @@
+# coding=utf-8
+"""
+Benchmark: load time of the NumPy OBJ reader against the original line by line reader, for growing file sizes.
+"""
+
+import os.path
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import grafica.basic_shapes as bs
+from grafica.assets_path import getAssetPath
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+
+def readFaceVertex(faceDescription):
+    aux = faceDescription.split('/')
+
+    assert len(aux[0]), "Vertex index has not been defined."
+
+    faceVertex = [int(aux[0]), None, None]
+
+    assert len(aux) == 3, "Only faces where its vertices require 3 indices are defined."
+
+    if len(aux[1]) != 0:
+        faceVertex[1] = int(aux[1])
+
+    if len(aux[2]) != 0:
+        faceVertex[2] = int(aux[2])
+
+    return faceVertex
+
+
+def readOBJReference(filename):
+    """Original reader from tarea2modelos, kept to check the output is identical."""
+    vertices = []
+    normals = []
+    textCoords = []
+    faces = []
+
+    with open(filename, 'r') as file:
+        for line in file.readlines():
+            aux = line.strip().split(' ')
+
+            if aux[0] == 'v':
+                vertices += [[float(coord) for coord in aux[1:]]]
+
+            elif aux[0] == 'vn':
+                normals += [[float(coord) for coord in aux[1:]]]
+
+            elif aux[0] == 'vt':
+                textCoords += [[float(coord) for coord in aux[1:]]]
+
+            elif aux[0] == 'f':
+                N = len(aux)
+                faces += [[readFaceVertex(faceVertex) for faceVertex in aux[1:4]]]
+                for i in range(3, N - 1):
+                    faces += [[readFaceVertex(faceVertex) for faceVertex in [aux[i], aux[i + 1], aux[1]]]]
+
+        vertexData = []
+        indices = []
+        index = 0
+
+        for face in faces:
+            for i in range(0, 3):
+                vertex = vertices[face[i][0] - 1]
+                textCoord = textCoords[face[i][1] - 1]
+                normal = normals[face[i][2] - 1]
+
+                vertexData += [
+                    vertex[0], vertex[1], vertex[2],
+                    textCoord[0], textCoord[1],
+                    normal[0], normal[1], normal[2]
+                ]
+
+            indices += [index, index + 1, index + 2]
+            index += 3
+
+        return bs.Shape(vertexData, indices)
+
+
+def writeGridOBJ(filename, N):
+    """Writes a N x N grid of quads, with texture coordinates and normals."""
+    with open(filename, 'w') as file:
+        for i in range(N + 1):
+            for j in range(N + 1):
+                file.write(f"v {i / N:.6f} {j / N:.6f} {np.sin(i + j) * 0.1:.6f}\n")
+        for i in range(N + 1):
+            for j in range(N + 1):
+                file.write(f"vt {i / N:.6f} {j / N:.6f}\n")
+        file.write("vn 0.000000 0.000000 1.000000\n")
+        for i in range(N):
+            for j in range(N):
+                a = i * (N + 1) + j + 1
+                b = a + N + 1
+                file.write(f"f {a}/{a}/1 {b}/{b}/1 {b + 1}/{b + 1}/1 {a + 1}/{a + 1}/1\n")
+
+
+def timeIt(function, *args, repetitions=3):
+    best = float('inf')
+    for _ in range(repetitions):
+        t0 = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def checkIdentical(reference, shape):
+    vertices = np.array(reference.vertices, dtype=np.float32)
+    indices = np.array(reference.indices, dtype=np.uint32)
+    return np.array_equal(vertices, shape.vertices) and np.array_equal(indices, shape.indices)
+
+
+def report(filename):
+    size = os.path.getsize(filename)
+    newTime, shape = timeIt(bs.readOBJ, filename)
+    oldTime, reference = timeIt(readOBJReference, filename)
+    identical = checkIdentical(reference, shape)
+    print(f"{os.path.basename(filename):32s} {size / 1024:10.1f} KiB"
+          f" {oldTime * 1000:10.2f} ms {newTime * 1000:10.2f} ms {oldTime / newTime:8.1f}x  {identical}")
+
+
+if __name__ == "__main__":
+
+    print(f"{'file':32s} {'size':>14s} {'reference':>13s} {'numpy':>13s} {'speedup':>9s}  identical")
+
+    for assetName in ['cilinder_triangle_base.obj', 'bender_pillar.obj', 'suzanne.obj']:
+        report(getAssetPath(assetName))
+
+    with tempfile.TemporaryDirectory() as directory:
+        for N in [32, 64, 128, 256, 512]:
+            filename = os.path.join(directory, f"grid_{N}.obj")
+            writeGridOBJ(filename, N)
+            report(filename)
@@ -0,0 +1,80 @@
+# coding=utf-8
+"""
+Benchmark: creating every pipeline of easy_shaders, lighting_shaders and text_renderer
+compiling their sources, loading the program binaries saved by the first run,
+and again within the same process, where the programs already linked are shared.
+A hidden GLFW window provides the OpenGL context.
+Drivers may keep a shader cache of their own, which makes the first run faster from the second launch on.
+"""
+
+import glfw
+from OpenGL.GL import *
+import glob
+import logging
+import os
+import os.path
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import grafica.easy_shaders as es
+import grafica.lighting_shaders as ls
+import grafica.text_renderer as tx
+import grafica.program_cache as pc
+from grafica.assets_path import getCachePath
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+PIPELINES = [getattr(es, name) for name in es.__all__ if name.endswith("ShaderProgram")] + \
+            [getattr(ls, name) for name in ls.__all__] + \
+            [tx.TextureTextRendererShaderProgram]
+
+
+def createPipelines():
+    pc.stats.reset()
+    t0 = time.perf_counter()
+    pipelines = [pipeline() for pipeline in PIPELINES]
+    glFinish()
+    return time.perf_counter() - t0, pipelines
+
+
+if __name__ == "__main__":
+
+    if not glfw.init():
+        sys.exit("GLFW could not be initialized")
+
+    glfw.window_hint(glfw.VISIBLE, glfw.FALSE)
+    window = glfw.create_window(64, 64, "Program cache", None, None)
+    if not window:
+        glfw.terminate()
+        sys.exit("An OpenGL context could not be created")
+    glfw.make_context_current(window)
+
+    # The cache logs the totals after every program with logging.INFO
+    logging.basicConfig(level=logging.WARNING)
+
+    print(f"Driver: {glGetString(GL_RENDERER).decode()}, "
+          f"{glGetIntegerv(GL_NUM_PROGRAM_BINARY_FORMATS)} program binary formats")
+
+    for filename in glob.glob(getCachePath("program.*.bin")):
+        os.remove(filename)
+
+    coldTime, _ = createPipelines()
+    cold = str(pc.stats)
+
+    # As a new launch, programs linked in this process are forgotten, but their binaries were saved
+    pc.clearPrograms()
+    warmTime, _ = createPipelines()
+    warm = str(pc.stats)
+
+    sharedTime, _ = createPipelines()
+    shared = str(pc.stats)
+
+    print(f"{len(PIPELINES)} pipelines")
+    print(f"{'from source':>16s} {coldTime * 1000:8.1f} ms  {cold}")
+    print(f"{'from binaries':>16s} {warmTime * 1000:8.1f} ms  {warm}")
+    print(f"{'same process':>16s} {sharedTime * 1000:8.1f} ms  {shared}")
+    print(f"Startup speedup from binaries: {coldTime / warmTime:.1f}x")
+
+    glfw.terminate()
@@ -0,0 +1,92 @@
+# coding=utf-8
+"""
+Benchmark: looking up nodes and world transforms by name with sg.findNode and sg.findTransform,
+which walk the tree on every call, against a SceneGraph, which keeps a name index and caches world transforms.
+No OpenGL context is needed.
+"""
+
+import os.path
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import grafica.transformations as tr
+import grafica.scene_graph as sg
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+FLOORS = 4
+QUERIES = 200
+
+
+def createCity(size):
+    # city -> building -> floor, as in bench_compiled_scene_graph.py, shapes are not needed to find transforms
+    city = sg.SceneGraphNode("city")
+    for i in range(size):
+        for j in range(size):
+            building = sg.SceneGraphNode("building_" + str(i) + "_" + str(j))
+            building.transform = tr.matmul([tr.translate(i, j, 0), tr.rotationZ((i + j) * 0.1)])
+
+            for k in range(FLOORS):
+                floor = sg.SceneGraphNode("floor_" + str(i) + "_" + str(j) + "_" + str(k))
+                floor.transform = tr.matmul([tr.translate(0, 0, k * 0.5), tr.scale(0.5, 0.5, 0.4)])
+                building.childs += [floor]
+
+            city.childs += [building]
+    return city
+
+
+def timeQueries(function, names):
+    t0 = time.perf_counter()
+    results = [function(name) for name in names]
+    return (time.perf_counter() - t0) / len(names), results
+
+
+if __name__ == "__main__":
+
+    rng = np.random.default_rng(0)
+
+    print(f"{'nodes':>7s} {'query':>14s} {'tree walk':>12s} {'SceneGraph':>12s} {'speedup':>9s}  same results")
+
+    for size in [10, 20, 40]:
+        city = createCity(size)
+        sceneGraph = sg.SceneGraph(city)
+        nodes = len(sceneGraph.nodes)
+
+        names = ["floor_" + str(i) + "_" + str(j) + "_" + str(k)
+                 for i, j, k in zip(*rng.integers(0, size, (2, QUERIES)), rng.integers(0, FLOORS, QUERIES))]
+
+        # The first transform queries fill the cache, moving a building only invalidates its floors
+        sceneGraph.findTransform(names[0])
+        building = "building_" + str(size // 2) + "_" + str(size // 2)
+
+        def moveAndFind(name):
+            sceneGraph.setTransform(building, tr.matmul([tr.translate(0, 0, 0.01), sceneGraph.findNode(building).transform]))
+            return sceneGraph.findTransform(name)
+
+        def walkMoveAndFind(name):
+            node = sg.findNode(city, building)
+            node.transform = tr.matmul([tr.translate(0, 0, 0.01), node.transform])
+            return sg.findTransform(city, name)
+
+        queries = [
+            ("findNode", lambda name: sg.findNode(city, name), sceneGraph.findNode, lambda a, b: a is b),
+            ("findTransform", lambda name: sg.findTransform(city, name), sceneGraph.findTransform, np.array_equal),
+            ("findPosition", lambda name: sg.findPosition(city, name), sceneGraph.findPosition, np.array_equal),
+            ("move + find", walkMoveAndFind, moveAndFind, np.array_equal),
+        ]
+
+        for queryName, walk, cached, same in queries:
+            # Moving buildings changes the results, so both run from the same initial transforms
+            initial = [node.transform for node in city.childs]
+            walkTime, walkResults = timeQueries(walk, names)
+            for node, transform in zip(city.childs, initial):
+                node.transform = transform
+                sceneGraph.markDirty(node)
+            cachedTime, cachedResults = timeQueries(cached, names)
+
+            allSame = all(same(a, b) for a, b in zip(walkResults, cachedResults))
+            print(f"{nodes:7d} {queryName:>14s} {walkTime * 1000:9.3f} ms {cachedTime * 1000:9.4f} ms"
+                  f" {walkTime / cachedTime:8.1f}x  {allSame}")
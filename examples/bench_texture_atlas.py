@@ -0,0 +1,101 @@
+# coding=utf-8
+"""
+Benchmark: texture atlases.
+- Packing efficiency (of the padded images) and time of packShelves and packSkyline, for the building textures
+  of the building viewer, every image of the assets and sets of random sizes.
+- Draw calls of the baked buildings of the building viewer, with one texture per image against one atlas.
+A hidden GLFW window provides the OpenGL context.
+"""
+
+import glfw
+from OpenGL.GL import *
+import os.path
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import grafica.lighting_shaders as ls
+import grafica.scene_graph as sg
+import grafica.texture_atlas as ta
+import grafica.texture_cache as tc
+from grafica.assets_path import getAssetPath
+import building_viewer as bv
+import tarea2modelos as modelo
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+BUILDING_IMAGES = ["dice" + str(i) + ".jpg" for i in range(2, 7)]
+ASSET_IMAGES = ["bricks.jpg", "dice.jpg", "dice_blue.jpg", "grass.jfif", "red_woodpecker.jpg", "boo.png",
+                "torres-del-paine-sq.jpg", "cg_box.png", "Road_001_basecolor.jpg"] + BUILDING_IMAGES
+
+
+def packingResults(sizes, packer):
+    # As TextureAtlas does, every power of two width is tried, keeping the atlas with the shortest longest side
+    t0 = time.perf_counter()
+    best = None
+    width = 1 << int(np.ceil(np.log2(np.max(sizes[:, 0]))))
+    while width <= ta.MAX_WIDTH:
+        _, usedWidth, usedHeight = packer(sizes, width)
+        score = (max(usedWidth, usedHeight), usedWidth * usedHeight)
+        if best is None or score < best:
+            best = score
+        width *= 2
+    elapsed = time.perf_counter() - t0
+    return float(np.sum(sizes[:, 0] * sizes[:, 1])) / best[1], elapsed
+
+
+def createBuildings(atlas):
+    # The buildings of the building viewer, baked as the viewer does for the Phong pipeline
+    pipeline = ls.SimpleTexturePhongShaderProgram()
+    gpuDices = [modelo.createTexturedGPUShape(pipeline, bv.createDice(), getAssetPath(name), atlas)
+                for name in BUILDING_IMAGES[0:3]]
+    buildings = [modelo.createWillisTower(gpuDices[0]), modelo.createEmpireState(gpuDices[1]),
+                 modelo.createBurjAlArab(gpuDices[2], pipeline, atlas)]
+    return [sg.bakeSceneGraphNode(building, pipeline, 8, 5) for building in buildings]
+
+
+if __name__ == "__main__":
+
+    if not glfw.init():
+        sys.exit("GLFW could not be initialized")
+
+    glfw.window_hint(glfw.VISIBLE, glfw.FALSE)
+    window = glfw.create_window(64, 64, "Texture atlas", None, None)
+    if not window:
+        glfw.terminate()
+        sys.exit("An OpenGL context could not be created")
+    glfw.make_context_current(window)
+
+    rng = np.random.default_rng(0)
+    imageSets = [("building textures", ta.TextureAtlas([getAssetPath(name) for name in BUILDING_IMAGES])),
+                 ("asset images", ta.TextureAtlas([getAssetPath(name) for name in ASSET_IMAGES]))]
+
+    print(f"{'Images':<24s} {'shelves':>18s} {'skyline':>18s}")
+    for label, atlas in imageSets:
+        paths = list(atlas.regions)
+        sizes = np.array([tc.readImage(path).shape[1::-1] for path in paths], dtype=np.int64)
+        sizes += 2 * ta.DEFAULT_PADDING
+        results = [packingResults(sizes, packer) for packer in [ta.packShelves, ta.packSkyline]]
+        print(f"{label + ' (' + str(len(paths)) + ')':<24s} " +
+              " ".join(f"{efficiency * 100:6.1f}% {elapsed * 1000:6.1f} ms" for efficiency, elapsed in results))
+
+    for count in [50, 300]:
+        sizes = rng.integers(16, 256, (count, 2))
+        results = [packingResults(sizes, packer) for packer in [ta.packShelves, ta.packSkyline]]
+        print(f"{'random (' + str(count) + ')':<24s} " +
+              " ".join(f"{efficiency * 100:6.1f}% {elapsed * 1000:6.1f} ms" for efficiency, elapsed in results))
+
+    print()
+    for label, atlas in imageSets:
+        print(f"Atlas of {label}: {atlas.stats}")
+
+    print()
+    for label, atlas in [("one texture per image", None), ("atlas", imageSets[0][1])]:
+        baked = createBuildings(atlas)
+        counts = [len(building.childs) for building in baked]
+        print(f"{label:<24s} draw calls per building (Willis, Empire, Burj): {counts}")
+
+    tc.defaultCache().clear()
+    glfw.terminate()
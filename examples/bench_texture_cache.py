@@ -0,0 +1,79 @@
+# coding=utf-8
+"""
+Benchmark: loading the textures of many shapes which share a few image files, decoding and uploading
+each one as textureSimpleSetup used to do, against a TextureCache. Then, shapes are cleared and loaded
+again under a smaller memory budget, to show the reuse and eviction of unreferenced textures.
+A hidden GLFW window provides the OpenGL context.
+"""
+
+import glfw
+from OpenGL.GL import *
+import os.path
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import grafica.texture_cache as tc
+from grafica.assets_path import getAssetPath
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+IMAGES = ["bricks.jpg", "dice.jpg", "dice_blue.jpg", "dice2.jpg", "dice3.jpg", "grass.jfif"]
+SHAPES = 120
+
+
+def loadTextures(load):
+    # Shapes take their image in turns, with the same sampling parameters
+    t0 = time.perf_counter()
+    textures = [load(getAssetPath(IMAGES[i % len(IMAGES)]), GL_REPEAT, GL_REPEAT, GL_LINEAR, GL_LINEAR)
+                for i in range(SHAPES)]
+    glFinish()
+    return time.perf_counter() - t0, textures
+
+
+if __name__ == "__main__":
+
+    if not glfw.init():
+        sys.exit("GLFW could not be initialized")
+
+    glfw.window_hint(glfw.VISIBLE, glfw.FALSE)
+    window = glfw.create_window(64, 64, "Texture cache", None, None)
+    if not window:
+        glfw.terminate()
+        sys.exit("An OpenGL context could not be created")
+    glfw.make_context_current(window)
+
+    # Every call decodes and uploads its own copy
+    uncachedTime, uploads = loadTextures(tc._uploadTexture)
+    uncachedBytes = sum(size for _, size in uploads)
+    glDeleteTextures(len(uploads), [texture for texture, _ in uploads])
+
+    cache = tc.TextureCache()
+    cachedTime, textures = loadTextures(cache.acquire)
+
+    print(f"{SHAPES} shapes, {len(IMAGES)} images")
+    print(f"{'uncached':>10s} {uncachedTime * 1000:8.1f} ms {len(uploads):4d} textures"
+          f" {uncachedBytes / (1024 * 1024):7.1f} MB")
+    print(f"{'cached':>10s} {cachedTime * 1000:8.1f} ms {cache.stats.textures:4d} textures"
+          f" {cache.stats.residentBytes / (1024 * 1024):7.1f} MB  {cache.stats}")
+
+    # Clearing every shape leaves the textures unreferenced, but resident while they fit the budget
+    for texture in textures:
+        texture.release()
+    print(f"{'released':>10s} {cache.stats}")
+
+    reloadTime, textures = loadTextures(cache.acquire)
+    print(f"{'reloaded':>10s} {reloadTime * 1000:8.1f} ms  {cache.stats}")
+
+    # With a budget for half the images, the least recently released ones are evicted
+    for texture in textures:
+        texture.release()
+    cache.setBudget(cache.stats.residentBytes // 2)
+    print(f"{'budget':>10s} {cache.budget / (1024 * 1024):5.1f} MB  {cache.stats}")
+
+    reloadTime, textures = loadTextures(cache.acquire)
+    print(f"{'reloaded':>10s} {reloadTime * 1000:8.1f} ms  {cache.stats}  hit rate {cache.stats.hitRate():.2f}")
+
+    cache.clear()
+    glfw.terminate()
@@ -0,0 +1,107 @@
+# coding=utf-8
+"""
+Benchmark: texel formats of the texture cache, for the largest images of the assets.
+- decoded: the image file decoded and uploaded as it is, RGB or RGBA, as textures were loaded before the cache
+  of converted texels.
+- RGBA and BC: texels converted once into the assets cache (first run) and mapped from it afterwards (cached),
+  as RGBA or S3TC compressed blocks, with their complete mipmap chain.
+For each one, the loading time and the GPU memory of the texture. Decoded RGB images are counted
+at 3 bytes per texel, though drivers usually store them as RGBA.
+A hidden GLFW window provides the OpenGL context.
+"""
+
+import glfw
+from OpenGL.GL import *
+import os
+import os.path
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import grafica.texture_cache as tc
+from grafica.assets_path import getAssetPath, getCachePath
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+IMAGES = ["Road_001_basecolor.jpg", "74bfc000d948c976c19f867ab3cb9df2.jpg", "grass.jfif",
+          "torres-del-paine-sq.jpg"]
+
+
+def decodedLoadTime(imgName):
+    # The image uploaded as decoded, generating its mipmaps with OpenGL
+    t0 = time.perf_counter()
+    img_data = tc.readImage(imgName)
+    height, width, channels = img_data.shape
+    format = GL_RGBA if channels == 4 else GL_RGB
+    texture = tc._createTexture(GL_REPEAT, GL_REPEAT, GL_LINEAR_MIPMAP_LINEAR, GL_LINEAR)
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+    glTexImage2D(GL_TEXTURE_2D, 0, format, width, height, 0, format, GL_UNSIGNED_BYTE, img_data)
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 4)
+    glGenerateMipmap(GL_TEXTURE_2D)
+    glFinish()
+    elapsed = time.perf_counter() - t0
+    glDeleteTextures(1, [texture])
+    return elapsed, sum(w * h for w, h in tc._mipmapSizes(width, height)) * channels
+
+
+def loadTime(imgName, compress):
+    cache = tc.TextureCache(compress=compress)
+    t0 = time.perf_counter()
+    texture = cache.acquire(imgName, GL_REPEAT, GL_REPEAT, *tc.TRILINEAR)
+    glFinish()
+    elapsed = time.perf_counter() - t0
+    size = texture.size
+    cache.clear()
+    return elapsed, size
+
+
+def clearCachedTexels(imgName):
+    prefix = os.path.basename(imgName) + "."
+    for name in os.listdir(getCachePath("")):
+        if name.startswith(prefix):
+            os.remove(getCachePath(name))
+
+
+if __name__ == "__main__":
+
+    if not glfw.init():
+        sys.exit("GLFW could not be initialized")
+
+    glfw.window_hint(glfw.VISIBLE, glfw.FALSE)
+    window = glfw.create_window(64, 64, "Texture formats", None, None)
+    if not window:
+        glfw.terminate()
+        sys.exit("An OpenGL context could not be created")
+    glfw.make_context_current(window)
+    os.makedirs(getCachePath(""), exist_ok=True)
+
+    if not tc._supportsCompression():
+        print("The driver does not support S3TC, BC textures are loaded as RGBA")
+
+    print(f"{'':<38s} {'decoded':>17s} {'RGBA':>28s} {'BC':>28s}")
+    print(f"{'Image':<38s} {'load':>9s} {'memory':>7s} "
+          f"{'first run':>10s} {'cached':>9s} {'memory':>7s} {'first run':>10s} {'cached':>9s} {'memory':>7s}")
+    totals = np.zeros(3)
+    for name in IMAGES:
+        imgName = getAssetPath(name)
+        decodedTime, decodedSize = decodedLoadTime(imgName)
+        results = []
+        for compress in [False, True]:
+            clearCachedTexels(imgName)
+            firstTime, _ = loadTime(imgName, compress)
+            cachedTime, size = loadTime(imgName, compress)
+            results += [(firstTime, cachedTime, size)]
+        totals += [decodedSize, results[0][2], results[1][2]]
+
+        shape = tc.readImage(imgName).shape
+        label = name[0:24] + " " + str(shape[1]) + "x" + str(shape[0])
+        print(f"{label:<38s} {decodedTime * 1000:6.1f} ms {decodedSize / (1024 * 1024):4.1f} MB " +
+              " ".join(f"{firstTime * 1000:7.1f} ms {cachedTime * 1000:6.1f} ms {size / (1024 * 1024):4.1f} MB"
+                       for firstTime, cachedTime, size in results))
+
+    print(f"GPU memory: decoded {totals[0] / (1024 * 1024):.1f} MB, RGBA {totals[1] / (1024 * 1024):.1f} MB, "
+          f"BC {totals[2] / (1024 * 1024):.1f} MB ({totals[1] / totals[2]:.1f}x less than RGBA)")
+
+    glfw.terminate()
@@ -0,0 +1,98 @@
+# coding=utf-8
+"""
+Benchmark: loading the textures of a scene decoding them in the render thread, as textureSimpleSetup does,
+against an AsyncTextureLoader, which decodes them in a pool of threads and uploads them along the frames.
+For each one: the time the loading calls block the render thread, the time until the first frame
+(the rest of the startup is simulated with other work of the main thread) and the slowest frame.
+A hidden GLFW window provides the OpenGL context.
+"""
+
+import glfw
+from OpenGL.GL import *
+import os
+import os.path
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import grafica.texture_cache as tc
+import grafica.texture_loader as tl
+from grafica.assets_path import getAssetPath
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+IMAGES = ["dice2.jpg", "dice3.jpg", "dice4.jpg", "dice5.jpg", "dice6.jpg", "grass.jfif", "bricks.jpg",
+          "Road_001_basecolor.jpg", "74bfc000d948c976c19f867ab3cb9df2.jpg", "torres-del-paine-sq.jpg",
+          "red_woodpecker.jpg"]
+
+# Main thread work between loading the textures and the first frame (compiling shaders, reading models...)
+SETUP_TIME = 0.05
+FRAME_TIME = 1 / 60
+
+
+def busy(seconds):
+    # Work holding the GIL, as the Python side of the setup does
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        pass
+
+
+def run(load, update):
+    t0 = time.perf_counter()
+    textures = [load(getAssetPath(name), GL_REPEAT, GL_REPEAT, GL_LINEAR, GL_LINEAR) for name in IMAGES]
+    blocked = time.perf_counter() - t0
+
+    busy(SETUP_TIME)
+
+    # Frames until every texture is loaded, each one with its own share of the uploads
+    frames = []
+    pending = True
+    while pending:
+        frameStart = time.perf_counter()
+        pending = update() > 0
+        busy(FRAME_TIME)
+        glFinish()
+        frames += [time.perf_counter() - frameStart]
+        if len(frames) == 1:
+            firstFrame = time.perf_counter() - t0
+
+    total = time.perf_counter() - t0
+    return blocked, firstFrame, max(frames), len(frames), total, textures
+
+
+if __name__ == "__main__":
+
+    if not glfw.init():
+        sys.exit("GLFW could not be initialized")
+
+    glfw.window_hint(glfw.VISIBLE, glfw.FALSE)
+    window = glfw.create_window(64, 64, "Texture loader", None, None)
+    if not window:
+        glfw.terminate()
+        sys.exit("An OpenGL context could not be created")
+    glfw.make_context_current(window)
+
+    # Reading the files once, so both runs find them in the operating system cache
+    for name in IMAGES:
+        with open(getAssetPath(name), 'rb') as file:
+            file.read()
+
+    syncCache = tc.TextureCache()
+    syncResult = run(syncCache.acquire, lambda: 0)
+
+    asyncCache = tc.TextureCache()
+    loader = tl.AsyncTextureLoader(asyncCache)
+    asyncResult = run(loader.load, loader.update)
+
+    print(f"{len(IMAGES)} images, {asyncCache.stats.residentBytes / (1024 * 1024):.1f} MB, "
+          f"{os.cpu_count()} CPUs, upload budget {loader.uploadBudget / (1024 * 1024):.0f} MB per frame")
+    print(f"{'':>8s} {'blocked':>10s} {'1st frame':>10s} {'max frame':>10s} {'frames':>7s} {'loaded':>10s}")
+    for label, (blocked, firstFrame, maxFrame, frames, total, _) in [("sync", syncResult), ("async", asyncResult)]:
+        print(f"{label:>8s} {blocked * 1000:7.1f} ms {firstFrame * 1000:7.1f} ms {maxFrame * 1000:7.1f} ms "
+              f"{frames:7d} {total * 1000:7.1f} ms")
+
+    loader.clear()
+    syncCache.clear()
+    asyncCache.clear()
+    glfw.terminate()
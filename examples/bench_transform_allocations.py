@@ -0,0 +1,92 @@
+# coding=utf-8
+"""
+Benchmark: memory allocated by the transformations of a frame (camera and model matrices of N objects),
+creating new matrices on every frame against writing them into preallocated buffers with out.
+Allocations are measured with tracemalloc.
+"""
+
+import math
+import os.path
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import grafica.transformations as tr
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+FRAMES = 200
+AXIS_Z = (0.0, 0.0, 1.0)
+
+# Size of a single 4x4 float32 matrix, object included
+MATRIX_BYTES = sys.getsizeof(np.empty((4, 4), dtype=np.float32))
+
+
+def allocatingFrame(t, N):
+    projection = tr.perspective(45, 16 / 9, 0.1, 100)
+    view = tr.lookAt(np.array([3 * np.sin(t), 3 * np.cos(t), 1]), np.array([0, 0, 0]), np.array([0, 0, 1]))
+    models = [tr.matmul([tr.translate(i, 0, 0), tr.rotationZ(t), tr.scale(1, 1, 2)]) for i in range(N)]
+    return projection, view, models
+
+
+class InPlaceFrame:
+    """Buffers are created once, every frame writes into them."""
+
+    def __init__(self, N):
+        self.projection = np.empty((4, 4), dtype=np.float32)
+        self.view = np.empty((4, 4), dtype=np.float32)
+        self.modelStack = np.empty((N, 4, 4), dtype=np.float32)
+
+        # Indexing the stack creates a view, so the views of each model are kept too
+        self.models = list(self.modelStack)
+
+    def __call__(self, t, N):
+        tr.perspective(45, 16 / 9, 0.1, 100, out=self.projection)
+        tr.lookAt((3 * math.sin(t), 3 * math.cos(t), 1), (0, 0, 0), (0, 0, 1), out=self.view)
+        for i in range(N):
+            tr.trs(i, 0, 0, t, AXIS_Z, 1, 1, 2, out=self.models[i])
+        return self.projection, self.view, self.models
+
+
+def measure(frame, N):
+    frame(0, N)
+
+    tracemalloc.start()
+    peak = 0
+    t0 = time.perf_counter()
+    start, _ = tracemalloc.get_traced_memory()
+    for k in range(FRAMES):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        frame(k * 0.01, N)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+    elapsed = (time.perf_counter() - t0) / FRAMES
+    retained = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+
+    return peak, retained, elapsed
+
+
+if __name__ == "__main__":
+
+    print(f"Size of one 4x4 float32 matrix: {MATRIX_BYTES} bytes")
+    print(f"{'N':>6s} {'allocating peak':>16s} {'in place peak':>14s} {'retained':>9s}"
+          f" {'allocating':>12s} {'in place':>12s}  same matrices")
+
+    for N in [1, 10, 100, 1000]:
+        inPlaceFrame = InPlaceFrame(N)
+
+        allocatingPeak, _, allocatingTime = measure(allocatingFrame, N)
+        inPlacePeak, inPlaceRetained, inPlaceTime = measure(inPlaceFrame, N)
+
+        # trs is built directly, so it may differ from the product of the three matrices in the last bit
+        projection, view, models = allocatingFrame(0.5, N)
+        inPlaceProjection, inPlaceView, inPlaceModels = inPlaceFrame(0.5, N)
+        same = np.array_equal(projection, inPlaceProjection) and np.array_equal(view, inPlaceView) \
+            and np.allclose(np.array(models), inPlaceFrame.modelStack, atol=1e-5)
+
+        print(f"{N:6d} {allocatingPeak:10d} bytes {inPlacePeak:8d} bytes {inPlaceRetained:9d}"
+              f" {allocatingTime * 1000:9.3f} ms {inPlaceTime * 1000:9.3f} ms  {same}")
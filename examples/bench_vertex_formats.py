@@ -0,0 +1,123 @@
+# coding=utf-8
+"""
+Benchmark: vertex formats of the textured lighting pipelines, for a city of textured blocks merged in one mesh.
+- float: 8 floats per vertex, 32 bytes.
+- compact: float positions, half float texture coordinates and 2_10_10_10 normals, 20 bytes.
+- compact int16: as compact with normalized int16 positions, 16 bytes. The city is built within [-1, 1]
+  and scaled by its model matrix.
+For each one, the buffer sizes, the median frame time and the difference with the image of float vertices.
+Indices take 16 bits when the mesh has less than 65536 vertices.
+A hidden GLFW window provides the OpenGL context.
+"""
+
+import glfw
+from OpenGL.GL import *
+import os.path
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import grafica.transformations as tr
+import grafica.basic_shapes as bs
+import grafica.gpu_shape as gs
+import grafica.lighting_shaders as ls
+import grafica.texture_cache as tc
+from grafica.assets_path import getAssetPath
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+CITY_SIZES = [40, 64]
+FRAMES = 20
+SIZE = 512
+
+
+def createCityShape(size, rng):
+    # Blocks of random heights on a size x size grid, positions within [-1, 1]
+    cube = bs.createTextureNormalsCube("")
+    transforms = []
+    for i in range(size):
+        for j in range(size):
+            height = rng.uniform(0.2, 1.0)
+            transforms += [tr.matmul([tr.translate((2 * i + 1) / size - 1, (2 * j + 1) / size - 1, height / size),
+                                      tr.scale(1.6 / size, 1.6 / size, 2 * height / size)])]
+    return bs.mergeShapes([cube] * len(transforms), 8, transforms, 5)
+
+
+def setUniforms(pipeline, size):
+    glUseProgram(pipeline.shaderProgram)
+    for name, value in [("La", (1.0, 1.0, 1.0)), ("Ld", (1.0, 1.0, 1.0)), ("Ls", (1.0, 1.0, 1.0)),
+                        ("Ka", (0.2, 0.2, 0.2)), ("Kd", (0.9, 0.9, 0.9)), ("Ks", (1.0, 1.0, 1.0)),
+                        ("lightPosition", (0, 0, size)), ("viewPosition", (size, size, size / 2)),
+                        ("shininess", 100), ("constantAttenuation", 0.001),
+                        ("linearAttenuation", 0.01), ("quadraticAttenuation", 0.0001)]:
+        pipeline.setUniform(name, value)
+    pipeline.setUniform("projection", tr.perspective(45, 1, 0.1, 4 * size))
+    pipeline.setUniform("view", tr.lookAt(np.array([size, size, size / 2]), np.array([0, 0, 0]),
+                                          np.array([0, 0, 1])))
+    pipeline.setUniform("model", tr.uniformScale(size / 2))
+
+
+def drawTime(pipeline, gpuShape, size):
+    times = []
+    for i in range(FRAMES + 1):
+        t0 = time.perf_counter()
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        setUniforms(pipeline, size)
+        pipeline.drawCall(gpuShape)
+        glFinish()
+        times += [time.perf_counter() - t0]
+    image = np.frombuffer(glReadPixels(0, 0, SIZE, SIZE, GL_RGB, GL_UNSIGNED_BYTE), dtype=np.uint8)
+    return np.median(times[1:]), image.astype(np.float64)
+
+
+if __name__ == "__main__":
+
+    if not glfw.init():
+        sys.exit("GLFW could not be initialized")
+
+    glfw.window_hint(glfw.VISIBLE, glfw.FALSE)
+    window = glfw.create_window(SIZE, SIZE, "Vertex formats", None, None)
+    if not window:
+        glfw.terminate()
+        sys.exit("An OpenGL context could not be created")
+    glfw.make_context_current(window)
+    glViewport(0, 0, SIZE, SIZE)
+    glEnable(GL_DEPTH_TEST)
+
+    pipeline = ls.SimpleTexturePhongShaderProgram()
+    cache = tc.TextureCache()
+    texture = cache.acquire(getAssetPath("bricks.jpg"), GL_REPEAT, GL_REPEAT, *tc.TRILINEAR)
+    rng = np.random.default_rng(0)
+
+    for size in CITY_SIZES:
+        shape = createCityShape(size, rng)
+        print(f"City of {size}x{size} blocks, {len(shape.vertices) // 8} vertices, {len(shape.indices)} indices")
+        print(f"{'':>16s} {'vertices':>10s} {'indices':>10s} {'frame':>10s} {'max diff':>9s} {'PSNR':>9s}")
+
+        reference = None
+        for label, vertexFormat in [("float", None), ("compact", gs.COMPACT_VERTICES),
+                                    ("compact int16", gs.COMPACT_INT16_VERTICES)]:
+            gpuShape = gs.GPUShape().initBuffers()
+            gpuShape.vertexFormat = vertexFormat
+            pipeline.setupVAO(gpuShape)
+            gpuShape.fillBuffers(shape.vertices, shape.indices, GL_STATIC_DRAW)
+            gpuShape.texture = texture
+
+            vertexBytes = glGetBufferParameteriv(GL_ARRAY_BUFFER, GL_BUFFER_SIZE)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
+            indexBytes = glGetBufferParameteriv(GL_ELEMENT_ARRAY_BUFFER, GL_BUFFER_SIZE)
+            elapsed, image = drawTime(pipeline, gpuShape, size)
+
+            reference = image if reference is None else reference
+            error = np.mean((image - reference) ** 2)
+            psnr = 10 * np.log10(255 ** 2 / error) if error > 0 else float("inf")
+            print(f"{label:>16s} {vertexBytes / (1024 * 1024):7.2f} MB {indexBytes / (1024 * 1024):7.2f} MB "
+                  f"{elapsed * 1000:7.2f} ms {np.max(np.abs(image - reference)):9.0f} {psnr:6.1f} dB")
+
+            gpuShape.texture = None
+            gpuShape.clear()
+
+    cache.clear()
+    glfw.terminate()
@@ -0,0 +1,55 @@
+# coding=utf-8
+"""
+Benchmark: vertex welding of OBJ and OFF meshes. Reports the deduplication ratio and the VBO bytes saved.
+"""
+
+import os.path
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import grafica.basic_shapes as bs
+from grafica.assets_path import getAssetPath
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+# We will use 32 bits data, so floats and integers have 4 bytes
+SIZE_IN_BYTES = 4
+
+
+def checkSameTriangles(shape, weldedShape, stride):
+    # Every triangle must reference exactly the same attributes after welding
+    vertices = np.asarray(shape.vertices, dtype=np.float32).reshape((-1, stride))
+    weldedVertices = weldedShape.vertices.reshape((-1, stride))
+    return np.array_equal(vertices[np.asarray(shape.indices)] + 0.0, weldedVertices[weldedShape.indices])
+
+
+def report(name, shape, weldedShape, stride, elapsed):
+    vertexCount = len(shape.vertices) // stride
+    weldedVertexCount = len(weldedShape.vertices) // stride
+    vboBytes = len(shape.vertices) * SIZE_IN_BYTES
+    weldedVboBytes = len(weldedShape.vertices) * SIZE_IN_BYTES
+
+    print(f"{name:28s} {vertexCount:8d} {weldedVertexCount:8d} {vertexCount / weldedVertexCount:7.2f}x"
+          f" {vboBytes:10d} {weldedVboBytes:10d} {vboBytes - weldedVboBytes:10d}"
+          f" {elapsed * 1000:8.2f} ms  {checkSameTriangles(shape, weldedShape, stride)}")
+
+
+if __name__ == "__main__":
+
+    print(f"{'mesh':28s} {'vertices':>8s} {'welded':>8s} {'ratio':>8s}"
+          f" {'VBO bytes':>10s} {'welded':>10s} {'saved':>10s} {'weld time':>11s}  same triangles")
+
+    for assetName in ['bender_pillar.obj', 'suzanne.obj', 'carrot.obj', 'cilinder_triangle_base.obj']:
+        shape = bs.readOBJ(getAssetPath(assetName))
+        t0 = time.perf_counter()
+        weldedShape = bs.weldVertices(shape, 8)
+        report(assetName, shape, weldedShape, 8, time.perf_counter() - t0)
+
+    for assetName in ['sphere.off', 'Maze.off']:
+        shape = bs.readOFF(getAssetPath(assetName), (1.0, 1.0, 1.0))
+        t0 = time.perf_counter()
+        weldedShape = bs.weldVertices(shape, 9)
+        report(assetName, shape, weldedShape, 9, time.perf_counter() - t0)
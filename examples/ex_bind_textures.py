@@ -124,7 +124,7 @@ class DoubleTextureTransformShaderProgram:
         glActiveTexture(GL_TEXTURE0 + 1)
         glBindTexture(GL_TEXTURE_2D, gpuShape.texture2)
 
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        glDrawElements(mode, gpuShape.size, gpuShape.indexType, None)
 
         # Unbind the current VAO
         glBindVertexArray(0)
@@ -0,0 +1,200 @@
+# coding=utf-8
+"""
+Clustered lighting: a city at night lit by hundreds of street lamps and a few moving spot lights.
+Lamps are binned into view space clusters, so each fragment only evaluates the lamps reaching it.
+Press C to toggle clustering, without it every fragment evaluates every lamp in the frustum.
+The window title shows the binning statistics of each frame.
+"""
+
+import glfw
+from OpenGL.GL import *
+import numpy as np
+import sys
+import os.path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import grafica.transformations as tr
+import grafica.basic_shapes as bs
+import grafica.easy_shaders as es
+import grafica.lighting_shaders as ls
+import grafica.light_clusters as lc
+from grafica.assets_path import getAssetPath
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+CITY_SIZE = 20
+BLOCK = 3.0
+SPOT_LIGHTS = 8
+
+
+# A class to store the application control
+class Controller:
+    def __init__(self):
+        self.fillPolygon = True
+        self.clustered = True
+
+
+# We will use the global controller as communication with the callback function
+controller = Controller()
+
+
+def on_key(window, key, scancode, action, mods):
+    if action != glfw.PRESS:
+        return
+
+    global controller
+
+    if key == glfw.KEY_SPACE:
+        controller.fillPolygon = not controller.fillPolygon
+
+    elif key == glfw.KEY_C:
+        controller.clustered = not controller.clustered
+
+    elif key == glfw.KEY_ESCAPE:
+        glfw.set_window_should_close(window, True)
+
+
+def createLamps(size):
+    # A lamp at each corner of every block, next to the streets
+    corners = (np.arange(size + 1) - size / 2) * BLOCK - BLOCK / 2
+    x, y = np.meshgrid(corners, corners)
+    return np.column_stack([x.ravel(), y.ravel(), np.full(x.size, 0.8)])
+
+
+def setSpotLights(lightClusters, t):
+    # Spot lights flying in circles over the city, pointing down
+    angles = t * 0.3 + np.arange(SPOT_LIGHTS) * 2 * np.pi / SPOT_LIGHTS
+    radius = CITY_SIZE * BLOCK * 0.3
+    positions = np.column_stack([radius * np.cos(angles), radius * np.sin(angles), np.full(SPOT_LIGHTS, 4.0)])
+    lightClusters.setSpotLights(positions, directions=(0.0, 0.0, -1.0),
+                                cutOff=np.cos(np.radians(15)), outerCutOff=np.cos(np.radians(25)),
+                                diffuse=(0.4, 0.6, 1.0), specular=(0.4, 0.6, 1.0),
+                                constant=1.0, linear=0.1, quadratic=0.1)
+
+
+if __name__ == "__main__":
+
+    # Initialize glfw
+    if not glfw.init():
+        glfw.set_window_should_close(window, True)
+
+    width = 800
+    height = 600
+
+    window = glfw.create_window(width, height, "Clustered lights demo", None, None)
+
+    if not window:
+        glfw.terminate()
+        glfw.set_window_should_close(window, True)
+
+    glfw.make_context_current(window)
+
+    # Connecting the callback function 'on_key' to handle keyboard events
+    glfw.set_key_callback(window, on_key)
+
+    pipeline = ls.ClusteredLightTexturePhongShaderProgram()
+
+    # Setting up the clear screen color
+    glClearColor(0.02, 0.02, 0.05, 1.0)
+
+    # As we work in 3D, we need to check which part is in front,
+    # and which one is at the back
+    glEnable(GL_DEPTH_TEST)
+
+    # Convenience function to ease initialization
+    def createGPUShape(shape, textureName):
+        gpuShape = es.GPUShape().initBuffers()
+        pipeline.setupVAO(gpuShape)
+        gpuShape.fillBuffers(shape.vertices, shape.indices, GL_STATIC_DRAW)
+        gpuShape.texture = es.textureSimpleSetup(
+            getAssetPath(textureName), GL_REPEAT, GL_REPEAT, GL_LINEAR, GL_LINEAR)
+        return gpuShape
+
+    gpuBuilding = createGPUShape(bs.createTextureNormalsCube(""), "bricks.jpg")
+    gpuFloor = createGPUShape(bs.createTextureQuadWithNormal(CITY_SIZE * BLOCK, CITY_SIZE * BLOCK), "grass.jfif")
+
+    rng = np.random.default_rng(0)
+    models = [(gpuFloor, tr.uniformScale(CITY_SIZE * BLOCK))]
+    for i in range(CITY_SIZE):
+        for j in range(CITY_SIZE):
+            buildingHeight = rng.uniform(0.5, 3.0)
+            position = (np.array([i, j]) - CITY_SIZE / 2) * BLOCK
+            models += [(gpuBuilding, tr.matmul([tr.translate(position[0], position[1], buildingHeight / 2),
+                                                tr.scale(1.8, 1.8, buildingHeight)]))]
+
+    # Warm street lamps, bright up close and fading within a few meters
+    clustered = lc.LightClusters()
+    unclustered = lc.LightClusters(grid=(1, 1, 1))
+    for lightClusters in [clustered, unclustered]:
+        lightClusters.setPointLights(createLamps(CITY_SIZE), diffuse=(2.0, 1.5, 0.8), specular=(1.0, 0.8, 0.6),
+                                     ambient=(0.0003, 0.0003, 0.0005), constant=1.0, linear=0.5, quadratic=3.0)
+
+    projection = tr.perspective(60, float(width) / float(height), 0.1, 100)
+
+    t0 = glfw.get_time()
+    camera_theta = np.pi / 4
+    frames = 0
+    fpsTime = t0
+
+    while not glfw.window_should_close(window):
+
+        # Using GLFW to check for input events
+        glfw.poll_events()
+
+        # Getting the time difference from the previous iteration
+        t1 = glfw.get_time()
+        dt = t1 - t0
+        t0 = t1
+
+        if (glfw.get_key(window, glfw.KEY_LEFT) == glfw.PRESS):
+            camera_theta += 2 * dt
+
+        if (glfw.get_key(window, glfw.KEY_RIGHT) == glfw.PRESS):
+            camera_theta -= 2 * dt
+
+        viewPos = np.array([25 * np.cos(camera_theta), 25 * np.sin(camera_theta), 8])
+        view = tr.lookAt(viewPos, np.array([0, 0, 0]), np.array([0, 0, 1]))
+
+        lightClusters = clustered if controller.clustered else unclustered
+        setSpotLights(lightClusters, t1)
+        lightClusters.update(view, projection)
+
+        # Clearing the screen in both, color and depth
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+
+        # Filling or not the shapes depending on the controller state
+        if (controller.fillPolygon):
+            glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
+        else:
+            glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
+
+        glUseProgram(pipeline.shaderProgram)
+        pipeline.setLightClusters(lightClusters)
+        pipeline.setUniform("material.shininess", 32.0)
+        pipeline.setUniform("viewPosition", viewPos)
+        pipeline.setUniform("projection", projection)
+        pipeline.setUniform("view", view)
+
+        for gpuShape, model in models:
+            pipeline.setUniform("model", model)
+            pipeline.drawCall(gpuShape)
+
+        frames += 1
+        if t1 - fpsTime > 1.0:
+            mode = "clustered" if controller.clustered else "one cluster"
+            glfw.set_window_title(window, f"Clustered lights demo - {mode} - {lightClusters.stats} - "
+                                          f"{frames / (t1 - fpsTime):.1f} fps")
+            frames = 0
+            fpsTime = t1
+
+        # Once the render is done, buffers are swapped, showing only the complete scene.
+        glfw.swap_buffers(window)
+
+    # freeing GPU memory
+    clustered.clear()
+    unclustered.clear()
+    gpuBuilding.clear()
+    gpuFloor.clear()
+
+    glfw.terminate()
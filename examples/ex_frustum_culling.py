@@ -0,0 +1,201 @@
+# coding=utf-8
+"""
+Frustum culling: a city of buildings over a ground plane, seen from the street.
+Press C to toggle culling, the window title shows the culling statistics of each frame.
+"""
+
+import glfw
+from OpenGL.GL import *
+import numpy as np
+import sys
+import os.path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import grafica.transformations as tr
+import grafica.basic_shapes as bs
+import grafica.easy_shaders as es
+import grafica.lighting_shaders as ls
+import grafica.scene_graph as sg
+from grafica.assets_path import getAssetPath
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+CITY_SIZE = 40
+
+
+# A class to store the application control
+class Controller:
+    def __init__(self):
+        self.fillPolygon = True
+        self.culling = True
+
+
+# We will use the global controller as communication with the callback function
+controller = Controller()
+
+
+def on_key(window, key, scancode, action, mods):
+    if action != glfw.PRESS:
+        return
+
+    global controller
+
+    if key == glfw.KEY_SPACE:
+        controller.fillPolygon = not controller.fillPolygon
+
+    elif key == glfw.KEY_C:
+        controller.culling = not controller.culling
+
+    elif key == glfw.KEY_ESCAPE:
+        glfw.set_window_should_close(window, True)
+
+
+def createCity(gpuBuilding, gpuFloor, size):
+    # Buildings are grouped by rows, so whole rows behind the camera are culled with a single test
+    rng = np.random.default_rng(0)
+    city = sg.SceneGraphNode("city")
+
+    floor = sg.SceneGraphNode("floor")
+    floor.transform = tr.matmul([tr.translate(0, 0, 0), tr.uniformScale(size)])
+    floor.childs += [gpuFloor]
+    city.childs += [floor]
+
+    for i in range(size):
+        row = sg.SceneGraphNode("row_" + str(i))
+        row.transform = tr.translate(0, i - size / 2, 0)
+
+        for j in range(size):
+            height = rng.uniform(0.5, 3.0)
+            building = sg.SceneGraphNode("building_" + str(i) + "_" + str(j))
+            building.transform = tr.matmul([tr.translate(j - size / 2, 0, height / 2), tr.scale(0.5, 0.5, height)])
+            building.childs += [gpuBuilding]
+            row.childs += [building]
+
+        city.childs += [row]
+
+    return city
+
+
+if __name__ == "__main__":
+
+    # Initialize glfw
+    if not glfw.init():
+        glfw.set_window_should_close(window, True)
+
+    width = 800
+    height = 600
+
+    window = glfw.create_window(width, height, "Frustum culling demo", None, None)
+
+    if not window:
+        glfw.terminate()
+        glfw.set_window_should_close(window, True)
+
+    glfw.make_context_current(window)
+
+    # Connecting the callback function 'on_key' to handle keyboard events
+    glfw.set_key_callback(window, on_key)
+
+    pipeline = ls.SimpleTexturePhongShaderProgram()
+
+    # Setting up the clear screen color
+    glClearColor(0.85, 0.85, 0.85, 1.0)
+
+    # As we work in 3D, we need to check which part is in front,
+    # and which one is at the back
+    glEnable(GL_DEPTH_TEST)
+
+    # Convenience function to ease initialization
+    def createGPUShape(shape, textureName):
+        gpuShape = es.GPUShape().initBuffers()
+        pipeline.setupVAO(gpuShape)
+        gpuShape.fillBuffers(shape.vertices, shape.indices, GL_STATIC_DRAW)
+        gpuShape.texture = es.textureSimpleSetup(
+            getAssetPath(textureName), GL_REPEAT, GL_REPEAT, GL_LINEAR, GL_LINEAR)
+        return gpuShape
+
+    gpuBuilding = createGPUShape(bs.createTextureNormalsCube(""), "bricks.jpg")
+    gpuFloor = createGPUShape(bs.createTextureQuadWithNormal(CITY_SIZE, CITY_SIZE), "grass.jfif")
+
+    city = createCity(gpuBuilding, gpuFloor, CITY_SIZE)
+
+    # The city is static, so its bounding boxes are computed only once
+    sg.updateWorldBounds(city)
+    stats = sg.CullingStats()
+
+    projection = tr.perspective(45, float(width) / float(height), 0.1, 100)
+    view = np.empty((4, 4), dtype=np.float32)
+    viewProjection = np.empty((4, 4), dtype=np.float32)
+
+    t0 = glfw.get_time()
+    camera_theta = np.pi / 2
+    frames = 0
+    fpsTime = t0
+
+    while not glfw.window_should_close(window):
+
+        # Using GLFW to check for input events
+        glfw.poll_events()
+
+        # Getting the time difference from the previous iteration
+        t1 = glfw.get_time()
+        dt = t1 - t0
+        t0 = t1
+
+        if (glfw.get_key(window, glfw.KEY_LEFT) == glfw.PRESS):
+            camera_theta += 2 * dt
+
+        if (glfw.get_key(window, glfw.KEY_RIGHT) == glfw.PRESS):
+            camera_theta -= 2 * dt
+
+        # Walking along the street between two rows of buildings
+        viewPos = (0.5, 0, 0.5)
+        tr.lookAt(viewPos, (0.5 + np.cos(camera_theta), np.sin(camera_theta), 0.5), (0, 0, 1), out=view)
+        np.matmul(projection, view, out=viewProjection)
+
+        # Clearing the screen in both, color and depth
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+
+        # Filling or not the shapes depending on the controller state
+        if (controller.fillPolygon):
+            glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
+        else:
+            glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
+
+        glUseProgram(pipeline.shaderProgram)
+        pipeline.setUniform("La", (1.0, 1.0, 1.0))
+        pipeline.setUniform("Ld", (1.0, 1.0, 1.0))
+        pipeline.setUniform("Ls", (1.0, 1.0, 1.0))
+        pipeline.setUniform("Ka", (0.3, 0.3, 0.3))
+        pipeline.setUniform("Kd", (0.9, 0.9, 0.9))
+        pipeline.setUniform("Ks", (0.5, 0.5, 0.5))
+        pipeline.setUniform("lightPosition", (0, 0, 30))
+        pipeline.setUniform("viewPosition", viewPos)
+        pipeline.setUniform("shininess", 100)
+        pipeline.setUniform("constantAttenuation", 0.5)
+        pipeline.setUniform("linearAttenuation", 0.01)
+        pipeline.setUniform("quadraticAttenuation", 0.0001)
+        pipeline.setUniform("projection", projection)
+        pipeline.setUniform("view", view)
+
+        if controller.culling:
+            sg.drawSceneGraphNodeCulled(city, pipeline, "model", viewProjection, stats)
+        else:
+            sg.drawSceneGraphNode(city, pipeline, "model")
+
+        frames += 1
+        if t1 - fpsTime > 1.0:
+            culling = str(stats) if controller.culling else "culling off"
+            glfw.set_window_title(window, f"Frustum culling demo - {culling} - {frames / (t1 - fpsTime):.1f} fps")
+            frames = 0
+            fpsTime = t1
+
+        # Once the render is done, buffers are swapped, showing only the complete scene.
+        glfw.swap_buffers(window)
+
+    # freeing GPU memory
+    gpuBuilding.clear()
+    gpuFloor.clear()
+
+    glfw.terminate()
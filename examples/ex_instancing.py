@@ -0,0 +1,239 @@
+# coding=utf-8
+"""
+Drawing a city of repeated textured blocks with hardware instancing.
+The same GPUShape appears under thousands of scene graph nodes, press I to switch between
+traversing the scene graph (one draw call per block) and one instanced draw call per GPUShape.
+"""
+
+import glfw
+from OpenGL.GL import *
+import numpy as np
+import sys
+import os.path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import grafica.transformations as tr
+import grafica.basic_shapes as bs
+import grafica.easy_shaders as es
+import grafica.lighting_shaders as ls
+import grafica.scene_graph as sg
+from grafica.assets_path import getAssetPath
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+LIGHT_FLAT = 0
+LIGHT_GOURAUD = 1
+LIGHT_PHONG = 2
+
+CITY_SIZE = 60
+
+
+# A class to store the application control
+class Controller:
+    def __init__(self):
+        self.fillPolygon = True
+        self.instancing = True
+        self.lightingModel = LIGHT_PHONG
+
+
+# We will use the global controller as communication with the callback function
+controller = Controller()
+
+
+def on_key(window, key, scancode, action, mods):
+    if action != glfw.PRESS:
+        return
+
+    global controller
+
+    if key == glfw.KEY_SPACE:
+        controller.fillPolygon = not controller.fillPolygon
+
+    elif key == glfw.KEY_I:
+        controller.instancing = not controller.instancing
+        print("Instancing: ", controller.instancing)
+
+    elif key == glfw.KEY_Q:
+        controller.lightingModel = LIGHT_FLAT
+
+    elif key == glfw.KEY_W:
+        controller.lightingModel = LIGHT_GOURAUD
+
+    elif key == glfw.KEY_E:
+        controller.lightingModel = LIGHT_PHONG
+
+    elif key == glfw.KEY_ESCAPE:
+        glfw.set_window_should_close(window, True)
+
+
+def createCity(gpuBlock, gpuRoof, size):
+    # Every block has a random height, and a roof on top of it
+    rng = np.random.default_rng(0)
+    city = sg.SceneGraphNode("city")
+
+    for i in range(size):
+        for j in range(size):
+            height = rng.uniform(0.5, 3.0)
+
+            block = sg.SceneGraphNode("block_" + str(i) + "_" + str(j))
+            block.transform = tr.matmul([tr.translate(i - size / 2, j - size / 2, height / 2),
+                                         tr.scale(0.6, 0.6, height)])
+            block.childs += [gpuBlock]
+
+            roof = sg.SceneGraphNode("roof_" + str(i) + "_" + str(j))
+            roof.transform = tr.matmul([tr.translate(i - size / 2, j - size / 2, height + 0.1),
+                                        tr.scale(0.3, 0.3, 0.2)])
+            roof.childs += [gpuRoof]
+
+            city.childs += [block, roof]
+
+    return city
+
+
+def setLightingUniforms(pipeline, projection, view, viewPos):
+    glUseProgram(pipeline.shaderProgram)
+
+    pipeline.setUniform("La", (1.0, 1.0, 1.0))
+    pipeline.setUniform("Ld", (1.0, 1.0, 1.0))
+    pipeline.setUniform("Ls", (1.0, 1.0, 1.0))
+
+    pipeline.setUniform("Ka", (0.3, 0.3, 0.3))
+    pipeline.setUniform("Kd", (0.9, 0.9, 0.9))
+    pipeline.setUniform("Ks", (0.5, 0.5, 0.5))
+
+    pipeline.setUniform("lightPosition", (0, 0, 30))
+    pipeline.setUniform("viewPosition", viewPos)
+    pipeline.setUniform("shininess", 100)
+
+    pipeline.setUniform("constantAttenuation", 0.5)
+    pipeline.setUniform("linearAttenuation", 0.01)
+    pipeline.setUniform("quadraticAttenuation", 0.0001)
+
+    pipeline.setUniform("projection", projection)
+    pipeline.setUniform("view", view)
+
+
+if __name__ == "__main__":
+
+    # Initialize glfw
+    if not glfw.init():
+        glfw.set_window_should_close(window, True)
+
+    width = 800
+    height = 800
+
+    window = glfw.create_window(width, height, "Instancing demo", None, None)
+
+    if not window:
+        glfw.terminate()
+        glfw.set_window_should_close(window, True)
+
+    glfw.make_context_current(window)
+
+    # Connecting the callback function 'on_key' to handle keyboard events
+    glfw.set_key_callback(window, on_key)
+
+    # Regular and instanced versions of each lighting strategy
+    pipelines = [ls.SimpleTextureFlatShaderProgram(),
+                 ls.SimpleTextureGouraudShaderProgram(),
+                 ls.SimpleTexturePhongShaderProgram()]
+    instancedPipelines = [ls.InstancedTextureFlatShaderProgram(),
+                          ls.InstancedTextureGouraudShaderProgram(),
+                          ls.InstancedTexturePhongShaderProgram()]
+
+    # Setting up the clear screen color
+    glClearColor(0.85, 0.85, 0.85, 1.0)
+
+    # As we work in 3D, we need to check which part is in front,
+    # and which one is at the back
+    glEnable(GL_DEPTH_TEST)
+
+    # Convenience function to ease initialization
+    def createGPUShape(pipeline, shape, textureName):
+        gpuShape = es.GPUShape().initBuffers()
+        pipeline.setupVAO(gpuShape)
+        gpuShape.fillBuffers(shape.vertices, shape.indices, GL_STATIC_DRAW)
+        gpuShape.texture = es.textureSimpleSetup(
+            getAssetPath(textureName), GL_REPEAT, GL_REPEAT, GL_LINEAR, GL_LINEAR)
+        return gpuShape
+
+    # The vertex layout is the same for the 3 regular pipelines
+    cube = bs.createTextureNormalsCube("")
+    gpuBlock = createGPUShape(pipelines[0], cube, "bricks.jpg")
+    gpuRoof = createGPUShape(pipelines[0], cube, "dice_blue.jpg")
+
+    city = createCity(gpuBlock, gpuRoof, CITY_SIZE)
+
+    # The vertex layout is also the same for the 3 instanced pipelines, so the instanced
+    # shapes are set up only once
+    instancedCity = sg.instanceSceneGraphNode(city, instancedPipelines[0])
+    print("Blocks in the city: ", 2 * CITY_SIZE * CITY_SIZE)
+    print("Instanced draw calls: ", len(instancedCity))
+
+    t0 = glfw.get_time()
+    camera_theta = np.pi / 4
+    frames = 0
+    fpsTime = t0
+
+    while not glfw.window_should_close(window):
+
+        # Using GLFW to check for input events
+        glfw.poll_events()
+
+        # Getting the time difference from the previous iteration
+        t1 = glfw.get_time()
+        dt = t1 - t0
+        t0 = t1
+
+        frames += 1
+        if t1 - fpsTime > 1.0:
+            glfw.set_window_title(window, f"Instancing demo - {'instanced' if controller.instancing else 'scene graph'}"
+                                          f" - {frames / (t1 - fpsTime):.1f} fps")
+            frames = 0
+            fpsTime = t1
+
+        if (glfw.get_key(window, glfw.KEY_LEFT) == glfw.PRESS):
+            camera_theta -= 2 * dt
+
+        if (glfw.get_key(window, glfw.KEY_RIGHT) == glfw.PRESS):
+            camera_theta += 2 * dt
+
+        projection = tr.perspective(45, float(width) / float(height), 0.1, 200)
+
+        viewPos = np.array([CITY_SIZE * np.sin(camera_theta), CITY_SIZE * np.cos(camera_theta), CITY_SIZE / 2])
+
+        view = tr.lookAt(
+            viewPos,
+            np.array([0, 0, 0]),
+            np.array([0, 0, 1])
+        )
+
+        # Clearing the screen in both, color and depth
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+
+        # Filling or not the shapes depending on the controller state
+        if (controller.fillPolygon):
+            glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
+        else:
+            glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
+
+        if controller.instancing:
+            lightingPipeline = instancedPipelines[controller.lightingModel]
+            setLightingUniforms(lightingPipeline, projection, view, viewPos)
+            sg.drawInstancedShapes(instancedCity, lightingPipeline)
+        else:
+            lightingPipeline = pipelines[controller.lightingModel]
+            setLightingUniforms(lightingPipeline, projection, view, viewPos)
+            sg.drawSceneGraphNode(city, lightingPipeline, "model")
+
+        # Once the render is done, buffers are swapped, showing only the complete scene.
+        glfw.swap_buffers(window)
+
+    # freeing GPU memory
+    for instancedShape in instancedCity:
+        instancedShape.clear()
+    gpuBlock.clear()
+    gpuRoof.clear()
+
+    glfw.terminate()
@@ -4,7 +4,6 @@ Showing lighting effects over two textured objects: Flat, Gauraud and Phong.
 """
 
 import glfw
-import copy
 from OpenGL.GL import *
 import numpy as np
 import sys
@@ -172,12 +171,10 @@ if __name__ == "__main__":
         getAssetPath("dice.jpg"), GL_REPEAT, GL_REPEAT, GL_LINEAR, GL_LINEAR)
 
     # Since the only difference between both dices is the texture, we can just use the same
-    # GPU data, but with another texture.
-    # copy.deepcopy generate a true copy, so if we change gpuDiceBlue.texture (or any other
-    # member), we will not change gpuDice.texture
-    gpuDiceBlue = copy.deepcopy(gpuDice)
-    gpuDiceBlue.texture = es.textureSimpleSetup(
-        getAssetPath("dice_blue.jpg"), GL_REPEAT, GL_REPEAT, GL_LINEAR, GL_LINEAR)
+    # GPU data, but with another texture. withTexture shares the buffers of gpuDice,
+    # so changing gpuDiceBlue.texture does not change gpuDice.texture
+    gpuDiceBlue = gpuDice.withTexture(es.textureSimpleSetup(
+        getAssetPath("dice_blue.jpg"), GL_REPEAT, GL_REPEAT, GL_LINEAR, GL_LINEAR))
 
     print("Here we can verify that we are using the same GPU buffers, but with a different texture")
     print("Dice      : ", gpuDice)
@@ -247,36 +244,33 @@ if __name__ == "__main__":
         # Setting all uniform shader variables
 
         # White light in all components: ambient, diffuse and specular.
-        glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "La"), 1.0, 1.0, 1.0)
-        glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ld"), 1.0, 1.0, 1.0)
-        glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ls"), 1.0, 1.0, 1.0)
+        lightingPipeline.setUniform("La", (1.0, 1.0, 1.0))
+        lightingPipeline.setUniform("Ld", (1.0, 1.0, 1.0))
+        lightingPipeline.setUniform("Ls", (1.0, 1.0, 1.0))
 
         # Object is barely visible at only ambient. Bright white for diffuse and specular components.
-        glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ka"), 0.2, 0.2, 0.2)
-        glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Kd"), 0.9, 0.9, 0.9)
-        glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ks"), 1.0, 1.0, 1.0)
+        lightingPipeline.setUniform("Ka", (0.2, 0.2, 0.2))
+        lightingPipeline.setUniform("Kd", (0.9, 0.9, 0.9))
+        lightingPipeline.setUniform("Ks", (1.0, 1.0, 1.0))
 
         # TO DO: Explore different parameter combinations to understand their effect!
 
-        glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "lightPosition"), -5, -5, 5)
-        glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "viewPosition"), viewPos[0], viewPos[1],
-                    viewPos[2])
-        glUniform1ui(glGetUniformLocation(lightingPipeline.shaderProgram, "shininess"), 100)
+        lightingPipeline.setUniform("lightPosition", (-5, -5, 5))
+        lightingPipeline.setUniform("viewPosition", (viewPos[0], viewPos[1], viewPos[2]))
+        lightingPipeline.setUniform("shininess", 100)
 
-        glUniform1f(glGetUniformLocation(lightingPipeline.shaderProgram, "constantAttenuation"), 0.0001)
-        glUniform1f(glGetUniformLocation(lightingPipeline.shaderProgram, "linearAttenuation"), 0.03)
-        glUniform1f(glGetUniformLocation(lightingPipeline.shaderProgram, "quadraticAttenuation"), 0.01)
+        lightingPipeline.setUniform("constantAttenuation", 0.0001)
+        lightingPipeline.setUniform("linearAttenuation", 0.03)
+        lightingPipeline.setUniform("quadraticAttenuation", 0.01)
 
-        glUniformMatrix4fv(glGetUniformLocation(lightingPipeline.shaderProgram, "projection"), 1, GL_TRUE, projection)
-        glUniformMatrix4fv(glGetUniformLocation(lightingPipeline.shaderProgram, "view"), 1, GL_TRUE, view)
+        lightingPipeline.setUniform("projection", projection)
+        lightingPipeline.setUniform("view", view)
 
         # Drawing
-        glUniformMatrix4fv(glGetUniformLocation(lightingPipeline.shaderProgram, "model"), 1, GL_TRUE,
-                           tr.translate(0.75, 0, 0))
+        lightingPipeline.setUniform("model", tr.translate(0.75, 0, 0))
         lightingPipeline.drawCall(gpuDice)
 
-        glUniformMatrix4fv(glGetUniformLocation(lightingPipeline.shaderProgram, "model"), 1, GL_TRUE,
-                           tr.translate(-0.75, 0, 0))
+        lightingPipeline.setUniform("model", tr.translate(-0.75, 0, 0))
         lightingPipeline.drawCall(gpuDiceBlue)
 
         # Once the drawing is rendered, buffers are swap so an uncomplete drawing is never seen.
@@ -284,7 +278,7 @@ if __name__ == "__main__":
 
     # freeing GPU memory
     gpuAxis.clear()
-    gpuDice.clear()
     gpuDiceBlue.clear()
+    gpuDice.clear()
 
     glfw.terminate()
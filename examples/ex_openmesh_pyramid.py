@@ -223,21 +223,21 @@ if __name__ == "__main__":
         glUseProgram(pipeline.shaderProgram)
 
         # White light in all components: ambient, diffuse and specular.
-        glUniform3f(glGetUniformLocation(pipeline.shaderProgram, "La"), 1.0, 1.0, 1.0)
-        glUniform3f(glGetUniformLocation(pipeline.shaderProgram, "Ld"), 1.0, 1.0, 1.0)
-        glUniform3f(glGetUniformLocation(pipeline.shaderProgram, "Ls"), 1.0, 1.0, 1.0)
+        pipeline.setUniform("La", (1.0, 1.0, 1.0))
+        pipeline.setUniform("Ld", (1.0, 1.0, 1.0))
+        pipeline.setUniform("Ls", (1.0, 1.0, 1.0))
 
         # Object is barely visible at only ambient. Bright white for diffuse and specular components.
-        glUniform3f(glGetUniformLocation(pipeline.shaderProgram, "Ka"), 0.2, 0.2, 0.2)
-        glUniform3f(glGetUniformLocation(pipeline.shaderProgram, "Kd"), 0.9, 0.9, 0.9)
-        glUniform3f(glGetUniformLocation(pipeline.shaderProgram, "Ks"), 1.0, 1.0, 1.0)
+        pipeline.setUniform("Ka", (0.2, 0.2, 0.2))
+        pipeline.setUniform("Kd", (0.9, 0.9, 0.9))
+        pipeline.setUniform("Ks", (1.0, 1.0, 1.0))
 
-        glUniform3f(glGetUniformLocation(pipeline.shaderProgram, "lightPosition"), -5, -5, 5)
-        glUniform1ui(glGetUniformLocation(pipeline.shaderProgram, "shininess"), 100)
+        pipeline.setUniform("lightPosition", (-5, -5, 5))
+        pipeline.setUniform("shininess", 100)
 
-        glUniform1f(glGetUniformLocation(pipeline.shaderProgram, "constantAttenuation"), 0.0001)
-        glUniform1f(glGetUniformLocation(pipeline.shaderProgram, "linearAttenuation"), 0.03)
-        glUniform1f(glGetUniformLocation(pipeline.shaderProgram, "quadraticAttenuation"), 0.01)
+        pipeline.setUniform("constantAttenuation", 0.0001)
+        pipeline.setUniform("linearAttenuation", 0.03)
+        pipeline.setUniform("quadraticAttenuation", 0.01)
 
 
     # Setting up uniforms for both lighting pipelines, colored and textured
@@ -291,22 +291,18 @@ if __name__ == "__main__":
 
         # Drawing the single color pyramid
         glUseProgram(lightingPipeline.shaderProgram)
-        glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "viewPosition"), viewPos[0], viewPos[1],
-                    viewPos[2])
-        glUniformMatrix4fv(glGetUniformLocation(lightingPipeline.shaderProgram, "projection"), 1, GL_TRUE, projection)
-        glUniformMatrix4fv(glGetUniformLocation(lightingPipeline.shaderProgram, "view"), 1, GL_TRUE, view)
-        glUniformMatrix4fv(glGetUniformLocation(lightingPipeline.shaderProgram, "model"), 1, GL_TRUE,
-                           tr.translate(0.75, 0, 0))
+        lightingPipeline.setUniform("viewPosition", (viewPos[0], viewPos[1], viewPos[2]))
+        lightingPipeline.setUniform("projection", projection)
+        lightingPipeline.setUniform("view", view)
+        lightingPipeline.setUniform("model", tr.translate(0.75, 0, 0))
         lightingPipeline.drawCall(gpuPyramid)
 
         # Drawing the textured pyramid
         glUseProgram(texturePipeline.shaderProgram)
-        glUniform3f(glGetUniformLocation(texturePipeline.shaderProgram, "viewPosition"), viewPos[0], viewPos[1],
-                    viewPos[2])
-        glUniformMatrix4fv(glGetUniformLocation(texturePipeline.shaderProgram, "projection"), 1, GL_TRUE, projection)
-        glUniformMatrix4fv(glGetUniformLocation(texturePipeline.shaderProgram, "view"), 1, GL_TRUE, view)
-        glUniformMatrix4fv(glGetUniformLocation(texturePipeline.shaderProgram, "model"), 1, GL_TRUE,
-                           tr.translate(-0.75, 0, 0))
+        texturePipeline.setUniform("viewPosition", (viewPos[0], viewPos[1], viewPos[2]))
+        texturePipeline.setUniform("projection", projection)
+        texturePipeline.setUniform("view", view)
+        texturePipeline.setUniform("model", tr.translate(-0.75, 0, 0))
         texturePipeline.drawCall(gpuTexturedPyramid)
 
         # Once the drawing is rendered, buffers are swap so an uncomplete drawing is never seen.
@@ -158,7 +158,7 @@ class ModulationTransformShaderProgram:
 
         # Binding the VAO and executing the draw call
         glBindVertexArray(shape.vao)
-        glDrawElements(mode, shape.size, GL_UNSIGNED_INT, None)
+        glDrawElements(mode, shape.size, shape.indexType, None)
 
         # Unbind the current VAO
         glBindVertexArray(0)
@@ -0,0 +1,191 @@
+# coding=utf-8
+"""
+Binary cache for data derived from assets files, such as parsed meshes.
+
+Each cache file stores a small JSON header followed by raw, aligned array buffers,
+so cached data is memory-mapped instead of parsed again.
+The header records the source path, its modification time, size and content hash:
+when the modification time changed but the content did not, the cache is still used.
+"""
+
+__all__ = [
+    'cachedArrays',
+    'clearCache',
+    'getCachedShape'
+]
+
+import hashlib
+import json
+import os
+import os.path
+import struct
+import numpy as np
+import sys
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from grafica.assets_path import getCachePath
+import grafica.basic_shapes as bs
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+MAGIC = b"GCACHE01"
+ALIGNMENT = 64
+
+# Part of the key of cached shapes, increase it when the shape loaders change their results
+SHAPE_VERSION = 1
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _contentHash(filename):
+    sha1 = hashlib.sha1()
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def _cacheFilename(sourcePath, key):
+    name = hashlib.sha1((sourcePath + "|" + key).encode()).hexdigest()[:16]
+    return getCachePath(os.path.basename(sourcePath) + "." + name + ".bin")
+
+
+def _readHeader(cacheFilename):
+    with open(cacheFilename, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            return None
+        headerSize, = struct.unpack("<Q", file.read(8))
+        header = json.loads(file.read(headerSize).decode())
+
+    # Array buffers start at the first aligned position after the header
+    header["dataStart"] = _align(len(MAGIC) + 8 + headerSize)
+    return header
+
+
+def _writeCache(cacheFilename, header, arrays):
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+
+    # Offsets are relative to the start of the data, right after the aligned header
+    descriptions = []
+    offset = 0
+    for name, array in arrays.items():
+        offset = _align(offset)
+        descriptions += [{"name": name, "dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}]
+        offset += array.nbytes
+
+    header = {key: value for key, value in header.items() if key != "dataStart"}
+    headerBytes = json.dumps(dict(header, arrays=descriptions)).encode()
+    dataStart = _align(len(MAGIC) + 8 + len(headerBytes))
+
+    os.makedirs(os.path.dirname(cacheFilename), exist_ok=True)
+    # Unique per thread too, as textures may be cached from the decoding threads of grafica.texture_loader
+    temporaryFilename = cacheFilename + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp"
+    with open(temporaryFilename, 'wb') as file:
+        file.write(MAGIC)
+        file.write(struct.pack("<Q", len(headerBytes)))
+        file.write(headerBytes)
+        for description, array in zip(descriptions, arrays.values()):
+            file.seek(dataStart + description["offset"])
+            file.write(array.tobytes())
+        file.truncate(dataStart + offset)
+
+    os.replace(temporaryFilename, cacheFilename)
+
+
+def _mapArrays(cacheFilename, header):
+    arrays = {}
+    for description in header["arrays"]:
+        shape = tuple(description["shape"])
+        if int(np.prod(shape)) == 0:
+            arrays[description["name"]] = np.zeros(shape, dtype=np.dtype(description["dtype"]))
+            continue
+        # Copy-on-write, so arrays are writable as the ones just built, without modifying the cache file
+        arrays[description["name"]] = np.memmap(cacheFilename, dtype=np.dtype(description["dtype"]), mode='c',
+                                                offset=header["dataStart"] + description["offset"], shape=shape)
+    return arrays
+
+
+def cachedArrays(sourcePath, key, builder):
+    """
+    Returns the dictionary of arrays builder() computes from sourcePath, from the cache if it is valid.
+    key identifies the kind of data derived from the source (loader and its parameters).
+    Cached arrays are copy-on-write memory-mapped views of the cache file: they may be modified,
+    as the arrays of builder, but changes stay in memory.
+    """
+    return _cachedData(sourcePath, key, lambda: (builder(), None))[0]
+
+
+def _cachedData(sourcePath, key, builder):
+    # As cachedArrays, builder returns the arrays and an info value stored in the header, any JSON value
+    sourcePath = os.path.abspath(sourcePath)
+    cacheFilename = _cacheFilename(sourcePath, key)
+    stat = os.stat(sourcePath)
+
+    header = None
+    try:
+        header = _readHeader(cacheFilename)
+    except (OSError, ValueError, struct.error):
+        header = None
+
+    if header is not None and header.get("key") == key and header.get("path") == sourcePath:
+        # Warm start: an unchanged modification time avoids even hashing the source
+        if header["mtime"] == stat.st_mtime_ns and header["size"] == stat.st_size:
+            return _mapArrays(cacheFilename, header), header.get("info")
+
+        # The file was touched, but its content may be the same
+        if header["size"] == stat.st_size and header["sha1"] == _contentHash(sourcePath):
+            arrays = {name: np.array(array) for name, array in _mapArrays(cacheFilename, header).items()}
+            header = dict(header, mtime=stat.st_mtime_ns)
+            try:
+                _writeCache(cacheFilename, header, arrays)
+            except OSError:
+                pass
+            return arrays, header.get("info")
+
+    arrays, info = builder()
+    header = {"path": sourcePath, "key": key, "mtime": stat.st_mtime_ns, "size": stat.st_size,
+              "sha1": _contentHash(sourcePath), "info": info}
+    try:
+        _writeCache(cacheFilename, header, arrays)
+    except OSError:
+        # The cache is an optimization, a read-only location should not prevent loading the asset
+        pass
+
+    return arrays, info
+
+
+def getCachedShape(filename, loader, *args, **kwargs):
+    """
+    Returns loader(filename, *args, **kwargs) as an ArrayShape, where loader returns an ArrayShape.
+    The parsed result is stored in the binary cache, so following calls skip the parsing.
+    The layout of the shape is kept in the header of the cache file.
+    """
+    key = "ArrayShape:" + str(SHAPE_VERSION) + ":" + loader.__module__ + "." + loader.__qualname__ + \
+          repr(args) + repr(sorted(kwargs.items()))
+
+    def builder():
+        shape = loader(filename, *args, **kwargs)
+        assert isinstance(shape, bs.ArrayShape), "The loader must return an ArrayShape."
+        return {"vertices": shape.vertexData, "indices": shape.indices}, {"layout": shape.layout}
+
+    arrays, info = _cachedData(filename, key, builder)
+    vertices = arrays["vertices"]
+    layout = info["layout"]
+    layout = None if layout is None else tuple((name, components) for name, components in layout)
+    return bs.ArrayShape(vertices, arrays["indices"], vertices.shape[1], layout)
+
+
+def clearCache():
+    """Removes every file of the cache directory."""
+    cacheDirectory = getCachePath("")
+    if not os.path.isdir(cacheDirectory):
+        return
+
+    for name in os.listdir(cacheDirectory):
+        path = os.path.join(cacheDirectory, name)
+        if os.path.isfile(path):
+            os.remove(path)
@@ -3,7 +3,7 @@
 Convenience functionality to access assets files.
 """
 
-__all__ = ['getAssetPath']
+__all__ = ['getAssetPath', 'getCachePath']
 
 import os.path
 
@@ -20,3 +20,14 @@ def getAssetPath(filename):
     assetsDirectory = os.path.join(parentFolderPath, "assets")
     requestedPath = os.path.join(assetsDirectory, filename)
     return requestedPath
+
+
+def getCachePath(filename):
+    """Convenience function to access files of the assets cache, a folder next to the assets one."""
+
+    thisFilePath = os.path.abspath(__file__)
+    thisFolderPath = os.path.dirname(thisFilePath)
+    parentFolderPath = os.path.dirname(thisFolderPath)
+    cacheDirectory = os.path.join(parentFolderPath, "assets_cache")
+    requestedPath = os.path.join(cacheDirectory, filename)
+    return requestedPath
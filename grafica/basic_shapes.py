@@ -5,6 +5,7 @@ Vertices and indices for a variety of simple shapes.
 
 __all__ = [
     'applyOffset',
+    'ArrayShape',
     'createAxis',
     'createColorCircle',
     'createColorConeOFF',
@@ -25,11 +26,16 @@ __all__ = [
     'createTextureQuad',
     'createTextureQuadWithNormal',
     'merge',
+    'mergeShapes',
+    'readOBJ',
     'readOFF',
     'scaleVertices',
-    'Shape'
+    'Shape',
+    'toArrayShape',
+    'weldVertices'
 ]
 
+import itertools
 import math
 import numpy as np
 import sys
@@ -53,14 +59,149 @@ class Shape:
                                                    "indices: " + str(self.indices)
 
 
+class ArrayShape(Shape):
+    """
+    A Shape whose vertices and indices are stored in contiguous NumPy arrays, so they are
+    uploaded to the GPU without any conversion.
+    vertexData has one row of stride float32 values per vertex. layout optionally names the
+    attributes of each row, e.g. (('position', 3), ('texCoords', 2), ('normal', 3)).
+    Indices are uint32, or uint16 if they are given with that type.
+    The vertices attribute is a flat view of vertexData, so code written for Shape keeps working.
+    """
+
+    def __init__(self, vertices, indices, stride, layout=None):
+        self.stride = stride
+        self.layout = layout
+        super().__init__(vertices, indices)
+
+    @property
+    def vertices(self):
+        return self.vertexData.reshape(-1)
+
+    @vertices.setter
+    def vertices(self, vertices):
+        self.vertexData = np.ascontiguousarray(vertices, dtype=np.float32).reshape((-1, self.stride))
+
+    @property
+    def indices(self):
+        return self.indexData
+
+    @indices.setter
+    def indices(self, indices):
+        if isinstance(indices, np.ndarray) and indices.dtype == np.uint16:
+            self.indexData = np.ascontiguousarray(indices)
+        else:
+            self.indexData = np.ascontiguousarray(indices, dtype=np.uint32)
+
+    def getVertexCount(self):
+        return len(self.vertexData)
+
+    def getAttribute(self, name):
+        """Returns a (vertices x components) view of the attribute with the given name in the layout."""
+        assert self.layout is not None, "The shape does not define its layout."
+
+        start = 0
+        for attributeName, components in self.layout:
+            if attributeName == name:
+                return self.vertexData[:, start:start + components]
+            start += components
+
+        raise KeyError(name)
+
+    def toShape(self):
+        """Adapter to a Shape with Python lists, for code which appends to them."""
+        return Shape(self.vertices.tolist(), self.indices.tolist())
+
+
+def toArrayShape(shape, stride, layout=None):
+    """Adapter from a Shape with Python lists (or any sequence) to an ArrayShape."""
+    if isinstance(shape, ArrayShape):
+        return shape
+    return ArrayShape(shape.vertices, shape.indices, stride, layout)
+
+
 def merge(destinationShape, strideSize, sourceShape):
+    # Appends sourceShape to destinationShape. An ArrayShape is copied whole on every call,
+    # merging many shapes one at a time is quadratic: mergeShapes merges them all at once
     # current vertices are an offset for indices refering to vertices of the new shape
     offset = len(destinationShape.vertices)
-    destinationShape.vertices += sourceShape.vertices
-    destinationShape.indices += [(offset / strideSize) + index for index in sourceShape.indices]
+
+    if isinstance(destinationShape, ArrayShape):
+        sourceIndices = np.asarray(sourceShape.indices, dtype=np.uint32) + np.uint32(offset // strideSize)
+        destinationShape.vertices = np.concatenate([destinationShape.vertices,
+                                                    np.asarray(sourceShape.vertices, dtype=np.float32)])
+        destinationShape.indices = np.concatenate([destinationShape.indices.astype(np.uint32), sourceIndices])
+        return
+
+    destinationShape.vertices += list(sourceShape.vertices)
+    destinationShape.indices += [(offset // strideSize) + index for index in sourceShape.indices]
+
+
+def _flatten(sequences, out):
+    # Copies the concatenation of sequences into out, a single pass whether they are arrays or lists.
+    # When the same lists repeat, as one shape merged many times, each one is converted only once
+    if all(isinstance(sequence, np.ndarray) for sequence in sequences):
+        np.concatenate([sequence.reshape(-1) for sequence in sequences], out=out, casting='unsafe')
+        return
+
+    distinct = {id(sequence): sequence for sequence in sequences}
+    if len(distinct) * 2 > len(sequences):
+        out[:] = np.fromiter(itertools.chain.from_iterable(sequences), dtype=out.dtype, count=len(out))
+        return
+
+    arrays = {key: np.asarray(sequence).reshape(-1) for key, sequence in distinct.items()}
+    np.concatenate([arrays[id(sequence)] for sequence in sequences], out=out, casting='unsafe')
+
+
+def mergeShapes(shapes, stride, transforms=None, normalOffset=None):
+    """
+    Merges a list of shapes into a single ArrayShape, in one pass over preallocated arrays.
+    Optionally, transforms gives a 4x4 matrix for each shape (or None to keep it as it is),
+    which is applied to the positions, the first 3 values of each vertex. If normalOffset is
+    given, the normals found at that offset are transformed with the inverse transpose matrix.
+    """
+    vertexCounts = np.array([len(shape.vertices) // stride for shape in shapes], dtype=np.int64)
+    indexCounts = np.array([len(shape.indices) for shape in shapes], dtype=np.int64)
+    vertexStarts = np.cumsum(vertexCounts) - vertexCounts
+
+    vertexData = np.empty(int(np.sum(vertexCounts)) * stride, dtype=np.float32)
+    indices = np.empty(int(np.sum(indexCounts)), dtype=np.uint32)
+
+    if len(shapes) == 0:
+        return ArrayShape(vertexData, indices, stride)
+
+    _flatten([shape.vertices for shape in shapes], vertexData)
+    _flatten([shape.indices for shape in shapes], indices)
+
+    # Each index is shifted by the number of vertices of the shapes before its own
+    indices += np.repeat(vertexStarts, indexCounts).astype(np.uint32)
+    vertexData = vertexData.reshape((-1, stride))
+
+    if transforms is not None:
+        identity = np.identity(4, dtype=np.float64)
+        matrices = np.array([identity if transform is None else transform for transform in transforms],
+                            dtype=np.float64)
+        assert matrices.shape == (len(shapes), 4, 4)
+        owner = np.repeat(np.arange(len(shapes)), vertexCounts)
+
+        positions = vertexData[:, 0:3].astype(np.float64)
+        vertexData[:, 0:3] = np.einsum('vij,vj->vi', matrices[owner, 0:3, 0:3], positions) + matrices[owner, 0:3, 3]
+
+        if normalOffset is not None:
+            normalMatrices = np.transpose(np.linalg.inv(matrices[:, 0:3, 0:3]), (0, 2, 1))
+            normals = vertexData[:, normalOffset:normalOffset + 3].astype(np.float64)
+            vertexData[:, normalOffset:normalOffset + 3] = np.einsum('vij,vj->vi', normalMatrices[owner], normals)
+
+    layout = getattr(shapes[0], 'layout', None)
+    return ArrayShape(vertexData, indices, stride, layout)
 
 
 def applyOffset(shape, stride, offset):
+    if isinstance(shape.vertices, np.ndarray):
+        vertexData = shape.vertices.reshape((-1, stride))
+        vertexData[:, 0:3] += np.asarray(offset, dtype=vertexData.dtype)
+        return
+
     numberOfVertices = len(shape.vertices) // stride
 
     for i in range(numberOfVertices):
@@ -71,6 +212,11 @@ def applyOffset(shape, stride, offset):
 
 
 def scaleVertices(shape, stride, scaleFactor):
+    if isinstance(shape.vertices, np.ndarray):
+        vertexData = shape.vertices.reshape((-1, stride))
+        vertexData[:, 0:3] *= np.asarray(scaleFactor, dtype=vertexData.dtype)
+        return
+
     numberOfVertices = len(shape.vertices) // stride
 
     for i in range(numberOfVertices):
@@ -273,82 +419,232 @@ def createRainbowCube():
     return Shape(vertices, indices)
 
 
-def readOFF(filename, color):
-    vertices = []
-    normals = []
-    faces = []
+def _countTokens(text):
+    # Number of whitespace separated tokens on each line of text, computed over the raw bytes
+    data = np.frombuffer(text.encode(), dtype=np.uint8)
+    isBlank = (data == ord(' ')) | (data == ord('\t')) | (data == ord('\r')) | (data == ord('\n'))
+    previousBlank = np.concatenate([[True], isBlank[:-1]])
+    tokenStarts = np.flatnonzero(~isBlank & previousBlank)
+
+    lineEnds = np.flatnonzero(data == ord('\n'))
+    if len(data) != 0 and data[-1] != ord('\n'):
+        lineEnds = np.append(lineEnds, len(data))
+    tokensBeforeEnd = np.searchsorted(tokenStarts, lineEnds)
+    return np.diff(tokensBeforeEnd, prepend=0)
+
+
+def _fanTriangulation(faceSizes):
+    # Corner positions of the triangles of consecutive polygons with faceSizes vertices each.
+    # Fan triangulation: the first triangle is (0, 1, 2), then (k, k+1, 0) for every extra vertex
+    trianglesPerFace = faceSizes - 2
+    faceStarts = np.cumsum(faceSizes) - faceSizes
+    triangleStarts = np.cumsum(trianglesPerFace) - trianglesPerFace
+    numberOfTriangles = int(np.sum(trianglesPerFace))
+
+    triangleFaceStart = np.repeat(faceStarts, trianglesPerFace)
+    k = np.arange(numberOfTriangles) - np.repeat(triangleStarts, trianglesPerFace)
+    local = np.stack([k + 1, k + 2, np.zeros_like(k)], axis=1)
+    local[k == 0] = [0, 1, 2]
+    return (triangleFaceStart[:, None] + local).reshape(-1)
+
+
+def readOFF(filename, color, weld=False):
+    """
+    Reads an OFF file into a Shape with the layout: position (3), color (3), normal (3).
+    Each vertex normal is the normalized sum of the normals of the faces around it.
+    Polygons are triangulated as fans, and every face corner becomes its own vertex,
+    unless weld is True, in which case identical vertices are shared (see weldVertices).
+    """
 
     with open(filename, 'r') as file:
-        line = file.readline().strip()
-        assert line == "OFF"
+        lines = [line.split('#')[0].strip() for line in file.read().splitlines()]
+        lines = [line for line in lines if len(line) != 0]
+
+    assert lines[0] == "OFF"
+
+    aux = lines[1].split()
+    numVertices = int(aux[0])
+    numFaces = int(aux[1])
+
+    vertices = np.fromstring("\n".join(lines[2:2 + numVertices]), dtype=np.float64, sep=' ')
+    vertices = vertices.reshape((numVertices, -1))[:, 0:3]
+
+    # Each face line is: number of vertices n, n vertex indices, and optionally a color which is ignored
+    faceText = "\n".join(lines[2 + numVertices:2 + numVertices + numFaces])
+    tokensPerFace = _countTokens(faceText)
+    faceData = np.fromstring(faceText, dtype=np.float64, sep=' ').astype(np.int64)
+    assert len(tokensPerFace) == numFaces and len(faceData) == np.sum(tokensPerFace)
+
+    faceLineStarts = np.cumsum(tokensPerFace) - tokensPerFace
+    faceSizes = faceData[faceLineStarts]
+    assert np.all(faceSizes >= 3), "Faces require at least 3 vertices."
+
+    faceStarts = np.cumsum(faceSizes) - faceSizes
+    cornerInFace = np.arange(np.sum(faceSizes)) - np.repeat(faceStarts, faceSizes)
+    corners = faceData[np.repeat(faceLineStarts + 1, faceSizes) + cornerInFace]
+
+    # Face normals computed from the first 3 vertices of each face, all at once
+    first = vertices[corners[faceStarts]]
+    second = vertices[corners[faceStarts + 1]]
+    third = vertices[corners[faceStarts + 2]]
+    faceNormals = np.cross(second - first, third - second)
+
+    # Each face adds its normal to all of its vertices
+    normals = np.zeros((numVertices, 3), dtype=np.float32)
+    np.add.at(normals, corners, np.repeat(faceNormals, faceSizes, axis=0))
+
+    norms = np.linalg.norm(normals, axis=1)
+    norms[norms == 0] = 1
+    normals = normals / norms[:, None]
+
+    color = np.tile(np.asarray(color, dtype=np.float64), (numVertices, 1))
+    vertexData = np.concatenate((vertices, color, normals), axis=1)
+
+    triangleCorners = corners[_fanTriangulation(faceSizes)]
+    vertexDataF = np.ascontiguousarray(vertexData[triangleCorners], dtype=np.float32).reshape(-1)
+    indices = np.arange(len(triangleCorners), dtype=np.uint32)
+
+    shape = ArrayShape(vertexDataF, indices, 9, (('position', 3), ('color', 3), ('normal', 3)))
+
+    if weld:
+        return weldVertices(shape, 9)
+
+    return shape
+
+
+def _splitOBJBlocks(data, prefixes):
+    # Lines are classified by their prefix over the raw bytes. For every prefix, the content of
+    # its lines (without the prefix) is gathered into a single text block, one line per element.
+    data = np.concatenate([data, np.frombuffer(b"\n\0\0", dtype=np.uint8)])
+    lineEnds = np.flatnonzero(data == ord('\n'))
+    lineStarts = np.concatenate([[0], lineEnds[:-1] + 1])
+    lineIds = np.repeat(np.arange(len(lineStarts)), lineEnds - lineStarts + 1)
+    offsetInLine = np.arange(len(lineIds)) - lineStarts[lineIds]
 
-        line = file.readline().strip()
-        aux = line.split(' ')
+    blocks = {}
+    for prefix in prefixes:
+        isPrefixLine = np.ones(len(lineStarts), dtype=bool)
+        for i, character in enumerate(prefix.encode()):
+            isPrefixLine &= data[lineStarts + i] == character
+        separator = data[lineStarts + len(prefix)]
+        isPrefixLine &= (separator == ord(' ')) | (separator == ord('\t'))
 
-        numVertices = int(aux[0])
-        numFaces = int(aux[1])
+        mask = isPrefixLine[lineIds] & (offsetInLine >= len(prefix))
+        blocks[prefix] = (data[:len(lineIds)][mask].tobytes().decode(), int(np.sum(isPrefixLine)))
 
-        for i in range(numVertices):
-            aux = file.readline().strip().split(' ')
-            vertices += [float(coord) for coord in aux[0:]]
+    return blocks
 
-        vertices = np.asarray(vertices)
-        vertices = np.reshape(vertices, (numVertices, 3))
-        # print(f'Vertices shape: {vertices.shape}')
 
-        normals = np.zeros((numVertices, 3), dtype=np.float32)
-        # print(f'Normals shape: {normals.shape}')
+def _readOBJBlock(block, width):
+    # All the coordinates of a block are parsed by NumPy in a single pass
+    text, numberOfLines = block
+    if numberOfLines == 0:
+        return np.zeros((0, width), dtype=np.float64)
 
-        for i in range(numFaces):
-            aux = file.readline().strip().split(' ')
-            aux = [int(index) for index in aux[0:]]
-            faces += [aux[1:]]
+    data = np.fromstring(text, dtype=np.float64, sep=' ')
+    components = len(data) // numberOfLines
+    assert components * numberOfLines == len(data), "All the lines of a block must have the same number of components."
+    assert components >= width, "Not enough components in block."
 
-            vecA = [vertices[aux[2]][0] - vertices[aux[1]][0], vertices[aux[2]][1] - vertices[aux[1]][1],
-                    vertices[aux[2]][2] - vertices[aux[1]][2]]
-            vecB = [vertices[aux[3]][0] - vertices[aux[2]][0], vertices[aux[3]][1] - vertices[aux[2]][1],
-                    vertices[aux[3]][2] - vertices[aux[2]][2]]
+    return data.reshape((numberOfLines, components))[:, :width]
 
-            res = np.cross(vecA, vecB)
-            normals[aux[1]][0] += res[0]
-            normals[aux[1]][1] += res[1]
-            normals[aux[1]][2] += res[2]
 
-            normals[aux[2]][0] += res[0]
-            normals[aux[2]][1] += res[1]
-            normals[aux[2]][2] += res[2]
+def _resolveOBJIndices(indices, count):
+    # OBJ indices start at 1, negative ones are relative to the end of the list, and 0 means undefined
+    resolved = np.where(indices < 0, indices + count, indices - 1)
+    return np.where(indices == 0, -1, resolved)
 
-            normals[aux[3]][0] += res[0]
-            normals[aux[3]][1] += res[1]
-            normals[aux[3]][2] += res[2]
-            # print(faces)
-        norms = np.linalg.norm(normals, axis=1)
-        normals = normals / norms[:, None]
 
-        color = np.asarray(color)
-        color = np.tile(color, (numVertices, 1))
+def readOBJ(filename, weld=False):
+    """
+    Reads a Wavefront OBJ file into a Shape with the layout: position (3), texture coordinates (2), normal (3).
+    Polygons are triangulated as fans, and every face corner becomes its own vertex,
+    unless weld is True, in which case identical vertices are shared (see weldVertices).
+    """
 
-        vertexData = np.concatenate((vertices, color), axis=1)
-        vertexData = np.concatenate((vertexData, normals), axis=1)
+    with open(filename, 'rb') as file:
+        data = np.frombuffer(file.read(), dtype=np.uint8)
 
-        # print(vertexData.shape)
+    # Classifying lines by their prefix, the numeric data is parsed later in bulk
+    blocks = _splitOBJBlocks(data, ['v', 'vt', 'vn', 'f'])
+    vertices = _readOBJBlock(blocks['v'], 3)
+    textCoords = _readOBJBlock(blocks['vt'], 2)
+    normals = _readOBJBlock(blocks['vn'], 3)
+    faceText, numberOfFaces = blocks['f']
 
-        indices = []
-        vertexDataF = []
-        index = 0
+    layout = (('position', 3), ('texCoords', 2), ('normal', 3))
 
-        for face in faces:
-            vertex = vertexData[face[0], :]
-            vertexDataF += vertex.tolist()
-            vertex = vertexData[face[1], :]
-            vertexDataF += vertex.tolist()
-            vertex = vertexData[face[2], :]
-            vertexDataF += vertex.tolist()
+    if numberOfFaces == 0:
+        return ArrayShape(np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.uint32), 8, layout)
 
-            indices += [index, index + 1, index + 2]
-            index += 3
+    # Each face vertex is described as v, v/vt, v//vn or v/vt/vn
+    faceSizes = _countTokens(faceText)
+    assert np.all(faceSizes >= 3), "Faces require at least 3 vertices."
 
-        return Shape(vertexDataF, indices)
+    numberOfCorners = int(np.sum(faceSizes))
+    numberOfComponents = faceText.split(maxsplit=1)[0].count('/') + 1
+    cornerText = faceText.replace('//', '/0/').replace('/', ' ')
+    cornerData = np.fromstring(cornerText, dtype=np.int64, sep=' ')
+    assert len(cornerData) == numberOfComponents * numberOfCorners, "All face vertices must use the same format."
+    cornerData = cornerData.reshape((numberOfCorners, numberOfComponents))
+
+    vertexIndices = _resolveOBJIndices(cornerData[:, 0], len(vertices))
+    textCoordIndices = np.full(numberOfCorners, -1, dtype=np.int64)
+    normalIndices = np.full(numberOfCorners, -1, dtype=np.int64)
+    if numberOfComponents > 1:
+        textCoordIndices = _resolveOBJIndices(cornerData[:, 1], len(textCoords))
+    if numberOfComponents > 2:
+        normalIndices = _resolveOBJIndices(cornerData[:, 2], len(normals))
+
+    triangleCorners = _fanTriangulation(faceSizes)
+
+    # Undefined texture coordinates or normals are filled with zeros
+    def gather(data, indices, width):
+        out = np.zeros((len(indices), width), dtype=np.float64)
+        defined = indices >= 0
+        out[defined] = data[indices[defined]]
+        return out
+
+    vertexData = np.concatenate([
+        vertices[vertexIndices[triangleCorners]],
+        gather(textCoords, textCoordIndices[triangleCorners], 2),
+        gather(normals, normalIndices[triangleCorners], 3)], axis=1)
+
+    vertexData = np.ascontiguousarray(vertexData, dtype=np.float32).reshape(-1)
+    indices = np.arange(len(triangleCorners), dtype=np.uint32)
+
+    shape = ArrayShape(vertexData, indices, 8, layout)
+
+    if weld:
+        return weldVertices(shape, 8)
+
+    return shape
+
+
+def weldVertices(shape, stride):
+    """
+    Merges vertices with exactly the same attributes (position, color or texture coordinates, normal...)
+    and rewrites the indices to reference the unique ones. Unique vertices keep the order of their
+    first appearance. Returns a new ArrayShape.
+    """
+    vertices = np.asarray(shape.vertices, dtype=np.float32).reshape((-1, stride))
+    indices = np.asarray(shape.indices, dtype=np.int64)
+
+    # Adding zero turns -0.0 into 0.0, so both get the same bit pattern.
+    # Each row is then seen as a single opaque value that NumPy can sort and compare.
+    vertices = np.ascontiguousarray(vertices + np.float32(0.0))
+    rows = vertices.view(np.dtype((np.void, vertices.dtype.itemsize * stride))).reshape(-1)
+
+    _, firstIndex, inverse = np.unique(rows, return_index=True, return_inverse=True)
+
+    order = np.argsort(firstIndex)
+    remap = np.empty(len(order), dtype=np.int64)
+    remap[order] = np.arange(len(order))
+
+    uniqueVertices = vertices[firstIndex[order]]
+    newIndices = remap[inverse.reshape(-1)][indices].astype(np.uint32)
+
+    return ArrayShape(uniqueVertices, newIndices, stride, getattr(shape, 'layout', None))
 
 
 def createColorCubeOFF(r, g, b):
@@ -499,7 +795,7 @@ def createTextureCube(image_filename):
         19, 18, 17, 17, 16, 19,  # Y+
         20, 21, 22, 22, 23, 20]  # Y-
 
-    return Shape(vertices, indices, image_filename)
+    return Shape(vertices, indices)
 
 
 def createRainbowNormalsCube():
@@ -631,4 +927,4 @@ def createTextureNormalsCube(image_filename):
         19, 18, 17, 17, 16, 19,  # Y+
         20, 21, 22, 22, 23, 20]  # Y-
 
-    return Shape(vertices, indices, image_filename)
+    return Shape(vertices, indices)
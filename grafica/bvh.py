@@ -0,0 +1,376 @@
+# coding=utf-8
+"""
+Bounding volume hierarchy over the leaves of a CompiledSceneGraph,
+for picking with rays, frustum queries and nearest neighbour queries.
+"""
+
+__all__ = ['BVH', 'rayFromScreen']
+
+import heapq
+import numpy as np
+import grafica.transformations as tr
+import grafica.scene_graph as sg
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+# Maximum number of scene graph leaves stored in each leaf of the hierarchy
+LEAF_SIZE = 4
+
+# Fraction of changed leaves above which refit recomputes every box
+FULL_REFIT_FRACTION = 0.2
+
+
+def _transformAABBs(transforms, boxes):
+    # Vectorized version of scene_graph._transformAABB, for (N, 4, 4) transforms and (N, 2, 3) boxes
+    centers = (boxes[:, 0] + boxes[:, 1]) * 0.5
+    extents = (boxes[:, 1] - boxes[:, 0]) * 0.5
+    rotations = transforms[:, 0:3, 0:3]
+    newCenters = np.einsum('nij,nj->ni', rotations, centers) + transforms[:, 0:3, 3]
+    newExtents = np.einsum('nij,nj->ni', np.abs(rotations), extents)
+    return np.stack([newCenters - newExtents, newCenters + newExtents], axis=1)
+
+
+def _rayBoxes(origin, inverseDirection, boxMin, boxMax, maxDistance):
+    # Slab test of one ray against many boxes, returning the hits and their entry distances
+    with np.errstate(invalid='ignore'):
+        t0 = (boxMin - origin) * inverseDirection
+        t1 = (boxMax - origin) * inverseDirection
+    near = np.nanmax(np.minimum(t0, t1), axis=1)
+    far = np.nanmin(np.maximum(t0, t1), axis=1)
+    near = np.maximum(near, 0.0)
+    return (near <= far) & (near <= maxDistance), near
+
+
+def _rayTriangles(origin, direction, triangles):
+    # Moller-Trumbore intersection of one ray against (T, 3, 3) triangles, both faces are hit
+    edge1 = triangles[:, 1] - triangles[:, 0]
+    edge2 = triangles[:, 2] - triangles[:, 0]
+    p = np.cross(direction, edge2)
+    determinant = np.einsum('ij,ij->i', edge1, p)
+    valid = np.abs(determinant) > 1e-12
+    inverse = np.where(valid, 1.0 / np.where(valid, determinant, 1.0), 0.0)
+
+    s = origin - triangles[:, 0]
+    u = np.einsum('ij,ij->i', s, p) * inverse
+    q = np.cross(s, edge1)
+    v = np.einsum('j,ij->i', direction, q) * inverse
+    t = np.einsum('ij,ij->i', edge2, q) * inverse
+
+    hit = valid & (u >= 0) & (v >= 0) & (u + v <= 1) & (t > 1e-9)
+    return t[hit].min() if hit.any() else np.inf
+
+
+def _boxDistances(point, boxMin, boxMax):
+    # Distances from a point to many boxes, zero when the point is inside
+    delta = np.maximum(np.maximum(boxMin - point, point - boxMax), 0.0)
+    return np.sqrt(np.einsum('ij,ij->i', delta, delta))
+
+
+def rayFromScreen(x, y, width, height, projection, view):
+    """
+    World space ray through the pixel (x, y) of a window, as given by glfw.get_cursor_pos.
+    It returns the origin, on the near plane, and the normalized direction.
+    """
+    ndcX = 2.0 * x / width - 1.0
+    ndcY = 1.0 - 2.0 * y / height
+    inverse = np.linalg.inv(np.matmul(np.asarray(projection, dtype=np.float64), view))
+
+    near = np.matmul(inverse, [ndcX, ndcY, -1.0, 1.0])
+    far = np.matmul(inverse, [ndcX, ndcY, 1.0, 1.0])
+    near = near[0:3] / near[3]
+    far = far[0:3] / far[3]
+
+    direction = far - near
+    return near, direction / np.linalg.norm(direction)
+
+
+class BVH:
+    """
+    Bounding volume hierarchy built from the world space bounding boxes of the leaves of a CompiledSceneGraph.
+    Queries return indices into compiledSceneGraph.leaves, so compiledSceneGraph.nodes[leaves[i][0]]
+    is the node holding the GPUShape that was found.
+    The hierarchy is built once, when transforms change the boxes are refitted without rebuilding it,
+    which keeps queries correct but may degrade their speed after large movements. Call build again then.
+    """
+
+    def __init__(self, compiledSceneGraph, leafSize=LEAF_SIZE):
+        assert (isinstance(compiledSceneGraph, sg.CompiledSceneGraph))
+
+        self.scene = compiledSceneGraph
+        self.leafSize = leafSize
+
+        # Shapes without bounds can not be placed in space, they are kept as points at their origin
+        objectBoxes = [np.zeros((2, 3)) if leaf.aabb is None else leaf.aabb for _, leaf in self.scene.leaves]
+        self.objectBoxes = np.array(objectBoxes, dtype=np.float64).reshape((-1, 2, 3))
+
+        # Triangles of each GPUShape in object space, created the first time a ray reaches it
+        self._triangles = {}
+
+        self.build()
+
+    def __len__(self):
+        return len(self.objectBoxes)
+
+    def _computeLeafBoxes(self):
+        # Every box is computed, so the changes logged by the scene until now are already seen
+        _, self.sceneUpdates = self.scene.changedLeaves(self.scene.updates)
+        self.leafBoxes = _transformAABBs(self.scene.leafTransforms.astype(np.float64), self.objectBoxes)
+
+    def build(self):
+        """Builds the hierarchy from the current leaf boxes, splitting at the median of the longest axis."""
+        self._computeLeafBoxes()
+        centers = (self.leafBoxes[:, 0] + self.leafBoxes[:, 1]) * 0.5
+        self.order = np.arange(len(self), dtype=np.int64)
+
+        starts, counts, lefts, rights, parents, depths = [], [], [], [], [], []
+
+        def split(start, end, parent, depth):
+            index = len(starts)
+            starts.append(start)
+            counts.append(end - start)
+            lefts.append(-1)
+            rights.append(-1)
+            parents.append(parent)
+            depths.append(depth)
+
+            if end - start <= self.leafSize:
+                return index
+
+            range_ = self.order[start:end]
+            rangeCenters = centers[range_]
+            axis = np.argmax(rangeCenters.max(axis=0) - rangeCenters.min(axis=0))
+            middle = (end - start) // 2
+            self.order[start:end] = range_[np.argpartition(rangeCenters[:, axis], middle)]
+
+            lefts[index] = split(start, start + middle, index, depth + 1)
+            rights[index] = split(start + middle, end, index, depth + 1)
+            return index
+
+        if len(self) > 0:
+            split(0, len(self), -1, 0)
+
+        self.starts = np.array(starts, dtype=np.int64)
+        self.counts = np.array(counts, dtype=np.int64)
+        self.lefts = np.array(lefts, dtype=np.int64)
+        self.rights = np.array(rights, dtype=np.int64)
+        self.parents = np.array(parents, dtype=np.int64)
+        self.depths = np.array(depths, dtype=np.int64)
+        self.maxDepth = int(self.depths.max()) if len(self) > 0 else 0
+
+        # Leaves of the hierarchy hold up to leafSize scene graph leaves, padded by repeating the first one,
+        # which does not change the minimum nor the maximum of their boxes
+        self.leafNodes = np.flatnonzero(self.lefts == -1)
+        slots = self.starts[self.leafNodes, None] + np.arange(self.leafSize)
+        slots = np.where(slots < (self.starts + self.counts)[self.leafNodes, None], slots, self.starts[self.leafNodes, None])
+        self.leafSlots = self.order[slots] if len(self) > 0 else np.empty((0, self.leafSize), dtype=np.int64)
+
+        self.leafSlotOf = np.empty(len(self.starts), dtype=np.int64)
+        self.leafSlotOf[self.leafNodes] = np.arange(len(self.leafNodes))
+        self.nodeOfLeaf = np.empty(len(self), dtype=np.int64)
+        self.nodeOfLeaf[self.order] = np.repeat(self.leafNodes, self.counts[self.leafNodes])
+
+        self.nodeMin = np.empty((len(self.starts), 3))
+        self.nodeMax = np.empty((len(self.starts), 3))
+        self._refitNodes(self.leafNodes, np.flatnonzero(self.lefts != -1))
+
+    def _refitNodes(self, leafNodes, innerNodes):
+        boxes = self.leafBoxes[self.leafSlots[self.leafSlotOf[leafNodes]]]
+        self.nodeMin[leafNodes] = boxes[:, :, 0].min(axis=1)
+        self.nodeMax[leafNodes] = boxes[:, :, 1].max(axis=1)
+
+        # Inner nodes are refitted from the deepest level up, as their childs must be ready
+        innerDepths = self.depths[innerNodes]
+        for depth in range(self.maxDepth, -1, -1):
+            nodes = innerNodes[innerDepths == depth]
+            if len(nodes) == 0:
+                continue
+            self.nodeMin[nodes] = np.minimum(self.nodeMin[self.lefts[nodes]], self.nodeMin[self.rights[nodes]])
+            self.nodeMax[nodes] = np.maximum(self.nodeMax[self.lefts[nodes]], self.nodeMax[self.rights[nodes]])
+
+    def refit(self, leaves=None):
+        """
+        Updates the boxes after transforms changed in the scene graph, marked with markDirty.
+        Only the leaves refreshed by the scene since the last refit, and their ancestors, are refitted,
+        unless leaves (indices into scene.leaves) are given.
+        """
+        if leaves is None:
+            leaves, self.sceneUpdates = self.scene.changedLeaves(self.sceneUpdates)
+
+        # Past a fraction of the leaves, walking up from each one costs more than refitting everything
+        if leaves is None or len(leaves) > len(self) * FULL_REFIT_FRACTION:
+            self._computeLeafBoxes()
+            self._refitNodes(self.leafNodes, np.flatnonzero(self.lefts != -1))
+            return
+
+        leaves = np.asarray(leaves, dtype=np.int64)
+        if len(leaves) == 0:
+            return
+
+        self.scene.update()
+        self.leafBoxes[leaves] = _transformAABBs(
+            self.scene.leafTransforms[leaves].astype(np.float64), self.objectBoxes[leaves])
+
+        leafNodes = np.unique(self.nodeOfLeaf[leaves])
+        innerNodes = []
+        nodes = leafNodes
+        while len(nodes) > 0:
+            nodes = np.unique(self.parents[nodes])
+            nodes = nodes[nodes >= 0]
+            innerNodes += [nodes]
+        self._refitNodes(leafNodes, np.concatenate(innerNodes))
+
+    def refitNode(self, node):
+        """Refits the leaves below every occurrence of a SceneGraphNode, after scene.markDirty(node).
+        They are among the leaves changed since the last refit, so this is the same as refit()."""
+        self.refit()
+
+    def _rangeLeaves(self, nodes):
+        # Scene graph leaves below the given nodes, gathered from their contiguous ranges of order
+        lengths = self.counts[nodes]
+        offsets = np.repeat(self.starts[nodes] - (np.cumsum(lengths) - lengths), lengths)
+        return self.order[np.arange(lengths.sum()) + offsets]
+
+    def frustumQuery(self, viewProjection):
+        """Leaves whose boxes are not completely outside of the frustum of a projection @ view matrix."""
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        planes = tr.frustumPlanes(viewProjection)
+        normals = planes[:, 0:3].T
+        absNormals = np.abs(planes[:, 0:3]).T
+        offsets = planes[:, 3]
+
+        def test(boxMin, boxMax):
+            # Same test as drawSceneGraphNodeCulled: the box center against each plane, with its projected radius
+            distances = np.matmul((boxMin + boxMax) * 0.5, normals) + offsets
+            radius = np.matmul((boxMax - boxMin) * 0.5, absNormals)
+            return (distances < -radius).any(axis=1), (distances < radius).any(axis=1)
+
+        found = []
+        nodes = np.array([0])
+        while len(nodes) > 0:
+            outside, partial = test(self.nodeMin[nodes], self.nodeMax[nodes])
+
+            # Everything below a node completely inside is visible, no more tests are needed
+            found += [self._rangeLeaves(nodes[~outside & ~partial])]
+
+            nodes = nodes[~outside & partial]
+            isLeaf = self.lefts[nodes] == -1
+
+            leaves = self._rangeLeaves(nodes[isLeaf])
+            leafOutside, _ = test(self.leafBoxes[leaves, 0], self.leafBoxes[leaves, 1])
+            found += [leaves[~leafOutside]]
+
+            nodes = nodes[~isLeaf]
+            nodes = np.concatenate([self.lefts[nodes], self.rights[nodes]])
+
+        return np.sort(np.concatenate(found))
+
+    def _leafTriangles(self, gpuShape):
+        key = id(gpuShape)
+        if key not in self._triangles:
+            positions = gpuShape.vertexData.reshape((-1, gpuShape.stride))[:, 0:3].astype(np.float64)
+            indices = np.asarray(gpuShape.indexData, dtype=np.int64)
+            self._triangles[key] = positions[indices[:len(indices) // 3 * 3]].reshape((-1, 3, 3))
+        return self._triangles[key]
+
+    def rayQuery(self, origin, direction, maxDistance=np.inf, exact=True):
+        """
+        Closest leaf hit by the ray origin + t * direction, with 0 <= t <= maxDistance.
+        With exact, the triangles of the candidate GPUShapes (drawn with GL_TRIANGLES) are intersected,
+        otherwise only their boxes are. It returns (leafIndex, t), or None if nothing was hit.
+        """
+        if len(self) == 0:
+            return None
+
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        with np.errstate(divide='ignore'):
+            inverseDirection = 1.0 / direction
+
+        # Every node crossed by the ray is visited, a level at a time
+        candidates, entries = [], []
+        nodes = np.array([0])
+        while len(nodes) > 0:
+            hit, _ = _rayBoxes(origin, inverseDirection, self.nodeMin[nodes], self.nodeMax[nodes], maxDistance)
+            nodes = nodes[hit]
+            isLeaf = self.lefts[nodes] == -1
+
+            leaves = self._rangeLeaves(nodes[isLeaf])
+            hit, near = _rayBoxes(origin, inverseDirection, self.leafBoxes[leaves, 0], self.leafBoxes[leaves, 1],
+                                  maxDistance)
+            candidates += [leaves[hit]]
+            entries += [near[hit]]
+
+            nodes = nodes[~isLeaf]
+            nodes = np.concatenate([self.lefts[nodes], self.rights[nodes]])
+
+        candidates = np.concatenate(candidates)
+        entries = np.concatenate(entries)
+        if len(candidates) == 0:
+            return None
+
+        sortedEntries = np.argsort(entries, kind='stable')
+        if not exact:
+            first = sortedEntries[0]
+            return int(candidates[first]), float(entries[first])
+
+        # Candidates are tested from the closest box, until the next box starts behind the best hit
+        best, bestDistance = None, maxDistance
+        for k in sortedEntries:
+            if entries[k] > bestDistance:
+                break
+
+            leaf = candidates[k]
+            gpuShape = self.scene.leaves[leaf][1]
+            if gpuShape.vertexData is None or gpuShape.stride is None:
+                continue
+
+            # The ray is moved to object space, where the parameter t stays the same
+            inverse = np.linalg.inv(self.scene.worldTransforms[self.scene.leaves[leaf][0]])
+            localOrigin = np.matmul(inverse[0:3, 0:3], origin) + inverse[0:3, 3]
+            localDirection = np.matmul(inverse[0:3, 0:3], direction)
+
+            t = _rayTriangles(localOrigin, localDirection, self._leafTriangles(gpuShape))
+            if t <= bestDistance and np.isfinite(t):
+                best, bestDistance = int(leaf), float(t)
+
+        return None if best is None else (best, bestDistance)
+
+    def nearestQuery(self, point, k=1):
+        """
+        The k leaves whose boxes are closest to point, as (leafIndices, distances) sorted by distance.
+        Distances are zero for boxes containing the point.
+        """
+        point = np.asarray(point, dtype=np.float64)
+        if len(self) == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        # Best first search: nodes are expanded by the distance to their boxes, the k best leaves are kept
+        # in a max heap (as negative distances) whose top bounds the nodes that can still improve them
+        best = []
+        queue = [(0.0, 0)]
+        while len(queue) > 0:
+            distance, node = heapq.heappop(queue)
+            if len(best) == k and distance > -best[0][0]:
+                break
+
+            if self.lefts[node] == -1:
+                start = self.starts[node]
+                leaves = self.order[start:start + self.counts[node]]
+                distances = _boxDistances(point, self.leafBoxes[leaves, 0], self.leafBoxes[leaves, 1])
+                for leaf, leafDistance in zip(leaves.tolist(), distances.tolist()):
+                    if len(best) < k:
+                        heapq.heappush(best, (-leafDistance, -leaf))
+                    elif leafDistance < -best[0][0]:
+                        heapq.heapreplace(best, (-leafDistance, -leaf))
+            else:
+                childs = [self.lefts[node], self.rights[node]]
+                distances = _boxDistances(point, self.nodeMin[childs], self.nodeMax[childs])
+                for child, childDistance in zip(childs, distances.tolist()):
+                    if len(best) < k or childDistance <= -best[0][0]:
+                        heapq.heappush(queue, (childDistance, int(child)))
+
+        best = sorted((-distance, -leaf) for distance, leaf in best)
+        return np.array([leaf for _, leaf in best], dtype=np.int64), np.array([distance for distance, _ in best])
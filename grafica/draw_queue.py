@@ -0,0 +1,172 @@
+# coding=utf-8
+"""
+Draw queue sorting the draws of a frame by their OpenGL state (program, texture and vertex array),
+issuing only the binds which actually change that state.
+"""
+
+__all__ = ['DrawQueue', 'DrawQueueStats', 'GLStateShadow']
+
+from OpenGL.GL import *
+import numpy as np
+import grafica.transformations as tr
+import grafica.gpu_shape as gs
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+
+class GLStateShadow:
+    """
+    Copy of the OpenGL state changed to draw: current program, vertex array and the texture bound to each target.
+    Binds are only issued when they change it, so any change made without this class must be followed by invalidate.
+    """
+
+    def __init__(self):
+        self.issued = 0
+        self.skipped = 0
+        self.invalidate()
+
+    def invalidate(self):
+        # Unknown state, the next bind of each kind is always issued
+        self.program = None
+        self.vao = None
+        self.textures = {}
+
+    def useProgram(self, program):
+        if program == self.program:
+            self.skipped += 1
+            return
+        glUseProgram(program)
+        self.program = program
+        self.issued += 1
+
+    def bindVertexArray(self, vao):
+        if vao == self.vao:
+            self.skipped += 1
+            return
+        glBindVertexArray(vao)
+        self.vao = vao
+        self.issued += 1
+
+    def bindTexture(self, target, texture):
+        if self.textures.get(target) == texture:
+            self.skipped += 1
+            return
+        glBindTexture(target, texture)
+        self.textures[target] = texture
+        self.issued += 1
+
+
+class DrawQueueStats:
+    """Counters of the last call to DrawQueue.flush."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # Items drawn, binds issued and skipped by the state shadow, and OpenGL calls made
+        # against the ones drawing the items in submission order with pipeline.drawCall
+        self.items = 0
+        self.binds = 0
+        self.skipped = 0
+        self.calls = 0
+        self.unsortedCalls = 0
+
+    def saved(self):
+        return self.unsortedCalls - self.calls
+
+    def __str__(self):
+        return "items=" + str(self.items) + \
+               "  binds=" + str(self.binds) + \
+               "  skipped=" + str(self.skipped) + \
+               "  calls=" + str(self.calls) + \
+               "  saved=" + str(self.saved()) + " of " + str(self.unsortedCalls)
+
+
+class DrawQueue:
+    """
+    Collects the draws of a frame and issues them sorted by program, texture and vertex array.
+    Uniforms shared by all the draws of a pipeline (projection, view, lighting...) must be set before flush,
+    only the transform of each item is sent by the queue. Items with the same state keep the order they were
+    submitted in, but the queue is meant for opaque geometry, whose result does not depend on the drawing order.
+    """
+
+    def __init__(self, state=None):
+        self.state = GLStateShadow() if state is None else state
+        self.items = []
+        self.stats = DrawQueueStats()
+
+    def __len__(self):
+        return len(self.items)
+
+    def submit(self, pipeline, gpuShape, transform, transformName="model", mode=GL_TRIANGLES):
+        """Queues gpuShape to be drawn by pipeline. InstancedGPUShapes have no transform, use None."""
+        assert isinstance(gpuShape, gs.GPUShape)
+
+        texture = 0 if gpuShape.texture is None else gpuShape.texture
+        key = (pipeline.shaderProgram, texture, gpuShape.vao)
+        self.items += [(key, pipeline, gpuShape, transform, transformName, mode)]
+
+    def submitSceneGraphNode(self, node, pipeline, transformName="model", parentTransform=tr.identity()):
+        """Queues every leaf of a scene graph, with the same transforms drawSceneGraphNode would use."""
+        newTransform = np.matmul(parentTransform, node.transform)
+
+        if len(node.childs) == 1 and isinstance(node.childs[0], gs.GPUShape):
+            self.submit(pipeline, node.childs[0], newTransform, transformName)
+        else:
+            for child in node.childs:
+                self.submitSceneGraphNode(child, pipeline, transformName, newTransform)
+
+    def _unsortedCalls(self):
+        # Calls of drawing every item with drawCall in submission order, switching programs when needed
+        calls = 0
+        program = None
+        for key, pipeline, gpuShape, transform, _, _ in self.items:
+            if key[0] != program:
+                calls += 1
+                program = key[0]
+            calls += 3 if transform is None else 4
+            if gpuShape.texture is not None:
+                calls += 1
+        return calls
+
+    def flush(self):
+        """Draws every queued item and empties the queue, stats are filled with the counters of this call."""
+        self.stats.reset()
+        self.stats.items = len(self.items)
+        self.stats.unsortedCalls = self._unsortedCalls()
+
+        # Code outside the queue may have changed the state, setting the uniforms of each pipeline for instance
+        self.state.invalidate()
+        issued, skipped = self.state.issued, self.state.skipped
+        draws = 0
+
+        self.items.sort(key=lambda item: item[0])
+
+        # Uniform blocks changed through setUniform, sent once before any draw
+        for pipeline in {id(item[1]): item[1] for item in self.items}.values():
+            pipeline.uploadBlocks()
+
+        for _, pipeline, gpuShape, transform, transformName, mode in self.items:
+            self.state.useProgram(pipeline.shaderProgram)
+            self.state.bindVertexArray(gpuShape.vao)
+            if gpuShape.texture is not None:
+                self.state.bindTexture(pipeline.textureTarget, gpuShape.texture)
+
+            if transform is not None:
+                glUniformMatrix4fv(pipeline.uniformLocation(transformName), 1, GL_TRUE, transform)
+                draws += 1
+
+            if isinstance(gpuShape, gs.InstancedGPUShape):
+                glDrawElementsInstanced(mode, gpuShape.size, gpuShape.indexType, None, gpuShape.instanceCount)
+            else:
+                glDrawElements(mode, gpuShape.size, gpuShape.indexType, None)
+            draws += 1
+
+        # As drawCall does, no vertex array is left bound, so later buffer updates can not modify it
+        self.state.bindVertexArray(0)
+        self.items = []
+
+        self.stats.binds = self.state.issued - issued
+        self.stats.skipped = self.state.skipped - skipped
+        self.stats.calls = self.stats.binds + draws
@@ -10,14 +10,17 @@ __all__ = [
     'SimpleTextureShaderProgram',
     'SimpleTextureTransformShaderProgram',
     'SimpleTransformShaderProgram',
+    'textureAsyncSetup',
     'textureSimpleSetup'
 ]
 
 from OpenGL.GL import *
-import OpenGL.GL.shaders
+import grafica.program_cache as pc
 import numpy as np
-from PIL import Image
 from grafica.gpu_shape import GPUShape
+from grafica.shader_program import ShaderProgram
+import grafica.texture_cache as tc
+import grafica.texture_loader as tl
 
 __author__ = "Daniel Calderon"
 __license__ = "MIT"
@@ -27,39 +30,24 @@ __license__ = "MIT"
 SIZE_IN_BYTES = 4
 
 
-def textureSimpleSetup(imgName, sWrapMode, tWrapMode, minFilterMode, maxFilterMode):
+def textureSimpleSetup(imgName, sWrapMode, tWrapMode, minFilterMode, maxFilterMode, anisotropy=1.0):
     # wrapMode: GL_REPEAT, GL_CLAMP_TO_EDGE
-    # filterMode: GL_LINEAR, GL_NEAREST
-    texture = glGenTextures(1)
-    glBindTexture(GL_TEXTURE_2D, texture)
+    # filterMode: GL_LINEAR, GL_NEAREST, or GL_*_MIPMAP_* for minFilterMode, which loads the mipmaps too
+    # Filter presets fill the last three arguments: textureSimpleSetup(imgName, GL_REPEAT, GL_REPEAT, *tc.TRILINEAR)
+    # The same image with the same parameters is loaded only once, the texture is shared
+    # and freed when every GPUShape using it is cleared (see grafica.texture_cache)
+    # Being shared, changing its parameters with glTexParameter or deleting it with glDeleteTextures
+    # affects every holder. A texture of its own comes from a separate tc.TextureCache() instead
+    return tc.defaultCache().acquire(imgName, sWrapMode, tWrapMode, minFilterMode, maxFilterMode, anisotropy)
 
-    # texture wrapping params
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, sWrapMode)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, tWrapMode)
 
-    # texture filtering params
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, minFilterMode)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, maxFilterMode)
+def textureAsyncSetup(imgName, sWrapMode, tWrapMode, minFilterMode, maxFilterMode, anisotropy=1.0):
+    # As textureSimpleSetup, but the image is decoded in another thread and the texture
+    # shows a placeholder until grafica.texture_loader.defaultLoader().update() uploads it
+    return tl.defaultLoader().load(imgName, sWrapMode, tWrapMode, minFilterMode, maxFilterMode, anisotropy)
 
-    image = Image.open(imgName)
-    img_data = np.array(image, np.uint8)
 
-    if image.mode == "RGB":
-        internalFormat = GL_RGB
-        format = GL_RGB
-    elif image.mode == "RGBA":
-        internalFormat = GL_RGBA
-        format = GL_RGBA
-    else:
-        print("Image mode not supported.")
-        raise Exception()
-
-    glTexImage2D(GL_TEXTURE_2D, 0, internalFormat, image.size[0], image.size[1], 0, format, GL_UNSIGNED_BYTE, img_data)
-
-    return texture
-
-
-class SimpleShaderProgram:
+class SimpleShaderProgram(ShaderProgram):
 
     def __init__(self):
         vertex_shader = """
@@ -91,11 +79,13 @@ class SimpleShaderProgram:
         VAO = glGenVertexArrays(1)
         glBindVertexArray(VAO)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, GL_FRAGMENT_SHADER))
+        self.shaderProgram = pc.compileProgram(
+            (vertex_shader, GL_VERTEX_SHADER),
+            (fragment_shader, GL_FRAGMENT_SHADER))
+        self.cacheUniforms()
 
     def setupVAO(self, gpuShape):
+        gpuShape.stride = 6
         glBindVertexArray(gpuShape.vao)
 
         glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
@@ -118,13 +108,13 @@ class SimpleShaderProgram:
 
         # Binding the VAO and executing the draw call
         glBindVertexArray(gpuShape.vao)
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        glDrawElements(mode, gpuShape.size, gpuShape.indexType, None)
 
         # Unbind the current VAO
         glBindVertexArray(0)
 
 
-class SimpleTextureShaderProgram:
+class SimpleTextureShaderProgram(ShaderProgram):
 
     def __init__(self):
         vertex_shader = """
@@ -161,11 +151,13 @@ class SimpleTextureShaderProgram:
         VAO = glGenVertexArrays(1)
         glBindVertexArray(VAO)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, GL_FRAGMENT_SHADER))
+        self.shaderProgram = pc.compileProgram(
+            (vertex_shader, GL_VERTEX_SHADER),
+            (fragment_shader, GL_FRAGMENT_SHADER))
+        self.cacheUniforms()
 
     def setupVAO(self, gpuShape):
+        gpuShape.stride = 5
         glBindVertexArray(gpuShape.vao)
 
         glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
@@ -189,13 +181,13 @@ class SimpleTextureShaderProgram:
         # Binding the VAO and executing the draw call
         glBindVertexArray(gpuShape.vao)
         glBindTexture(GL_TEXTURE_2D, gpuShape.texture)
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        glDrawElements(mode, gpuShape.size, gpuShape.indexType, None)
 
         # Unbind the current VAO
         glBindVertexArray(0)
 
 
-class SimpleTransformShaderProgram:
+class SimpleTransformShaderProgram(ShaderProgram):
 
     def __init__(self):
         vertex_shader = """
@@ -231,11 +223,13 @@ class SimpleTransformShaderProgram:
         VAO = glGenVertexArrays(1)
         glBindVertexArray(VAO)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.shaderProgram = pc.compileProgram(
+            (vertex_shader, GL_VERTEX_SHADER),
+            (fragment_shader, GL_FRAGMENT_SHADER))
+        self.cacheUniforms()
 
     def setupVAO(self, gpuShape):
+        gpuShape.stride = 6
         glBindVertexArray(gpuShape.vao)
 
         glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
@@ -258,13 +252,13 @@ class SimpleTransformShaderProgram:
 
         # Binding the VAO and executing the draw call
         glBindVertexArray(gpuShape.vao)
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        glDrawElements(mode, gpuShape.size, gpuShape.indexType, None)
 
         # Unbind the current VAO
         glBindVertexArray(0)
 
 
-class SimpleTextureTransformShaderProgram:
+class SimpleTextureTransformShaderProgram(ShaderProgram):
 
     def __init__(self):
         vertex_shader = """
@@ -304,11 +298,13 @@ class SimpleTextureTransformShaderProgram:
         glBindVertexArray(VAO)
 
         # Compiling our shader program
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, GL_FRAGMENT_SHADER))
+        self.shaderProgram = pc.compileProgram(
+            (vertex_shader, GL_VERTEX_SHADER),
+            (fragment_shader, GL_FRAGMENT_SHADER))
+        self.cacheUniforms()
 
     def setupVAO(self, gpuShape):
+        gpuShape.stride = 5
         glBindVertexArray(gpuShape.vao)
 
         glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
@@ -331,13 +327,13 @@ class SimpleTextureTransformShaderProgram:
 
         glBindVertexArray(gpuShape.vao)
         glBindTexture(GL_TEXTURE_2D, gpuShape.texture)
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        glDrawElements(mode, gpuShape.size, gpuShape.indexType, None)
 
         # Unbind the current VAO
         glBindVertexArray(0)
 
 
-class SimpleModelViewProjectionShaderProgram:
+class SimpleModelViewProjectionShaderProgram(ShaderProgram):
 
     def __init__(self):
         vertex_shader = """
@@ -373,11 +369,13 @@ class SimpleModelViewProjectionShaderProgram:
         VAO = glGenVertexArrays(1)
         glBindVertexArray(VAO)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.shaderProgram = pc.compileProgram(
+            (vertex_shader, GL_VERTEX_SHADER),
+            (fragment_shader, GL_FRAGMENT_SHADER))
+        self.cacheUniforms()
 
     def setupVAO(self, gpuShape):
+        gpuShape.stride = 6
         glBindVertexArray(gpuShape.vao)
 
         glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
@@ -400,13 +398,13 @@ class SimpleModelViewProjectionShaderProgram:
 
         # Binding the VAO and executing the draw call
         glBindVertexArray(gpuShape.vao)
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        glDrawElements(mode, gpuShape.size, gpuShape.indexType, None)
 
         # Unbind the current VAO
         glBindVertexArray(0)
 
 
-class SimpleTextureModelViewProjectionShaderProgram:
+class SimpleTextureModelViewProjectionShaderProgram(ShaderProgram):
 
     def __init__(self):
         vertex_shader = """
@@ -447,11 +445,13 @@ class SimpleTextureModelViewProjectionShaderProgram:
         VAO = glGenVertexArrays(1)
         glBindVertexArray(VAO)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.shaderProgram = pc.compileProgram(
+            (vertex_shader, GL_VERTEX_SHADER),
+            (fragment_shader, GL_FRAGMENT_SHADER))
+        self.cacheUniforms()
 
     def setupVAO(self, gpuShape):
+        gpuShape.stride = 5
         glBindVertexArray(gpuShape.vao)
 
         glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
@@ -475,7 +475,7 @@ class SimpleTextureModelViewProjectionShaderProgram:
         # Binding the VAO and executing the draw call
         glBindVertexArray(gpuShape.vao)
         glBindTexture(GL_TEXTURE_2D, gpuShape.texture)
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        glDrawElements(mode, gpuShape.size, gpuShape.indexType, None)
 
         # Unbind the current VAO
         glBindVertexArray(0)
@@ -3,10 +3,13 @@
 A convenience class container to reference a shape on GPU memory.
 """
 
-__all__ = ['GPUShape']
+__all__ = ['GPUShape', 'InstancedGPUShape', 'VertexFormat']
 
 from OpenGL.GL import *
+import copy
+import ctypes
 import numpy as np
+from grafica.texture_cache import TextureHandle
 
 __author__ = "Daniel Calderon"
 __license__ = "MIT"
@@ -15,6 +18,72 @@ __license__ = "MIT"
 # 1 byte = 8 bits
 SIZE_IN_BYTES = 4
 
+# Indices take 16 bits when every vertex can be addressed with them
+MAX_UINT16_VERTICES = 65536
+
+
+class VertexFormat:
+    """
+    Compact layout of textured vertices, given to fillBuffers as 8 floats: position, texture coordinates, normal.
+    - position: 3 floats, or 3 normalized int16 (GL_SHORT), which only hold coordinates within [-1, 1].
+    - texCoords: 2 half floats, 11 bits of precision: coordinates repeating the texture many times lose detail.
+    - normal: 10 bits per component, packed in 4 bytes as GL_INT_2_10_10_10_REV.
+    Vertices take 20 bytes, or 16 with int16 positions, instead of 32.
+    """
+
+    def __init__(self, positionType=GL_FLOAT):
+        assert positionType in [GL_FLOAT, GL_SHORT], "Positions are GL_FLOAT or GL_SHORT."
+        self.positionType = positionType
+
+        # int16 positions are padded to 8 bytes, keeping every attribute 4 bytes aligned
+        position = ('position', '<f4', 3) if positionType == GL_FLOAT else ('position', '<i2', 4)
+        self.dtype = np.dtype([position, ('texCoords', '<f2', 2), ('normal', '<u4')])
+        self.size = self.dtype.itemsize
+
+    def pack(self, vertexData):
+        """The vertices of vertexData, 8 floats each, as a structured array in this format."""
+        vertexData = np.asarray(vertexData, dtype=np.float32).reshape((-1, 8))
+        vertices = np.zeros(len(vertexData), dtype=self.dtype)
+
+        positions = vertexData[:, 0:3]
+        if self.positionType == GL_SHORT:
+            if positions.size > 0 and np.max(np.abs(positions)) > 1.0:
+                raise ValueError("Positions out of [-1, 1] do not fit normalized int16, use GL_FLOAT positions.")
+            vertices['position'][:, 0:3] = np.rint(positions * 32767)
+        else:
+            vertices['position'] = positions
+        vertices['texCoords'] = vertexData[:, 3:5]
+
+        # Normals are unit length before quantizing, shaders normalize them anyway
+        normals = vertexData[:, 5:8]
+        lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+        normals = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+        components = np.rint(normals * 511).astype(np.int32) & 0x3FF
+        vertices['normal'] = components[:, 0] | (components[:, 1] << 10) | (components[:, 2] << 20)
+        return vertices
+
+    def setupAttributes(self, shaderProgram):
+        """Attribute pointers of position, texCoords and normal, for the VAO and vertex buffer already bound."""
+        position = glGetAttribLocation(shaderProgram, "position")
+        glVertexAttribPointer(position, 3, self.positionType, GL_TRUE if self.positionType == GL_SHORT else GL_FALSE,
+                              self.size, ctypes.c_void_p(self.dtype.fields['position'][1]))
+        glEnableVertexAttribArray(position)
+
+        texCoords = glGetAttribLocation(shaderProgram, "texCoords")
+        glVertexAttribPointer(texCoords, 2, GL_HALF_FLOAT, GL_FALSE, self.size,
+                              ctypes.c_void_p(self.dtype.fields['texCoords'][1]))
+        glEnableVertexAttribArray(texCoords)
+
+        normal = glGetAttribLocation(shaderProgram, "normal")
+        glVertexAttribPointer(normal, 4, GL_INT_2_10_10_10_REV, GL_TRUE, self.size,
+                              ctypes.c_void_p(self.dtype.fields['normal'][1]))
+        glEnableVertexAttribArray(normal)
+
+
+# Compact formats of the textured pipelines of grafica.lighting_shaders, see GPUShape.vertexFormat
+COMPACT_VERTICES = VertexFormat(GL_FLOAT)
+COMPACT_INT16_VERTICES = VertexFormat(GL_SHORT)
+
 
 class GPUShape:
     def __init__(self):
@@ -25,6 +94,21 @@ class GPUShape:
         self.ebo = None
         self.texture = None
         self.size = None
+        self.indexType = GL_UNSIGNED_INT
+
+        # Layout of the vertex buffer: None for floats, or a VertexFormat. Set it before setupVAO
+        self.vertexFormat = None
+
+        # CPU side copy of the data last sent to the buffers, used to bake scene graphs
+        self.vertexData = None
+        self.indexData = None
+
+        # Floats per vertex, set by the pipeline in setupVAO. Positions are always the first 3 floats
+        self.stride = None
+        self._aabb = None
+
+        # False for shapes drawing the buffers of another GPUShape, see withTexture
+        self.ownsBuffers = True
 
     def initBuffers(self):
         """Convenience function for initialization of OpenGL buffers.
@@ -39,6 +123,18 @@ class GPUShape:
         self.ebo = glGenBuffers(1)
         return self
 
+    def withTexture(self, texture):
+        """A GPUShape drawing the same buffers as this one, with another texture.
+        Buffers still belong to this GPUShape, clearing the new one only frees its texture.
+        As assigning gpuShape.texture, the new shape takes the reference of texture: a TextureHandle
+        already held by this shape gets one more reference, so each shape releases its own."""
+        gpuShape = copy.copy(self)
+        if isinstance(texture, TextureHandle) and texture is self.texture:
+            texture = texture.retain()
+        gpuShape.texture = texture
+        gpuShape.ownsBuffers = False
+        return gpuShape
+
     def __str__(self):
         return "vao=" + str(self.vao) + \
                "  vbo=" + str(self.vbo) + \
@@ -47,23 +143,60 @@ class GPUShape:
 
     def fillBuffers(self, vertices, indices, usage):
 
-        vertexData = np.array(vertices, dtype=np.float32)
-        indices = np.array(indices, dtype=np.uint32)
+        # Arrays which already are contiguous float32 and uint32/uint16 data (as in ArrayShape, or
+        # memory-mapped from the assets cache) are handed to OpenGL without any copy
+        vertexData = np.ascontiguousarray(vertices, dtype=np.float32)
+
+        # Indices drop to uint16 when they address less than 65536 vertices
+        indices = np.asarray(indices)
+        if indices.dtype == np.uint16 or indices.size == 0 or np.max(indices) < MAX_UINT16_VERTICES:
+            indices = np.ascontiguousarray(indices, dtype=np.uint16)
+            self.indexType = GL_UNSIGNED_SHORT
+        else:
+            indices = np.ascontiguousarray(indices, dtype=np.uint32)
+            self.indexType = GL_UNSIGNED_INT
 
         self.size = len(indices)
+        self.vertexData = vertexData
+        self.indexData = indices
+        self._aabb = self._computeAABB()
+
+        # vertexData keeps the floats, the buffer holds them packed in the vertex format
+        bufferData = vertexData if self.vertexFormat is None else self.vertexFormat.pack(vertexData)
 
         glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
-        glBufferData(GL_ARRAY_BUFFER, len(vertexData) * SIZE_IN_BYTES, vertexData, usage)
+        glBufferData(GL_ARRAY_BUFFER, bufferData.nbytes, bufferData, usage)
 
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
-        glBufferData(GL_ELEMENT_ARRAY_BUFFER, len(indices) * SIZE_IN_BYTES, indices, usage)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, usage)
+
+    def _computeAABB(self):
+        if self.stride is None or self.vertexData is None or self.vertexData.size == 0:
+            return None
+
+        positions = self.vertexData.reshape((-1, self.stride))[:, 0:3]
+        return np.array([positions.min(axis=0), positions.max(axis=0)], dtype=np.float32)
+
+    @property
+    def aabb(self):
+        """Object space axis aligned bounding box, a (2, 3) array with the minimum and maximum corners.
+        It is computed when the buffers are filled, or later if setupVAO had not set the stride yet."""
+        if self._aabb is None:
+            self._aabb = self._computeAABB()
+        return self._aabb
 
     def clear(self):
         """Freeing GPU memory"""
 
-        if self.texture != None:
+        # Textures of a TextureCache may be used by other shapes, this shape only drops its reference
+        if isinstance(self.texture, TextureHandle):
+            self.texture.release()
+        elif self.texture != None:
             glDeleteTextures(1, [self.texture])
 
+        if not self.ownsBuffers:
+            return
+
         if self.ebo != None:
             glDeleteBuffers(1, [self.ebo])
 
@@ -72,3 +205,51 @@ class GPUShape:
 
         if self.vao != None:
             glDeleteVertexArrays(1, [self.vao])
+
+
+class InstancedGPUShape(GPUShape):
+    def __init__(self, gpuShape):
+        """Many copies of an already filled GPUShape, each one with its own model matrix.
+        Vertex, index and texture handlers are shared with gpuShape, only the VAO and
+        the buffer of per instance model matrices belong to this object."""
+
+        super().__init__()
+        self.vbo = gpuShape.vbo
+        self.ebo = gpuShape.ebo
+        self.texture = gpuShape.texture
+        self.size = gpuShape.size
+        self.indexType = gpuShape.indexType
+        self.vertexFormat = gpuShape.vertexFormat
+        self.vertexData = gpuShape.vertexData
+        self.indexData = gpuShape.indexData
+        self.stride = gpuShape.stride
+
+        self.instanceVbo = None
+        self.instanceCount = 0
+
+    def initBuffers(self):
+        """Creates the VAO and the instance buffer, the shared buffers already exist."""
+        self.vao = glGenVertexArrays(1)
+        self.instanceVbo = glGenBuffers(1)
+        return self
+
+    def fillInstances(self, transforms, usage):
+        """Uploads one 4x4 model matrix per instance.
+        Our matrices are row major, while a mat4 vertex attribute reads one column per location,
+        so each matrix is transposed before sending it."""
+
+        transforms = np.asarray(transforms, dtype=np.float32).reshape((-1, 4, 4))
+        instanceData = np.ascontiguousarray(np.transpose(transforms, (0, 2, 1)))
+        self.instanceCount = len(instanceData)
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.instanceVbo)
+        glBufferData(GL_ARRAY_BUFFER, instanceData.nbytes, instanceData, usage)
+
+    def clear(self):
+        """Freeing GPU memory, shared buffers and texture are freed by the original GPUShape"""
+
+        if self.instanceVbo != None:
+            glDeleteBuffers(1, [self.instanceVbo])
+
+        if self.vao != None:
+            glDeleteVertexArrays(1, [self.vao])
@@ -0,0 +1,313 @@
+# coding=utf-8
+"""
+Clustered light culling. The view frustum is split in clusters, screen tiles times depth slices, and point and
+spot lights are binned into the clusters they reach with vectorized NumPy. The light lists of every cluster are
+uploaded as texture buffers, so each fragment evaluates only the lights of its own cluster.
+Used by lighting_shaders.ClusteredLightTexturePhongShaderProgram.
+"""
+
+__all__ = ['ClusterStats', 'LightClusters', 'lightRanges']
+
+from OpenGL.GL import *
+import numpy as np
+import time
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+# Texture units of the light tables, unit 0 is left for the texture of the shapes
+LIGHTS_UNIT = 1
+CLUSTERS_UNIT = 2
+INDICES_UNIT = 3
+
+# RGBA texels per light: position + constant, direction + linear, diffuse + quadratic, specular + cutOff, outerCutOff
+TEXELS_PER_LIGHT = 5
+
+# A light is ignored where its attenuated diffuse and specular terms are below this value
+DEFAULT_THRESHOLD = 1.0 / 256
+
+
+def lightRanges(constant, linear, quadratic, intensity, threshold=DEFAULT_THRESHOLD):
+    """Distance where intensity / (constant + linear * d + quadratic * d^2) falls to threshold, for arrays of lights.
+    Lights which never reach threshold have range 0."""
+    constant, linear, quadratic, intensity = np.broadcast_arrays(
+        *[np.asarray(value, dtype=np.float64) for value in [constant, linear, quadratic, intensity]])
+
+    # Roots of quadratic * d^2 + linear * d + c = 0
+    c = constant - intensity / threshold
+    with np.errstate(divide='ignore', invalid='ignore'):
+        quadraticRoot = (-linear + np.sqrt(linear * linear - 4 * quadratic * c)) / (2 * quadratic)
+        linearRoot = -c / linear
+
+    ranges = np.where(quadratic > 0, quadraticRoot, np.where(linear > 0, linearRoot, np.inf))
+    return np.where(c < 0, ranges, 0.0)
+
+
+class ClusterStats:
+    """Counters of the last call to LightClusters.update."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # Lights, lights inside the frustum, light references stored in the clusters,
+        # clusters with some light, the longest light list and the CPU time binning them
+        self.lights = 0
+        self.visible = 0
+        self.references = 0
+        self.occupied = 0
+        self.maxPerCluster = 0
+        self.time = 0.0
+
+    def averagePerCluster(self):
+        return self.references / self.occupied if self.occupied > 0 else 0.0
+
+    def __str__(self):
+        return "lights=" + str(self.lights) + \
+               "  visible=" + str(self.visible) + \
+               "  references=" + str(self.references) + \
+               "  occupied=" + str(self.occupied) + \
+               "  average=" + "{:.1f}".format(self.averagePerCluster()) + \
+               "  max=" + str(self.maxPerCluster) + \
+               "  time=" + "{:.2f}".format(self.time * 1000) + " ms"
+
+
+def _packLights(positions, directions, diffuse, specular, constant, linear, quadratic, cutOff, outerCutOff):
+    # One row of TEXELS_PER_LIGHT * 4 floats per light, as read by the shader. Values are given per light or shared
+    columns = [(positions, 3), (constant, 1), (directions, 3), (linear, 1), (diffuse, 3), (quadratic, 1),
+               (specular, 3), (cutOff, 1), (outerCutOff, 1)]
+    count = len(positions)
+    table = np.zeros((count, TEXELS_PER_LIGHT * 4), dtype=np.float32)
+    offset = 0
+    for values, width in columns:
+        values = np.asarray(values, dtype=np.float32)
+        table[:, offset:offset + width] = np.broadcast_to(values.reshape(-1, width), (count, width))
+        offset += width
+    return table
+
+
+def _expand(sizes):
+    # Owner of each element and its position among the elements of its owner, when owner i has sizes[i] elements
+    owners = np.repeat(np.arange(len(sizes)), sizes)
+    local = np.arange(len(owners)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    return owners, local
+
+
+def _createTextureBuffer(internalFormat):
+    buffer = glGenBuffers(1)
+    texture = glGenTextures(1)
+    glBindBuffer(GL_TEXTURE_BUFFER, buffer)
+    glBindTexture(GL_TEXTURE_BUFFER, texture)
+    glTexBuffer(GL_TEXTURE_BUFFER, internalFormat, buffer)
+    glBindTexture(GL_TEXTURE_BUFFER, 0)
+    glBindBuffer(GL_TEXTURE_BUFFER, 0)
+    return buffer, texture
+
+
+def _uploadTextureBuffer(buffer, data):
+    # The whole buffer is replaced, so the driver does not wait for the frames still reading the old one
+    glBindBuffer(GL_TEXTURE_BUFFER, buffer)
+    glBufferData(GL_TEXTURE_BUFFER, data.nbytes, data, GL_STREAM_DRAW)
+    glBindBuffer(GL_TEXTURE_BUFFER, 0)
+
+
+class LightClusters:
+    """
+    Point and spot lights binned into grid = (tiles in x, tiles in y, depth slices) view space clusters.
+    Depth slices grow exponentially from the near to the far plane. Lights are set with setPointLights and
+    setSpotLights, in world coordinates, and binned with update once per frame, after the camera moves.
+    """
+
+    def __init__(self, grid=(16, 9, 24), threshold=DEFAULT_THRESHOLD):
+        self.grid = tuple(grid)
+        self.clusterCount = int(np.prod(self.grid))
+        self.threshold = threshold
+        self.stats = ClusterStats()
+
+        self.pointLights = np.zeros((0, TEXELS_PER_LIGHT * 4), dtype=np.float32)
+        self.spotLights = np.zeros((0, TEXELS_PER_LIGHT * 4), dtype=np.float32)
+        self.pointAmbient = np.zeros(3, dtype=np.float32)
+        self.spotAmbient = np.zeros(3, dtype=np.float32)
+        self.lightsDirty = True
+
+        # View space bounding boxes of the clusters, they only change with the projection
+        self.projection = None
+        self.near = 0.0
+        self.far = 0.0
+
+        self.lightsBuffer, self.lightsTexture = _createTextureBuffer(GL_RGBA32F)
+        self.clustersBuffer, self.clustersTexture = _createTextureBuffer(GL_RG32UI)
+        self.indicesBuffer, self.indicesTexture = _createTextureBuffer(GL_R32UI)
+
+    def setPointLights(self, positions, diffuse, specular, ambient=(0.0, 0.0, 0.0),
+                       constant=1.0, linear=0.0, quadratic=1.0):
+        """Replaces the point lights. positions is a (n, 3) array, the other parameters are given per light
+        or shared by all of them. Every ambient term lights the whole scene, as in MultipleLightTexturePhongShaderProgram."""
+        positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+
+        # A spot light whose cone never cuts the light
+        self.pointLights = _packLights(positions, (0.0, 0.0, -1.0), diffuse, specular,
+                                       constant, linear, quadratic, -1.0, -2.0)
+        self.pointAmbient = np.broadcast_to(np.asarray(ambient, dtype=np.float32), positions.shape).sum(axis=0)
+        self.lightsDirty = True
+
+    def setSpotLights(self, positions, directions, cutOff, outerCutOff, diffuse, specular, ambient=(0.0, 0.0, 0.0),
+                      constant=1.0, linear=0.0, quadratic=1.0):
+        """Replaces the spot lights, as setPointLights. cutOff and outerCutOff are cosines of the cone angles."""
+        positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+        self.spotLights = _packLights(positions, directions, diffuse, specular,
+                                      constant, linear, quadratic, cutOff, outerCutOff)
+        self.spotAmbient = np.broadcast_to(np.asarray(ambient, dtype=np.float32), positions.shape).sum(axis=0)
+        self.lightsDirty = True
+
+    @property
+    def ambient(self):
+        """Sum of the ambient terms of every light, they are not attenuated."""
+        return self.pointAmbient + self.spotAmbient
+
+    def _updateLights(self):
+        self.lights = np.concatenate([self.pointLights, self.spotLights])
+
+        # The range uses the brightest diffuse or specular channel of each light
+        intensity = np.max(self.lights[:, 8:15], axis=1, initial=0.0, where=[True] * 3 + [False] + [True] * 3)
+        self.ranges = lightRanges(self.lights[:, 3], self.lights[:, 7], self.lights[:, 11],
+                                  intensity, self.threshold).astype(np.float32)
+
+    def _updateClusterBoxes(self, projection):
+        self.projection = np.array(projection, dtype=np.float32)
+
+        # Near and far planes of a perspective projection such as tr.perspective or tr.frustum
+        a, b = float(projection[2][2]), float(projection[2][3])
+        self.near = b / (a - 1)
+        self.far = b / (a + 1)
+
+        tilesX, tilesY, slices = self.grid
+        self.sliceDepths = self.near * (self.far / self.near) ** (np.arange(slices + 1) / slices)
+        sliceDepths = self.sliceDepths
+
+        # x and y bounds of each tile in normalized device coordinates, taken to view space at both depths
+        def tileBounds(tiles, scale, offset):
+            ndc = np.linspace(-1.0, 1.0, tiles + 1)
+            corners = (ndc[None, :] - offset) / scale * sliceDepths[:, None]
+            lower = np.minimum(corners[:-1, :-1], corners[1:, :-1])
+            lower = np.minimum(lower, np.minimum(corners[:-1, 1:], corners[1:, 1:]))
+            upper = np.maximum(corners[:-1, :-1], corners[1:, :-1])
+            upper = np.maximum(upper, np.maximum(corners[:-1, 1:], corners[1:, 1:]))
+            return lower, upper
+
+        # Clusters are numbered (slice * tilesY + y) * tilesX + x, as in the shader
+        xMin, xMax = tileBounds(tilesX, projection[0][0], -projection[0][2])
+        yMin, yMax = tileBounds(tilesY, projection[1][1], -projection[1][2])
+        shape = (slices, tilesY, tilesX)
+        self.boxMin = np.stack([
+            np.broadcast_to(xMin[:, None, :], shape),
+            np.broadcast_to(yMin[:, :, None], shape),
+            np.broadcast_to(-sliceDepths[1:, None, None], shape)], axis=-1).reshape(-1, 3).astype(np.float32)
+        self.boxMax = np.stack([
+            np.broadcast_to(xMax[:, None, :], shape),
+            np.broadcast_to(yMax[:, :, None], shape),
+            np.broadcast_to(-sliceDepths[:-1, None, None], shape)], axis=-1).reshape(-1, 3).astype(np.float32)
+
+    def update(self, view, projection):
+        """Bins the lights into the clusters of this camera and uploads the light lists of every cluster."""
+        t0 = time.perf_counter()
+        self.stats.reset()
+
+        lightsDirty = self.lightsDirty
+        if lightsDirty:
+            self._updateLights()
+            self.lightsDirty = False
+        if self.projection is None or not np.array_equal(self.projection, projection):
+            self._updateClusterBoxes(projection)
+
+        tilesX, tilesY, slices = self.grid
+        view = np.asarray(view, dtype=np.float32)
+        projection = self.projection
+
+        centers = self.lights[:, 0:3] @ view[:3, :3].T + view[:3, 3]
+        depth = -centers[:, 2]
+
+        # Depth interval of each light sphere, inside the frustum
+        nearDepth = np.maximum(depth - self.ranges, self.near)
+        farDepth = np.minimum(depth + self.ranges, self.far)
+        lightIndices = np.nonzero((self.ranges > 0) & (nearDepth <= farDepth))[0]
+
+        # Depth slices reached by each light, as (light, slice) pairs
+        logRatio = np.log(self.far / self.near)
+        firstSlice = np.floor(np.log(nearDepth[lightIndices] / self.near) / logRatio * slices)
+        lastSlice = np.floor(np.log(farDepth[lightIndices] / self.near) / logRatio * slices)
+        firstSlice = np.clip(firstSlice, 0, slices - 1).astype(np.int32)
+        lastSlice = np.clip(lastSlice, 0, slices - 1).astype(np.int32)
+        owners, local = _expand(lastSlice - firstSlice + 1)
+        sliceLights = lightIndices[owners]
+        sliceIndices = firstSlice[owners] + local
+
+        # Part of each sphere inside each of its slices: its depth interval and the radius of its widest section
+        d0 = np.maximum(self.sliceDepths[sliceIndices], nearDepth[sliceLights])
+        d1 = np.minimum(self.sliceDepths[sliceIndices + 1], farDepth[sliceLights])
+        gap = np.maximum(np.maximum(d0 - depth[sliceLights], depth[sliceLights] - d1), 0.0)
+        sectionRadius = np.sqrt(np.maximum(self.ranges[sliceLights] ** 2 - gap ** 2, 0.0))
+
+        # Over the box around that part, x / depth is extreme at its corners. Tiles out of the screen are left out
+        def tileRange(center, scale, offset, tiles):
+            corners = np.stack([(center - sectionRadius) / d0, (center - sectionRadius) / d1,
+                                (center + sectionRadius) / d0, (center + sectionRadius) / d1]) * scale + offset
+            first = np.clip(np.floor((corners.min(axis=0) + 1.0) * 0.5 * tiles), 0, tiles).astype(np.int32)
+            last = np.clip(np.floor((corners.max(axis=0) + 1.0) * 0.5 * tiles), -1, tiles - 1).astype(np.int32)
+            return first, np.maximum(last - first + 1, 0)
+
+        x0, sizeX = tileRange(centers[sliceLights, 0], projection[0][0], -projection[0][2], tilesX)
+        y0, sizeY = tileRange(centers[sliceLights, 1], projection[1][1], -projection[1][2], tilesY)
+
+        # Every tile of each (light, slice) pair, as (light, cluster) pairs
+        owners, local = _expand(sizeX * sizeY)
+        pairLights = sliceLights[owners]
+        sizeX = sizeX[owners]
+        pairClusters = ((sliceIndices[owners] * tilesY + y0[owners] + local // sizeX) * tilesX
+                        + x0[owners] + local % sizeX)
+
+        # Only the clusters whose box actually touches the sphere are kept.
+        # np.take gathers rows much faster than indexing
+        pairCenters = np.take(centers, pairLights, axis=0)
+        outside = np.maximum(np.take(self.boxMin, pairClusters, axis=0) - pairCenters,
+                             pairCenters - np.take(self.boxMax, pairClusters, axis=0))
+        outside = np.maximum(outside, 0.0)
+        touching = np.einsum('ij,ij->i', outside, outside) <= self.ranges[pairLights] ** 2
+        pairLights, pairClusters = pairLights[touching], pairClusters[touching]
+
+        # Light lists of all the clusters, one after the other, with the offset and length of each list.
+        # A stable sort of 16 bits keys is a radix sort
+        if self.clusterCount <= 1 << 16:
+            pairClusters = pairClusters.astype(np.uint16)
+        order = np.argsort(pairClusters, kind='stable')
+        indices = pairLights[order].astype(np.uint32)
+        counts = np.bincount(pairClusters, minlength=self.clusterCount)
+        clusters = np.stack([np.cumsum(counts) - counts, counts], axis=1).astype(np.uint32)
+
+        # Uploads are not part of the binning time, they may wait for the GPU to finish with the previous frame
+        self.stats.time = time.perf_counter() - t0
+        if lightsDirty:
+            # At least one texel, so the texture buffer is never empty
+            _uploadTextureBuffer(self.lightsBuffer, self.lights if len(self.lights) > 0 else np.zeros(4, np.float32))
+        _uploadTextureBuffer(self.clustersBuffer, clusters)
+        _uploadTextureBuffer(self.indicesBuffer, indices if len(indices) > 0 else np.zeros(1, np.uint32))
+
+        self.stats.lights = len(self.lights)
+        self.stats.visible = int(np.count_nonzero(np.bincount(pairLights, minlength=len(self.lights))))
+        self.stats.references = len(indices)
+        self.stats.occupied = int(np.count_nonzero(counts))
+        self.stats.maxPerCluster = int(counts.max()) if len(counts) > 0 else 0
+
+    def bind(self):
+        """Binds the light tables to their texture units, leaving the texture unit 0 active."""
+        for unit, texture in [(LIGHTS_UNIT, self.lightsTexture),
+                              (CLUSTERS_UNIT, self.clustersTexture),
+                              (INDICES_UNIT, self.indicesTexture)]:
+            glActiveTexture(GL_TEXTURE0 + unit)
+            glBindTexture(GL_TEXTURE_BUFFER, texture)
+        glActiveTexture(GL_TEXTURE0)
+
+    def clear(self):
+        """Freeing GPU memory"""
+        glDeleteTextures([self.lightsTexture, self.clustersTexture, self.indicesTexture])
+        glDeleteBuffers(3, [self.lightsBuffer, self.clustersBuffer, self.indicesBuffer])
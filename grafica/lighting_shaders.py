@@ -4,6 +4,10 @@ Lighting Shaders.
 """
 
 __all__ = [
+    'ClusteredLightTexturePhongShaderProgram',
+    'InstancedTextureFlatShaderProgram',
+    'InstancedTextureGouraudShaderProgram',
+    'InstancedTexturePhongShaderProgram',
     'MultipleLightPhongShaderProgram',
     'MultipleLightTexturePhongShaderProgram',
     'SimpleFlatShaderProgram',
@@ -15,8 +19,11 @@ __all__ = [
 ]
 
 from OpenGL.GL import *
-import OpenGL.GL.shaders
-from grafica.gpu_shape import GPUShape
+import grafica.program_cache as pc
+from grafica.gpu_shape import GPUShape, InstancedGPUShape
+from grafica.shader_program import ShaderProgram
+import grafica.uniform_blocks as ub
+import grafica.light_clusters as lc
 
 import sys
 import os.path
@@ -25,7 +32,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from grafica.assets_path import getAssetPath
 
 
-class SimpleFlatShaderProgram():
+class SimpleFlatShaderProgram(ShaderProgram):
 
     def __init__(self):
         vertex_shader = """
@@ -102,11 +109,13 @@ class SimpleFlatShaderProgram():
         VAO = glGenVertexArrays(1)
         glBindVertexArray(VAO)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.shaderProgram = pc.compileProgram(
+            (vertex_shader, GL_VERTEX_SHADER),
+            (fragment_shader, GL_FRAGMENT_SHADER))
+        self.cacheUniforms()
 
     def setupVAO(self, gpuShape):
+        gpuShape.stride = 9
         glBindVertexArray(gpuShape.vao)
 
         glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
@@ -133,118 +142,134 @@ class SimpleFlatShaderProgram():
 
         # Binding the VAO and executing the draw call
         glBindVertexArray(gpuShape.vao)
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        glDrawElements(mode, gpuShape.size, gpuShape.indexType, None)
 
         # Unbind the current VAO
         glBindVertexArray(0)
 
 
-class SimpleTextureFlatShaderProgram():
-
-    def __init__(self):
-        vertex_shader = """
-            #version 330
-
-            in vec3 position;
-            in vec2 texCoords;
-            in vec3 normal;
-
-            out vec2 fragTexCoords;
-            flat out vec3 vertexLightColor;
-
-            uniform mat4 model;
-            uniform mat4 view;
-            uniform mat4 projection;
-
-            uniform vec3 lightPosition; 
-            uniform vec3 viewPosition; 
-            uniform vec3 La;
-            uniform vec3 Ld;
-            uniform vec3 Ls;
-            uniform vec3 Ka;
-            uniform vec3 Kd;
-            uniform vec3 Ks;
-            uniform uint shininess;
-            uniform float constantAttenuation;
-            uniform float linearAttenuation;
-            uniform float quadraticAttenuation;
+# The textured pipelines read the camera and lighting parameters from the Camera and Lighting uniform
+# blocks, shared by all of them (see grafica.uniform_blocks). setUniform still works for those parameters.
+class SimpleTextureFlatShaderProgram(ShaderProgram):
+
+    vertexShader = """
+        #version 330
+
+        in vec3 position;
+        in vec2 texCoords;
+        in vec3 normal;
+
+        out vec2 fragTexCoords;
+        flat out vec3 vertexLightColor;
+
+        uniform mat4 model;
+
+        layout(std140, row_major) uniform Camera
+        {
+            mat4 projection;
+            mat4 view;
+            vec3 viewPosition;
+        };
+
+        layout(std140) uniform Lighting
+        {
+            vec3 lightPosition;
+            vec3 La;
+            vec3 Ld;
+            vec3 Ls;
+            vec3 Ka;
+            vec3 Kd;
+            vec3 Ks;
+            uint shininess;
+            float constantAttenuation;
+            float linearAttenuation;
+            float quadraticAttenuation;
+        };
+        
+        void main()
+        {
+            vec3 vertexPos = vec3(model * vec4(position, 1.0));
+            gl_Position = projection * view * vec4(vertexPos, 1.0);
+
+            fragTexCoords = texCoords;
+
+            // ambient
+            vec3 ambient = Ka * La;
             
-            void main()
-            {
-                vec3 vertexPos = vec3(model * vec4(position, 1.0));
-                gl_Position = projection * view * vec4(vertexPos, 1.0);
-
-                fragTexCoords = texCoords;
-
-                // ambient
-                vec3 ambient = Ka * La;
-                
-                // diffuse 
-                vec3 norm = normalize(normal);
-                vec3 toLight = lightPosition - vertexPos;
-                vec3 lightDir = normalize(toLight);
-                float diff = max(dot(norm, lightDir), 0.0);
-                vec3 diffuse = Kd * Ld * diff;
-                
-                // specular
-                vec3 viewDir = normalize(viewPosition - vertexPos);
-                vec3 reflectDir = reflect(-lightDir, norm);  
-                float spec = pow(max(dot(viewDir, reflectDir), 0.0), shininess);
-                vec3 specular = Ks * Ls * spec;
-
-                // attenuation
-                float distToLight = length(toLight);
-                float attenuation = constantAttenuation
-                    + linearAttenuation * distToLight
-                    + quadraticAttenuation * distToLight * distToLight;
-                
-                vertexLightColor = ambient + ((diffuse + specular) / attenuation);
-            }
-            """
+            // diffuse 
+            vec3 norm = normalize(normal);
+            vec3 toLight = lightPosition - vertexPos;
+            vec3 lightDir = normalize(toLight);
+            float diff = max(dot(norm, lightDir), 0.0);
+            vec3 diffuse = Kd * Ld * diff;
+            
+            // specular
+            vec3 viewDir = normalize(viewPosition - vertexPos);
+            vec3 reflectDir = reflect(-lightDir, norm);  
+            float spec = pow(max(dot(viewDir, reflectDir), 0.0), shininess);
+            vec3 specular = Ks * Ls * spec;
+
+            // attenuation
+            float distToLight = length(toLight);
+            float attenuation = constantAttenuation
+                + linearAttenuation * distToLight
+                + quadraticAttenuation * distToLight * distToLight;
+            
+            vertexLightColor = ambient + ((diffuse + specular) / attenuation);
+        }
+        """
 
-        fragment_shader = """
-            #version 330
+    fragmentShader = """
+        #version 330
 
-            flat in vec3 vertexLightColor;
-            in vec2 fragTexCoords;
+        flat in vec3 vertexLightColor;
+        in vec2 fragTexCoords;
 
-            out vec4 fragColor;
+        out vec4 fragColor;
 
-            uniform sampler2D samplerTex;
+        uniform sampler2D samplerTex;
 
-            void main()
-            {
-                vec4 textureColor = texture(samplerTex, fragTexCoords);
-                fragColor = vec4(vertexLightColor, 1.0) * textureColor;
-            }
-            """
+        void main()
+        {
+            vec4 textureColor = texture(samplerTex, fragTexCoords);
+            fragColor = vec4(vertexLightColor, 1.0) * textureColor;
+        }
+        """
 
+    def __init__(self):
         # Binding artificial vertex array object for validation
         VAO = glGenVertexArrays(1)
         glBindVertexArray(VAO)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.shaderProgram = pc.compileProgram(
+            (self.vertexShader, GL_VERTEX_SHADER),
+            (self.fragmentShader, GL_FRAGMENT_SHADER))
+        self.cacheUniforms()
+        self.bindUniformBlocks(ub.cameraBlock(), ub.lightingBlock())
 
     def setupVAO(self, gpuShape):
+        gpuShape.stride = 8
         glBindVertexArray(gpuShape.vao)
 
         glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
-        # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
-        glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(0))
-        glEnableVertexAttribArray(position)
+        if gpuShape.vertexFormat is not None:
+            # Compact vertices, see gpu_shape.VertexFormat
+            gpuShape.vertexFormat.setupAttributes(self.shaderProgram)
+        else:
+            # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
+            position = glGetAttribLocation(self.shaderProgram, "position")
+            glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(0))
+            glEnableVertexAttribArray(position)
 
-        color = glGetAttribLocation(self.shaderProgram, "texCoords")
-        glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(12))
-        glEnableVertexAttribArray(color)
+            color = glGetAttribLocation(self.shaderProgram, "texCoords")
+            glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(12))
+            glEnableVertexAttribArray(color)
 
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
-        glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
-        glEnableVertexAttribArray(normal)
+            normal = glGetAttribLocation(self.shaderProgram, "normal")
+            glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
+            glEnableVertexAttribArray(normal)
 
         # Unbinding current vao
         glBindVertexArray(0)
@@ -252,17 +277,20 @@ class SimpleTextureFlatShaderProgram():
     def drawCall(self, gpuShape, mode=GL_TRIANGLES):
         assert isinstance(gpuShape, GPUShape)
 
+        # Members of the uniform blocks set since the last draw are sent in one call per block
+        self.uploadBlocks()
+
         # Binding the VAO and executing the draw call
         glBindVertexArray(gpuShape.vao)
         glBindTexture(GL_TEXTURE_2D, gpuShape.texture)
 
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        glDrawElements(mode, gpuShape.size, gpuShape.indexType, None)
 
         # Unbind the current VAO
         glBindVertexArray(0)
 
 
-class SimpleGouraudShaderProgram():
+class SimpleGouraudShaderProgram(ShaderProgram):
 
     def __init__(self):
         vertex_shader = """
@@ -339,11 +367,13 @@ class SimpleGouraudShaderProgram():
         VAO = glGenVertexArrays(1)
         glBindVertexArray(VAO)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.shaderProgram = pc.compileProgram(
+            (vertex_shader, GL_VERTEX_SHADER),
+            (fragment_shader, GL_FRAGMENT_SHADER))
+        self.cacheUniforms()
 
     def setupVAO(self, gpuShape):
+        gpuShape.stride = 9
         glBindVertexArray(gpuShape.vao)
 
         glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
@@ -370,118 +400,132 @@ class SimpleGouraudShaderProgram():
 
         # Binding the VAO and executing the draw call
         glBindVertexArray(gpuShape.vao)
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        glDrawElements(mode, gpuShape.size, gpuShape.indexType, None)
 
         # Unbind the current VAO
         glBindVertexArray(0)
 
 
-class SimpleTextureGouraudShaderProgram():
-
-    def __init__(self):
-        vertex_shader = """
-            #version 330
-
-            in vec3 position;
-            in vec2 texCoords;
-            in vec3 normal;
-
-            out vec2 fragTexCoords;
-            out vec3 vertexLightColor;
-
-            uniform mat4 model;
-            uniform mat4 view;
-            uniform mat4 projection;
-
-            uniform vec3 lightPosition; 
-            uniform vec3 viewPosition; 
-            uniform vec3 La;
-            uniform vec3 Ld;
-            uniform vec3 Ls;
-            uniform vec3 Ka;
-            uniform vec3 Kd;
-            uniform vec3 Ks;
-            uniform uint shininess;
-            uniform float constantAttenuation;
-            uniform float linearAttenuation;
-            uniform float quadraticAttenuation;
+class SimpleTextureGouraudShaderProgram(ShaderProgram):
+
+    vertexShader = """
+        #version 330
+
+        in vec3 position;
+        in vec2 texCoords;
+        in vec3 normal;
+
+        out vec2 fragTexCoords;
+        out vec3 vertexLightColor;
+
+        uniform mat4 model;
+
+        layout(std140, row_major) uniform Camera
+        {
+            mat4 projection;
+            mat4 view;
+            vec3 viewPosition;
+        };
+
+        layout(std140) uniform Lighting
+        {
+            vec3 lightPosition;
+            vec3 La;
+            vec3 Ld;
+            vec3 Ls;
+            vec3 Ka;
+            vec3 Kd;
+            vec3 Ks;
+            uint shininess;
+            float constantAttenuation;
+            float linearAttenuation;
+            float quadraticAttenuation;
+        };
+        
+        void main()
+        {
+            vec3 vertexPos = vec3(model * vec4(position, 1.0));
+            gl_Position = projection * view * vec4(vertexPos, 1.0);
+
+            fragTexCoords = texCoords;
+
+            // ambient
+            vec3 ambient = Ka * La;
             
-            void main()
-            {
-                vec3 vertexPos = vec3(model * vec4(position, 1.0));
-                gl_Position = projection * view * vec4(vertexPos, 1.0);
-
-                fragTexCoords = texCoords;
-
-                // ambient
-                vec3 ambient = Ka * La;
-                
-                // diffuse 
-                vec3 norm = normalize(normal);
-                vec3 toLight = lightPosition - vertexPos;
-                vec3 lightDir = normalize(toLight);
-                float diff = max(dot(norm, lightDir), 0.0);
-                vec3 diffuse = Kd * Ld * diff;
-                
-                // specular
-                vec3 viewDir = normalize(viewPosition - vertexPos);
-                vec3 reflectDir = reflect(-lightDir, norm);  
-                float spec = pow(max(dot(viewDir, reflectDir), 0.0), shininess);
-                vec3 specular = Ks * Ls * spec;
-
-                // attenuation
-                float distToLight = length(toLight);
-                float attenuation = constantAttenuation
-                    + linearAttenuation * distToLight
-                    + quadraticAttenuation * distToLight * distToLight;
-                
-                vertexLightColor = ambient + ((diffuse + specular) / attenuation);
-            }
-            """
+            // diffuse 
+            vec3 norm = normalize(normal);
+            vec3 toLight = lightPosition - vertexPos;
+            vec3 lightDir = normalize(toLight);
+            float diff = max(dot(norm, lightDir), 0.0);
+            vec3 diffuse = Kd * Ld * diff;
+            
+            // specular
+            vec3 viewDir = normalize(viewPosition - vertexPos);
+            vec3 reflectDir = reflect(-lightDir, norm);  
+            float spec = pow(max(dot(viewDir, reflectDir), 0.0), shininess);
+            vec3 specular = Ks * Ls * spec;
+
+            // attenuation
+            float distToLight = length(toLight);
+            float attenuation = constantAttenuation
+                + linearAttenuation * distToLight
+                + quadraticAttenuation * distToLight * distToLight;
+            
+            vertexLightColor = ambient + ((diffuse + specular) / attenuation);
+        }
+        """
 
-        fragment_shader = """
-            #version 330
+    fragmentShader = """
+        #version 330
 
-            in vec3 vertexLightColor;
-            in vec2 fragTexCoords;
+        in vec3 vertexLightColor;
+        in vec2 fragTexCoords;
 
-            out vec4 fragColor;
+        out vec4 fragColor;
 
-            uniform sampler2D samplerTex;
+        uniform sampler2D samplerTex;
 
-            void main()
-            {
-                vec4 textureColor = texture(samplerTex, fragTexCoords);
-                fragColor = vec4(vertexLightColor, 1.0) * textureColor;
-            }
-            """
+        void main()
+        {
+            vec4 textureColor = texture(samplerTex, fragTexCoords);
+            fragColor = vec4(vertexLightColor, 1.0) * textureColor;
+        }
+        """
 
+    def __init__(self):
         # Binding artificial vertex array object for validation
         VAO = glGenVertexArrays(1)
         glBindVertexArray(VAO)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.shaderProgram = pc.compileProgram(
+            (self.vertexShader, GL_VERTEX_SHADER),
+            (self.fragmentShader, GL_FRAGMENT_SHADER))
+        self.cacheUniforms()
+        self.bindUniformBlocks(ub.cameraBlock(), ub.lightingBlock())
 
     def setupVAO(self, gpuShape):
+        gpuShape.stride = 8
         glBindVertexArray(gpuShape.vao)
 
         glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
-        # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
-        glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(0))
-        glEnableVertexAttribArray(position)
+        if gpuShape.vertexFormat is not None:
+            # Compact vertices, see gpu_shape.VertexFormat
+            gpuShape.vertexFormat.setupAttributes(self.shaderProgram)
+        else:
+            # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
+            position = glGetAttribLocation(self.shaderProgram, "position")
+            glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(0))
+            glEnableVertexAttribArray(position)
 
-        color = glGetAttribLocation(self.shaderProgram, "texCoords")
-        glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(12))
-        glEnableVertexAttribArray(color)
+            color = glGetAttribLocation(self.shaderProgram, "texCoords")
+            glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(12))
+            glEnableVertexAttribArray(color)
 
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
-        glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
-        glEnableVertexAttribArray(normal)
+            normal = glGetAttribLocation(self.shaderProgram, "normal")
+            glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
+            glEnableVertexAttribArray(normal)
 
         # Unbinding current vao
         glBindVertexArray(0)
@@ -489,17 +533,20 @@ class SimpleTextureGouraudShaderProgram():
     def drawCall(self, gpuShape, mode=GL_TRIANGLES):
         assert isinstance(gpuShape, GPUShape)
 
+        # Members of the uniform blocks set since the last draw are sent in one call per block
+        self.uploadBlocks()
+
         # Binding the VAO and executing the draw call
         glBindVertexArray(gpuShape.vao)
         glBindTexture(GL_TEXTURE_2D, gpuShape.texture)
 
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        glDrawElements(mode, gpuShape.size, gpuShape.indexType, None)
 
         # Unbind the current VAO
         glBindVertexArray(0)
 
 
-class SimplePhongShaderProgram:
+class SimplePhongShaderProgram(ShaderProgram):
 
     def __init__(self):
         vertex_shader = """
@@ -583,11 +630,13 @@ class SimplePhongShaderProgram:
         VAO = glGenVertexArrays(1)
         glBindVertexArray(VAO)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.shaderProgram = pc.compileProgram(
+            (vertex_shader, GL_VERTEX_SHADER),
+            (fragment_shader, GL_FRAGMENT_SHADER))
+        self.cacheUniforms()
 
     def setupVAO(self, gpuShape):
+        gpuShape.stride = 9
         glBindVertexArray(gpuShape.vao)
 
         glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
@@ -614,122 +663,143 @@ class SimplePhongShaderProgram:
 
         # Binding the VAO and executing the draw call
         glBindVertexArray(gpuShape.vao)
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        glDrawElements(mode, gpuShape.size, gpuShape.indexType, None)
 
         # Unbind the current VAO
         glBindVertexArray(0)
 
 
-class SimpleTexturePhongShaderProgram:
+class SimpleTexturePhongShaderProgram(ShaderProgram):
 
-    def __init__(self):
-        vertex_shader = """
-            #version 330 core
-            
-            in vec3 position;
-            in vec2 texCoords;
-            in vec3 normal;
+    vertexShader = """
+        #version 330 core
+        
+        in vec3 position;
+        in vec2 texCoords;
+        in vec3 normal;
 
-            out vec3 fragPosition;
-            out vec2 fragTexCoords;
-            out vec3 fragNormal;
-
-            uniform mat4 model;
-            uniform mat4 view;
-            uniform mat4 projection;
-
-            void main()
-            {
-                fragPosition = vec3(model * vec4(position, 1.0));
-                fragTexCoords = texCoords;
-                fragNormal = mat3(transpose(inverse(model))) * normal;  
-                
-                gl_Position = projection * view * vec4(fragPosition, 1.0);
-            }
-            """
+        out vec3 fragPosition;
+        out vec2 fragTexCoords;
+        out vec3 fragNormal;
 
-        fragment_shader = """
-            #version 330 core
+        uniform mat4 model;
 
-            in vec3 fragNormal;
-            in vec3 fragPosition;
-            in vec2 fragTexCoords;
+        layout(std140, row_major) uniform Camera
+        {
+            mat4 projection;
+            mat4 view;
+            vec3 viewPosition;
+        };
 
-            out vec4 fragColor;
+        void main()
+        {
+            fragPosition = vec3(model * vec4(position, 1.0));
+            fragTexCoords = texCoords;
+            fragNormal = mat3(transpose(inverse(model))) * normal;  
             
-            uniform vec3 lightPosition; 
-            uniform vec3 viewPosition; 
-            uniform vec3 La;
-            uniform vec3 Ld;
-            uniform vec3 Ls;
-            uniform vec3 Ka;
-            uniform vec3 Kd;
-            uniform vec3 Ks;
-            uniform uint shininess;
-            uniform float constantAttenuation;
-            uniform float linearAttenuation;
-            uniform float quadraticAttenuation;
-
-            uniform sampler2D samplerTex;
-
-            void main()
-            {
-                // ambient
-                vec3 ambient = Ka * La;
-                
-                // diffuse
-                // fragment normal has been interpolated, so it does not necessarily have norm equal to 1
-                vec3 normalizedNormal = normalize(fragNormal);
-                vec3 toLight = lightPosition - fragPosition;
-                vec3 lightDir = normalize(toLight);
-                float diff = max(dot(normalizedNormal, lightDir), 0.0);
-                vec3 diffuse = Kd * Ld * diff;
+            gl_Position = projection * view * vec4(fragPosition, 1.0);
+        }
+        """
+
+    fragmentShader = """
+        #version 330 core
+
+        in vec3 fragNormal;
+        in vec3 fragPosition;
+        in vec2 fragTexCoords;
+
+        out vec4 fragColor;
+        
+        layout(std140, row_major) uniform Camera
+        {
+            mat4 projection;
+            mat4 view;
+            vec3 viewPosition;
+        };
+
+        layout(std140) uniform Lighting
+        {
+            vec3 lightPosition;
+            vec3 La;
+            vec3 Ld;
+            vec3 Ls;
+            vec3 Ka;
+            vec3 Kd;
+            vec3 Ks;
+            uint shininess;
+            float constantAttenuation;
+            float linearAttenuation;
+            float quadraticAttenuation;
+        };
+
+        uniform sampler2D samplerTex;
+
+        void main()
+        {
+            // ambient
+            vec3 ambient = Ka * La;
+            
+            // diffuse
+            // fragment normal has been interpolated, so it does not necessarily have norm equal to 1
+            vec3 normalizedNormal = normalize(fragNormal);
+            vec3 toLight = lightPosition - fragPosition;
+            vec3 lightDir = normalize(toLight);
+            float diff = max(dot(normalizedNormal, lightDir), 0.0);
+            vec3 diffuse = Kd * Ld * diff;
+            
+            // specular
+            vec3 viewDir = normalize(viewPosition - fragPosition);
+            vec3 reflectDir = reflect(-lightDir, normalizedNormal);  
+            float spec = pow(max(dot(viewDir, reflectDir), 0.0), shininess);
+            vec3 specular = Ks * Ls * spec;
+
+            // attenuation
+            float distToLight = length(toLight);
+            float attenuation = constantAttenuation
+                + linearAttenuation * distToLight
+                + quadraticAttenuation * distToLight * distToLight;
                 
-                // specular
-                vec3 viewDir = normalize(viewPosition - fragPosition);
-                vec3 reflectDir = reflect(-lightDir, normalizedNormal);  
-                float spec = pow(max(dot(viewDir, reflectDir), 0.0), shininess);
-                vec3 specular = Ks * Ls * spec;
+            vec4 fragOriginalColor = texture(samplerTex, fragTexCoords);
 
-                // attenuation
-                float distToLight = length(toLight);
-                float attenuation = constantAttenuation
-                    + linearAttenuation * distToLight
-                    + quadraticAttenuation * distToLight * distToLight;
-                    
-                vec4 fragOriginalColor = texture(samplerTex, fragTexCoords);
-
-                vec3 result = (ambient + ((diffuse + specular) / attenuation)) * fragOriginalColor.rgb;
-                fragColor = vec4(result, 1.0);
-            }
-            """
+            vec3 result = (ambient + ((diffuse + specular) / attenuation)) * fragOriginalColor.rgb;
+            fragColor = vec4(result, 1.0);
+        }
+        """
 
+    def __init__(self):
         # Binding artificial vertex array object for validation
         VAO = glGenVertexArrays(1)
         glBindVertexArray(VAO)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.shaderProgram = pc.compileProgram(
+            (self.vertexShader, GL_VERTEX_SHADER),
+            (self.fragmentShader, GL_FRAGMENT_SHADER))
+        self.cacheUniforms()
+        self.bindUniformBlocks(ub.cameraBlock(), ub.lightingBlock())
 
     def setupVAO(self, gpuShape):
+        gpuShape.stride = 8
         glBindVertexArray(gpuShape.vao)
 
         glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
-        # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
-        glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(0))
-        glEnableVertexAttribArray(position)
+        if gpuShape.vertexFormat is not None:
+            # Compact vertices, see gpu_shape.VertexFormat
+            gpuShape.vertexFormat.setupAttributes(self.shaderProgram)
+        else:
+            # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
+            position = glGetAttribLocation(self.shaderProgram, "position")
+            glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(0))
+            glEnableVertexAttribArray(position)
 
-        color = glGetAttribLocation(self.shaderProgram, "texCoords")
-        glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(12))
-        glEnableVertexAttribArray(color)
+            color = glGetAttribLocation(self.shaderProgram, "texCoords")
+            glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(12))
+            glEnableVertexAttribArray(color)
 
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
-        glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
-        glEnableVertexAttribArray(normal)
+            normal = glGetAttribLocation(self.shaderProgram, "normal")
+            glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
+            glEnableVertexAttribArray(normal)
 
         # Unbinding current vao
         glBindVertexArray(0)
@@ -737,18 +807,75 @@ class SimpleTexturePhongShaderProgram:
     def drawCall(self, gpuShape, mode=GL_TRIANGLES):
         assert isinstance(gpuShape, GPUShape)
 
+        # Members of the uniform blocks set since the last draw are sent in one call per block
+        self.uploadBlocks()
+
         # Binding the VAO and executing the draw call
         glBindVertexArray(gpuShape.vao)
         glBindTexture(GL_TEXTURE_2D, gpuShape.texture)
 
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        glDrawElements(mode, gpuShape.size, gpuShape.indexType, None)
+
+        # Unbind the current VAO
+        glBindVertexArray(0)
+
+
+# Instanced versions of the textured lighting shaders: the model matrix is a per instance
+# vertex attribute instead of a uniform, so many copies of a shape are drawn in a single call.
+# They compile the shaders of the non instanced versions, with model declared as an attribute.
+def _instancedVertexShader(vertexShader):
+    assert "uniform mat4 model;" in vertexShader
+    return vertexShader.replace("uniform mat4 model;", "in mat4 model;")
+
+
+class _InstancedModel:
+    """Mixed in before a non instanced pipeline: its VAOs also read the model matrix of each instance."""
+
+    def setupVAO(self, gpuShape):
+        super().setupVAO(gpuShape)
+        glBindVertexArray(gpuShape.vao)
+
+        # One model matrix per instance, a mat4 attribute uses 4 consecutive locations, one per column
+        glBindBuffer(GL_ARRAY_BUFFER, gpuShape.instanceVbo)
+        model = glGetAttribLocation(self.shaderProgram, "model")
+        for column in range(4):
+            glVertexAttribPointer(model + column, 4, GL_FLOAT, GL_FALSE, 64, ctypes.c_void_p(16 * column))
+            glEnableVertexAttribArray(model + column)
+            glVertexAttribDivisor(model + column, 1)
+
+        # Unbinding current vao
+        glBindVertexArray(0)
+
+    def drawCall(self, gpuShape, mode=GL_TRIANGLES):
+        assert isinstance(gpuShape, InstancedGPUShape)
+
+        # Members of the uniform blocks set since the last draw are sent in one call per block
+        self.uploadBlocks()
+
+        # Binding the VAO and executing a single draw call for all the instances
+        glBindVertexArray(gpuShape.vao)
+        glBindTexture(GL_TEXTURE_2D, gpuShape.texture)
+
+        glDrawElementsInstanced(mode, gpuShape.size, gpuShape.indexType, None, gpuShape.instanceCount)
 
         # Unbind the current VAO
         glBindVertexArray(0)
 
 
+class InstancedTextureFlatShaderProgram(_InstancedModel, SimpleTextureFlatShaderProgram):
+    vertexShader = _instancedVertexShader(SimpleTextureFlatShaderProgram.vertexShader)
+
+
+class InstancedTextureGouraudShaderProgram(_InstancedModel, SimpleTextureGouraudShaderProgram):
+    vertexShader = _instancedVertexShader(SimpleTextureGouraudShaderProgram.vertexShader)
+
+
+class InstancedTexturePhongShaderProgram(_InstancedModel, SimpleTexturePhongShaderProgram):
+    vertexShader = _instancedVertexShader(SimpleTexturePhongShaderProgram.vertexShader)
+
+
 # TAREA4: Se crea este nuevo shader para usar múltiples luces con texturas
-class MultipleLightTexturePhongShaderProgram:
+class MultipleLightTexturePhongShaderProgram(ShaderProgram):
 
     def __init__(self):
         # TAREA4: Ahora los shaders están en archivos de texto independientes, se leen aquí
@@ -762,28 +889,34 @@ class MultipleLightTexturePhongShaderProgram:
         VAO = glGenVertexArrays(1)
         glBindVertexArray(VAO)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.shaderProgram = pc.compileProgram(
+            (vertex_shader, GL_VERTEX_SHADER),
+            (fragment_shader, GL_FRAGMENT_SHADER))
+        self.cacheUniforms()
 
     def setupVAO(self, gpuShape):
+        gpuShape.stride = 8
         glBindVertexArray(gpuShape.vao)
 
         glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
-        # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
-        glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(0))
-        glEnableVertexAttribArray(position)
+        if gpuShape.vertexFormat is not None:
+            # Compact vertices, see gpu_shape.VertexFormat
+            gpuShape.vertexFormat.setupAttributes(self.shaderProgram)
+        else:
+            # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
+            position = glGetAttribLocation(self.shaderProgram, "position")
+            glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(0))
+            glEnableVertexAttribArray(position)
 
-        color = glGetAttribLocation(self.shaderProgram, "texCoords")
-        glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(12))
-        glEnableVertexAttribArray(color)
+            color = glGetAttribLocation(self.shaderProgram, "texCoords")
+            glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(12))
+            glEnableVertexAttribArray(color)
 
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
-        glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
-        glEnableVertexAttribArray(normal)
+            normal = glGetAttribLocation(self.shaderProgram, "normal")
+            glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
+            glEnableVertexAttribArray(normal)
 
         # Unbinding current vao
         glBindVertexArray(0)
@@ -795,14 +928,56 @@ class MultipleLightTexturePhongShaderProgram:
         glBindVertexArray(gpuShape.vao)
         glBindTexture(GL_TEXTURE_2D, gpuShape.texture)
 
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        glDrawElements(mode, gpuShape.size, gpuShape.indexType, None)
 
         # Unbind the current VAO
         glBindVertexArray(0)
 
 
+class ClusteredLightTexturePhongShaderProgram(MultipleLightTexturePhongShaderProgram):
+    """
+    Many lights version of MultipleLightTexturePhongShaderProgram. Lights are not uniforms, they are binned
+    into view space clusters by a grafica.light_clusters.LightClusters, and each fragment only evaluates
+    the lights of its cluster.
+    """
+
+    def __init__(self):
+        with open(getAssetPath('multiple_lights_textures.vs'), 'r') as f:
+            vertex_shader = f.readlines()
+
+        with open(getAssetPath('multiple_lights_textures_clustered.fs'), 'r') as f:
+            fragment_shader = f.readlines()
+
+        # Binding artificial vertex array object for validation
+        VAO = glGenVertexArrays(1)
+        glBindVertexArray(VAO)
+
+        # Every sampler starts at texture unit 0, the program is validated once they are given their units
+        self.shaderProgram = pc.compileProgram(
+            (vertex_shader, GL_VERTEX_SHADER),
+            (fragment_shader, GL_FRAGMENT_SHADER),
+            validate=False)
+        self.cacheUniforms()
+
+        # The light tables are always read from the same texture units
+        glUseProgram(self.shaderProgram)
+        self.setUniform("lights", lc.LIGHTS_UNIT)
+        self.setUniform("clusters", lc.CLUSTERS_UNIT)
+        self.setUniform("lightIndices", lc.INDICES_UNIT)
+        self.shaderProgram.check_validate()
+
+    def setLightClusters(self, lightClusters):
+        """Sends the grid and ambient light of lightClusters and binds its light tables.
+        This program must be in use, and lightClusters updated with the view and projection of this frame."""
+        self.setUniform("clusterGrid", lightClusters.grid)
+        self.setUniform("clusterNear", lightClusters.near)
+        self.setUniform("clusterFar", lightClusters.far)
+        self.setUniform("ambient", lightClusters.ambient)
+        lightClusters.bind()
+
+
 # TAREA4: Se crea este shader para soportar geometría con color y múltiples luces
-class MultipleLightPhongShaderProgram:
+class MultipleLightPhongShaderProgram(ShaderProgram):
 
     def __init__(self):
         # TAREA4: Ahora los shaders están en archivos de texto independientes, aquí los leemos
@@ -816,11 +991,13 @@ class MultipleLightPhongShaderProgram:
         VAO = glGenVertexArrays(1)
         glBindVertexArray(VAO)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.shaderProgram = pc.compileProgram(
+            (vertex_shader, GL_VERTEX_SHADER),
+            (fragment_shader, GL_FRAGMENT_SHADER))
+        self.cacheUniforms()
 
     def setupVAO(self, gpuShape):
+        gpuShape.stride = 9
         glBindVertexArray(gpuShape.vao)
 
         glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
@@ -847,7 +1024,7 @@ class MultipleLightPhongShaderProgram:
 
         # Binding the VAO and executing the draw call
         glBindVertexArray(gpuShape.vao)
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        glDrawElements(mode, gpuShape.size, gpuShape.indexType, None)
 
         # Unbind the current VAO
         glBindVertexArray(0)
@@ -0,0 +1,199 @@
+# coding=utf-8
+"""
+Shader program cache. Programs are identified by a hash of their sources and the OpenGL driver, so:
+- Creating the same program again in this process returns the program already linked,
+  pipelines with the same sources share it, and so the values of its uniforms.
+- Linked programs are saved as driver binaries (glGetProgramBinary) in the assets cache, the following
+  launches load them with glProgramBinary, compiling the sources again only when the driver rejects them.
+"""
+
+__all__ = ['clearPrograms', 'compileProgram', 'ProgramCacheStats', 'stats']
+
+from OpenGL.GL import *
+import OpenGL.GL.shaders
+import ctypes
+import hashlib
+import logging
+import os
+import os.path
+import struct
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from grafica.assets_path import getCachePath
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+MAGIC = b"GPROG001"
+
+logger = logging.getLogger(__name__)
+
+
+class ProgramCacheStats:
+    """Counters of the programs created in this process, and the time the cache saved."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # Programs compiled from source, loaded from a binary or already linked in this process,
+        # the time spent building them and the time compiling them would have taken
+        self.compiled = 0
+        self.loaded = 0
+        self.shared = 0
+        self.time = 0.0
+        self.compileTime = 0.0
+
+    def saved(self):
+        return self.compileTime - self.time
+
+    def __str__(self):
+        return "compiled=" + str(self.compiled) + \
+               "  loaded=" + str(self.loaded) + \
+               "  shared=" + str(self.shared) + \
+               "  time=" + "{:.1f}".format(self.time * 1000) + " ms" + \
+               "  saved=" + "{:.1f}".format(self.saved() * 1000) + " ms"
+
+
+stats = ProgramCacheStats()
+
+# Programs linked in this process, with the time compiling each one took
+_programs = {}
+
+
+def _driver():
+    return " | ".join(glGetString(name).decode() for name in [GL_VENDOR, GL_RENDERER, GL_VERSION])
+
+
+def _programKey(shaders, validate):
+    sha1 = hashlib.sha1(_driver().encode())
+    sha1.update(repr(validate).encode())
+    for source, shaderType in shaders:
+        sha1.update(struct.pack("<IQ", int(shaderType), len(source)))
+        sha1.update(source.encode())
+    return sha1.hexdigest()
+
+
+def _cacheFilename(key):
+    return getCachePath("program." + key[:16] + ".bin")
+
+
+def _binaryFormatsSupported():
+    return glGetIntegerv(GL_NUM_PROGRAM_BINARY_FORMATS) > 0
+
+
+def _readBinary(cacheFilename, key):
+    # Header: magic, key, binary format, compile time of the program and binary size
+    with open(cacheFilename, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC or file.read(40).decode() != key:
+            return None
+        binaryFormat, compileTime, size = struct.unpack("<IdQ", file.read(20))
+        binary = file.read(size)
+    if len(binary) != size:
+        return None
+    return binaryFormat, compileTime, binary
+
+
+def _writeBinary(cacheFilename, key, program, compileTime):
+    size = glGetProgramiv(program, GL_PROGRAM_BINARY_LENGTH)
+    if size <= 0:
+        return
+
+    binary = (ctypes.c_ubyte * size)()
+    length = GLsizei()
+    binaryFormat = GLenum()
+    glGetProgramBinary(program, size, ctypes.byref(length), ctypes.byref(binaryFormat), binary)
+
+    os.makedirs(os.path.dirname(cacheFilename), exist_ok=True)
+    temporaryFilename = cacheFilename + "." + str(os.getpid()) + ".tmp"
+    with open(temporaryFilename, 'wb') as file:
+        file.write(MAGIC)
+        file.write(key.encode())
+        file.write(struct.pack("<IdQ", binaryFormat.value, compileTime, length.value))
+        file.write(bytes(binary)[:length.value])
+    os.replace(temporaryFilename, cacheFilename)
+
+
+def _loadBinary(binaryFormat, binary):
+    program = glCreateProgram()
+    glProgramBinary(program, binaryFormat, binary, len(binary))
+
+    # Binaries from another driver version, or corrupted ones, are rejected here
+    if glGetProgramiv(program, GL_LINK_STATUS) != GL_TRUE:
+        glDeleteProgram(program)
+        return None
+    return OpenGL.GL.shaders.ShaderProgram(program)
+
+
+def _compile(shaders, validate):
+    return OpenGL.GL.shaders.compileProgram(
+        *[OpenGL.GL.shaders.compileShader(source, shaderType) for source, shaderType in shaders],
+        validate=validate, retrievable=True)
+
+
+def compileProgram(*shaders, validate=True):
+    """
+    Linked program for the given (source, shader type) pairs, as OpenGL.GL.shaders.compileProgram
+    over compileShader(source, shader type). Sources are strings or lists of lines.
+    validate=False leaves the validation to the caller, when samplers must be assigned first.
+    """
+    t0 = time.perf_counter()
+    shaders = [("".join(source) if not isinstance(source, str) else source, shaderType)
+               for source, shaderType in shaders]
+    key = _programKey(shaders, validate)
+
+    if key in _programs:
+        program, compileTime = _programs[key]
+        stats.shared += 1
+        stats.time += time.perf_counter() - t0
+        stats.compileTime += compileTime
+        return program
+
+    cacheFilename = _cacheFilename(key)
+    program = None
+    if _binaryFormatsSupported():
+        try:
+            cached = _readBinary(cacheFilename, key)
+        except (OSError, ValueError, UnicodeDecodeError, struct.error):
+            cached = None
+
+        if cached is not None:
+            binaryFormat, compileTime, binary = cached
+            program = _loadBinary(binaryFormat, binary)
+            if program is not None and validate:
+                program.check_validate()
+            if program is None:
+                logger.info("Program binary %s rejected by the driver, compiling it again", cacheFilename)
+
+    if program is not None:
+        elapsed = time.perf_counter() - t0
+        stats.loaded += 1
+        logger.debug("Program %s loaded in %.1f ms, compiling it took %.1f ms",
+                     key[:16], elapsed * 1000, compileTime * 1000)
+    else:
+        program = _compile(shaders, validate)
+        elapsed = compileTime = time.perf_counter() - t0
+        stats.compiled += 1
+        logger.debug("Program %s compiled in %.1f ms", key[:16], elapsed * 1000)
+
+        if _binaryFormatsSupported():
+            try:
+                _writeBinary(cacheFilename, key, program, compileTime)
+            except OSError:
+                # The cache is an optimization, a read-only location should not prevent running
+                pass
+
+    stats.time += elapsed
+    stats.compileTime += compileTime
+    logger.info("Shader programs: %s", stats)
+
+    _programs[key] = (program, compileTime)
+    return program
+
+
+def clearPrograms():
+    """Forgets the programs linked in this process, as they belong to the OpenGL context which is being destroyed.
+    Cached binaries are kept, clear them with grafica.assets_cache.clearCache."""
+    _programs.clear()
@@ -4,21 +4,35 @@ A simple scene graph class and functionality.
 """
 
 __all__ = [
+    'bakeSceneGraphNode',
+    'collectLeaves',
+    'CompiledSceneGraph',
+    'CullingStats',
+    'drawInstancedShapes',
     'drawSceneGraphNode',
+    'drawSceneGraphNodeCulled',
     'findNode',
     'findPosition',
     'findTransform',
-    'SceneGraphNode'
+    'instanceSceneGraphNode',
+    'SceneGraph',
+    'SceneGraphNode',
+    'updateWorldBounds'
 ]
 
 from OpenGL.GL import *
 import numpy as np
 import grafica.transformations as tr
 import grafica.gpu_shape as gs
+import grafica.basic_shapes as bs
+import grafica.texture_cache as tc
 
 __author__ = "Daniel Calderon"
 __license__ = "MIT"
 
+# Updates whose refreshed leaves CompiledSceneGraph keeps, see changedLeaves
+MAX_LEAF_CHANGES = 64
+
 
 class SceneGraphNode:
     """
@@ -33,6 +47,11 @@ class SceneGraphNode:
         self.transform = tr.identity()
         self.childs = []
 
+        # World space bounding box of everything below this node, and those of its childs
+        # as a (len(childs), 2, 3) array, see updateWorldBounds
+        self.worldAABB = None
+        self.childsWorldAABB = None
+
     def clear(self):
         """Freeing GPU memory"""
 
@@ -40,6 +59,247 @@ class SceneGraphNode:
             child.clear()
 
 
+def _concatenateRanges(starts, ends):
+    # np.arange(start, end) of each pair, concatenated
+    lengths = ends - starts
+    offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return np.arange(lengths.sum()) + offsets
+
+
+class CompiledSceneGraph:
+    """
+    A flattened version of a SceneGraphNode tree, to draw static (or mostly static) scenes.
+    Nodes are stored in depth first order, so the subtree of a node is a contiguous range of them,
+    their world transforms are kept in a single (N, 4, 4) array, and the leaves are a flat list.
+    World transforms are only recomputed for the subtrees marked with markDirty, visiting only their ranges.
+    Each update logs the leaves it refreshed, see changedLeaves.
+    Changes to the structure of the tree (adding or removing childs) require compiling it again.
+    """
+
+    def __init__(self, root):
+        assert (isinstance(root, SceneGraphNode))
+
+        self.nodes = []
+        parents = []
+        depths = []
+        self.subtreeEnds = []
+        self.leaves = []
+
+        # A node may appear in several places of the tree, each one has its own world transform
+        self.indices = {}
+
+        def flatten(node, parent, depth):
+            index = len(self.nodes)
+            self.nodes += [node]
+            parents.append(parent)
+            depths.append(depth)
+            self.subtreeEnds.append(None)
+            self.indices.setdefault(id(node), []).append(index)
+
+            for child in node.childs:
+                if isinstance(child, gs.GPUShape):
+                    self.leaves += [(index, child)]
+                else:
+                    flatten(child, index, depth + 1)
+
+            self.subtreeEnds[index] = len(self.nodes)
+
+        flatten(root, -1, 0)
+
+        self.parents = np.array(parents, dtype=np.int64)
+        self.depths = np.array(depths, dtype=np.int64)
+        self.subtreeEnds = np.array(self.subtreeEnds, dtype=np.int64)
+        self.maxDepth = int(self.depths.max())
+
+        # Transforms are composed in double precision, as drawSceneGraphNode does, while the world
+        # transforms of the leaves are also kept as one contiguous float32 array, ready to be sent
+        self.localTransforms = np.array([node.transform for node in self.nodes], dtype=np.float64)
+        self.worldTransforms = np.empty_like(self.localTransforms)
+        self.leafIndices = np.array([index for index, _ in self.leaves], dtype=np.int64)
+        self.leafTransforms = np.empty((len(self.leaves), 4, 4), dtype=np.float32)
+
+        # Leaves sorted by the index of their node, so the leaves of a subtree are found with a binary search
+        self.leafOrder = np.argsort(self.leafIndices, kind='stable')
+        self.sortedLeafIndices = self.leafIndices[self.leafOrder]
+
+        # Roots of the subtrees marked since the last update, and the leaves refreshed by the last updates
+        self.dirtyRoots = [0]
+        self.leafChanges = []
+        self.updates = 0
+        self.update()
+
+    def markDirty(self, node):
+        """Flags node after its transform changed, its whole subtree is recomputed on the next update."""
+        for index in self.indices[id(node)]:
+            self.localTransforms[index] = node.transform
+            self.dirtyRoots.append(index)
+
+    def _dirtyRanges(self):
+        # Starts and ends of the dirty subtrees in increasing order, without the ones inside another
+        starts = np.unique(np.array(self.dirtyRoots, dtype=np.int64))
+        ends = self.subtreeEnds[starts]
+        inside = np.zeros(len(starts), dtype=bool)
+        inside[1:] = starts[1:] < np.maximum.accumulate(ends)[:-1]
+        return starts[~inside], ends[~inside]
+
+    def update(self):
+        """Recomputes the world transforms of the dirty subtrees, one tree level at a time.
+        Only the nodes and leaves inside those subtrees are visited."""
+        if len(self.dirtyRoots) == 0:
+            return
+
+        starts, ends = self._dirtyRanges()
+        self.dirtyRoots = []
+
+        # Nodes of every range, by depth: parents are computed before their childs,
+        # and the parents of the roots of the ranges are not dirty
+        indices = _concatenateRanges(starts, ends)
+        indices = indices[np.argsort(self.depths[indices], kind='stable')]
+        levels = np.split(indices, np.flatnonzero(np.diff(self.depths[indices])) + 1)
+        for level in levels:
+            if self.parents[level[0]] < 0:
+                self.worldTransforms[level] = self.localTransforms[level]
+            else:
+                self.worldTransforms[level] = np.matmul(
+                    self.worldTransforms[self.parents[level]], self.localTransforms[level])
+
+        leaves = self.leafOrder[_concatenateRanges(np.searchsorted(self.sortedLeafIndices, starts),
+                                                   np.searchsorted(self.sortedLeafIndices, ends))]
+        self.leafTransforms[leaves] = self.worldTransforms[self.leafIndices[leaves]]
+
+        self.leafChanges = self.leafChanges[-(MAX_LEAF_CHANGES - 1):] + [leaves]
+        self.updates += 1
+
+    def changedLeaves(self, since):
+        """
+        Leaves (indices into leaves) refreshed by the updates after the update number since,
+        and the current update number, to pass as since next time. The leaves are None when
+        the log no longer holds those updates, then any leaf may have changed.
+        """
+        self.update()
+        first = self.updates - len(self.leafChanges)
+        if since < first:
+            return None, self.updates
+
+        changes = self.leafChanges[since - first:]
+        leaves = np.unique(np.concatenate(changes)) if len(changes) > 0 else np.empty(0, dtype=np.int64)
+        return leaves, self.updates
+
+    def getWorldTransform(self, node):
+        """World transform of the first occurrence of node, a copy of the cached one."""
+        self.update()
+        return np.copy(self.worldTransforms[self.indices[id(node)][0]])
+
+    def draw(self, pipeline, transformName, mode=GL_TRIANGLES):
+        """Draws every leaf, as drawSceneGraphNode does with the original tree."""
+        self.update()
+
+        location = pipeline.uniformLocation(transformName)
+        for transform, (_, leaf) in zip(self.leafTransforms, self.leaves):
+            glUniformMatrix4fv(location, 1, GL_TRUE, transform)
+            pipeline.drawCall(leaf, mode)
+
+
+class SceneGraph:
+    """
+    Wrapper of a SceneGraphNode tree with a name index and cached world transforms,
+    so findNode is a dictionary lookup and findTransform only multiplies the matrices changed since the last query.
+    Transforms must be changed with setTransform, or followed by markDirty. After adding or removing childs
+    directly, call reindex. As with findNode, a name or node appearing several times refers to its first
+    occurrence in depth first order.
+    """
+
+    def __init__(self, root):
+        assert (isinstance(root, SceneGraphNode))
+
+        self.root = root
+        self.reindex()
+
+    def reindex(self):
+        """Rebuilds the name index and the parent map, every world transform is computed again."""
+        self.nodes = {}
+        self.parents = {}
+        self.worldTransforms = {}
+        self.dirty = {}
+
+        def index(node, parent):
+            if id(node) in self.parents:
+                return
+
+            self.nodes.setdefault(node.name, node)
+            self.parents[id(node)] = parent
+            self.dirty[id(node)] = True
+
+            for child in node.childs:
+                if isinstance(child, SceneGraphNode):
+                    index(child, node)
+
+        index(self.root, None)
+
+    def addChild(self, parent, child):
+        """Appends child to the childs of parent (a node or its name), indexing its subtree."""
+        parent = self.findNode(parent) if isinstance(parent, str) else parent
+        parent.childs += [child]
+        self.reindex()
+
+    def removeChild(self, parent, child):
+        """Removes child from the childs of parent (a node or its name)."""
+        parent = self.findNode(parent) if isinstance(parent, str) else parent
+        parent.childs.remove(child)
+        self.reindex()
+
+    def markDirty(self, node):
+        """Flags node after its transform changed, the world transforms of its subtree are computed on demand."""
+        # A dirty node only has dirty nodes below it, so those subtrees are skipped
+        if self.dirty[id(node)]:
+            return
+
+        self.dirty[id(node)] = True
+        for child in node.childs:
+            if isinstance(child, SceneGraphNode):
+                self.markDirty(child)
+
+    def setTransform(self, name, transform):
+        node = self.findNode(name)
+        node.transform = transform
+        self.markDirty(node)
+
+    def findNode(self, name):
+        return self.nodes.get(name)
+
+    def _worldTransform(self, node):
+        # Going up to the first ancestor with a valid world transform, then composing down from it
+        path = []
+        while node is not None and self.dirty[id(node)]:
+            path += [node]
+            node = self.parents[id(node)]
+
+        transform = tr.identity() if node is None else self.worldTransforms[id(node)]
+        for pathNode in reversed(path):
+            transform = np.matmul(transform, pathNode.transform)
+            self.worldTransforms[id(pathNode)] = transform
+            self.dirty[id(pathNode)] = False
+
+        return transform
+
+    def findTransform(self, name):
+        # A copy, writing into the cached world transform would corrupt it
+        node = self.findNode(name)
+        return None if node is None else np.copy(self._worldTransform(node))
+
+    def findPosition(self, name):
+        foundTransform = self.findTransform(name)
+
+        if isinstance(foundTransform, (np.ndarray, np.generic)):
+            zero = np.array([[0, 0, 0, 1]], dtype=np.float32).T
+            return np.matmul(foundTransform, zero)
+
+        return None
+
+    def draw(self, pipeline, transformName):
+        drawSceneGraphNode(self.root, pipeline, transformName)
+
+
 def findNode(node, name):
     # The name was not found in this path
     if isinstance(node, gs.GPUShape):
@@ -101,7 +361,7 @@ def drawSceneGraphNode(node, pipeline, transformName, parentTransform=tr.identit
     # Hence, it can be drawn with drawCall
     if len(node.childs) == 1 and isinstance(node.childs[0], gs.GPUShape):
         leaf = node.childs[0]
-        glUniformMatrix4fv(glGetUniformLocation(pipeline.shaderProgram, transformName), 1, GL_TRUE, newTransform)
+        glUniformMatrix4fv(pipeline.uniformLocation(transformName), 1, GL_TRUE, newTransform)
         pipeline.drawCall(leaf)
 
     # If the child node is not a leaf, it MUST be a SceneGraphNode,
@@ -109,3 +369,233 @@ def drawSceneGraphNode(node, pipeline, transformName, parentTransform=tr.identit
     else:
         for child in node.childs:
             drawSceneGraphNode(child, pipeline, transformName, newTransform)
+
+
+# Bounding box of shapes whose bounds are unknown, they are never culled
+UNBOUNDED_AABB = np.array([[-1e30, -1e30, -1e30], [1e30, 1e30, 1e30]])
+
+
+def _transformAABB(transform, aabb):
+    # The box is transformed as a center and the extents, which grow by the absolute values of the rotation
+    center = (aabb[0] + aabb[1]) * 0.5
+    extents = (aabb[1] - aabb[0]) * 0.5
+    newCenter = np.matmul(transform[0:3, 0:3], center) + transform[0:3, 3]
+    newExtents = np.matmul(np.abs(transform[0:3, 0:3]), extents)
+    return np.array([newCenter - newExtents, newCenter + newExtents])
+
+
+def updateWorldBounds(node, parentTransform=tr.identity()):
+    """
+    Computes worldAABB for node and every node below it, from the bounding boxes of the GPUShapes.
+    It must be called again after changing transforms. If a node appears in several places of the
+    tree, its box encloses all of them. Returns the bounding box of node, None if it has no shapes.
+    """
+    _resetWorldBounds(node)
+    return _propagateWorldBounds(node, parentTransform)
+
+
+def _resetWorldBounds(node):
+    node.worldAABB = None
+    node.childsWorldAABB = None
+    for child in node.childs:
+        if isinstance(child, SceneGraphNode):
+            _resetWorldBounds(child)
+
+
+def _propagateWorldBounds(node, parentTransform):
+    newTransform = np.matmul(parentTransform, node.transform).astype(np.float64)
+
+    boxes = []
+    for child in node.childs:
+        if isinstance(child, gs.GPUShape):
+            boxes += [UNBOUNDED_AABB if child.aabb is None else _transformAABB(newTransform, child.aabb)]
+        else:
+            childBox = _propagateWorldBounds(child, newTransform)
+            boxes += [UNBOUNDED_AABB if childBox is None else childBox]
+
+    # Childs without shapes do not count for the box of this node, but they are never culled
+    bounded = [box for child, box in zip(node.childs, boxes)
+               if isinstance(child, gs.GPUShape) or child.worldAABB is not None]
+    if node.worldAABB is not None:
+        bounded += [node.worldAABB]
+
+    if len(bounded) > 0:
+        bounded = np.array(bounded)
+        node.worldAABB = np.array([bounded[:, 0].min(axis=0), bounded[:, 1].max(axis=0)])
+
+    if len(boxes) > 0:
+        childsBoxes = np.array(boxes)
+        if node.childsWorldAABB is not None:
+            childsBoxes = np.concatenate([np.minimum(node.childsWorldAABB[:, 0:1], childsBoxes[:, 0:1]),
+                                          np.maximum(node.childsWorldAABB[:, 1:2], childsBoxes[:, 1:2])], axis=1)
+        node.childsWorldAABB = childsBoxes
+
+    return node.worldAABB
+
+
+class CullingStats:
+    """Counters of the last call to drawSceneGraphNodeCulled."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # Nodes whose box was tested against the frustum, subtrees skipped, and leaves drawn
+        self.tested = 0
+        self.culled = 0
+        self.drawn = 0
+
+    def __str__(self):
+        return "tested=" + str(self.tested) + \
+               "  culled=" + str(self.culled) + \
+               "  drawn=" + str(self.drawn)
+
+
+def drawSceneGraphNodeCulled(node, pipeline, transformName, viewProjection, stats=None,
+                             parentTransform=tr.identity()):
+    """
+    Same as drawSceneGraphNode, but subtrees whose worldAABB is outside the view frustum are skipped.
+    viewProjection is np.matmul(projection, view). Bounding boxes must be computed beforehand with
+    updateWorldBounds, and stats, a CullingStats, is reset and filled with the counters of this call.
+    """
+    if stats is None:
+        stats = CullingStats()
+    stats.reset()
+
+    planes = tr.frustumPlanes(viewProjection)
+    frustum = (planes[:, 0:3].T, planes[:, 3], np.abs(planes[:, 0:3]).T)
+    location = pipeline.uniformLocation(transformName)
+
+    test = True
+    if node.worldAABB is not None:
+        outside, partial = _testBoxes(node.worldAABB[np.newaxis], frustum)
+        stats.tested += 1
+        if outside[0]:
+            stats.culled += 1
+            return stats
+        test = partial[0]
+
+    _drawCulled(node, pipeline, location, frustum, stats, parentTransform, test)
+    return stats
+
+
+def _testBoxes(boxes, frustum):
+    # Boxes are outside if they are behind any plane, and partially inside if they cross any plane
+    normals, offsets, absNormals = frustum
+    centers = (boxes[:, 0] + boxes[:, 1]) * 0.5
+    extents = (boxes[:, 1] - boxes[:, 0]) * 0.5
+    distances = np.matmul(centers, normals) + offsets
+    radii = np.matmul(extents, absNormals)
+    return np.any(distances + radii < 0, axis=1), np.any(distances - radii < 0, axis=1)
+
+
+def _drawCulled(node, pipeline, location, frustum, stats, parentTransform, test):
+    assert (isinstance(node, SceneGraphNode))
+
+    newTransform = np.matmul(parentTransform, node.transform)
+
+    if len(node.childs) == 1 and isinstance(node.childs[0], gs.GPUShape):
+        glUniformMatrix4fv(location, 1, GL_TRUE, newTransform)
+        pipeline.drawCall(node.childs[0])
+        stats.drawn += 1
+        return
+
+    # All the childs are tested at once. Once a box is completely inside the frustum,
+    # its subtree does not need more tests
+    if test and node.childsWorldAABB is not None:
+        outside, partial = _testBoxes(node.childsWorldAABB, frustum)
+        stats.tested += len(outside)
+        stats.culled += int(np.count_nonzero(outside))
+    else:
+        outside = [False] * len(node.childs)
+        partial = [test] * len(node.childs)
+
+    for child, childOutside, childPartial in zip(node.childs, outside, partial):
+        if not childOutside:
+            _drawCulled(child, pipeline, location, frustum, stats, newTransform, bool(childPartial))
+
+
+def collectLeaves(node, parentTransform=tr.identity()):
+    """Returns a list with a (GPUShape, transform) pair for every leaf below node."""
+    newTransform = np.matmul(parentTransform, node.transform)
+    leaves = []
+
+    for child in node.childs:
+        if isinstance(child, gs.GPUShape):
+            leaves += [(child, newTransform)]
+        else:
+            leaves += collectLeaves(child, newTransform)
+
+    return leaves
+
+
+def bakeSceneGraphNode(node, pipeline, stride, normalOffset=None, usage=GL_STATIC_DRAW, vertexFormat=None):
+    """
+    Merges all the leaves of a static subtree into one GPUShape per texture.
+    Vertices are pre-transformed with the accumulated transform of their leaf, so the returned
+    node, with identity transform, replaces node in its parent and draws the same in fewer draw calls.
+    The VAOs are set up with pipeline, and stride is the number of floats per vertex.
+    Normals found at normalOffset are transformed with the inverse transpose of the model matrix,
+    as the Phong shaders do. Flat and Gouraud shaders use the normals as they are, so for them
+    normalOffset must be None.
+    Leaves must have been filled with GPUShape.fillBuffers, which keeps a copy of their data.
+    vertexFormat is the gpu_shape.VertexFormat of the baked shapes, None for floats.
+    """
+    assert (isinstance(node, SceneGraphNode))
+
+    # Leaves are grouped by texture, keeping the order in which they are found
+    groups = {}
+    for leaf, transform in collectLeaves(node):
+        assert leaf.vertexData is not None, "Only leaves filled with fillBuffers can be baked."
+        groups.setdefault(leaf.texture, []).append((leaf, transform))
+
+    bakedNode = SceneGraphNode(node.name + "_baked")
+
+    for i, (texture, leaves) in enumerate(groups.items()):
+        shapes = [bs.ArrayShape(leaf.vertexData, leaf.indexData, stride) for leaf, _ in leaves]
+        transforms = [transform for _, transform in leaves]
+        mergedShape = bs.mergeShapes(shapes, stride, transforms, normalOffset)
+
+        gpuShape = gs.GPUShape().initBuffers()
+        gpuShape.vertexFormat = vertexFormat
+        pipeline.setupVAO(gpuShape)
+        gpuShape.fillBuffers(mergedShape.vertices, mergedShape.indices, usage)
+        # The baked shape holds its own reference, leaves release theirs when they are cleared
+        gpuShape.texture = texture.retain() if isinstance(texture, tc.TextureHandle) else texture
+
+        groupNode = SceneGraphNode(node.name + "_baked_" + str(i))
+        groupNode.childs += [gpuShape]
+        bakedNode.childs += [groupNode]
+
+    return bakedNode
+
+
+def instanceSceneGraphNode(node, pipeline, usage=GL_STATIC_DRAW):
+    """
+    Groups the leaves below node by GPUShape and returns one InstancedGPUShape per group,
+    holding the accumulated model matrix of every occurrence of that GPUShape.
+    The VAOs are set up with pipeline, which must be one of the Instanced*ShaderProgram classes.
+    Unlike bakeSceneGraphNode, vertex data is not duplicated: each group is drawn with a single
+    instanced draw call over the original buffers. Call again (or fillInstances) if transforms change.
+    """
+    assert (isinstance(node, SceneGraphNode))
+
+    # Leaves are grouped by GPUShape identity, keeping the order in which they are found
+    groups = {}
+    for leaf, transform in collectLeaves(node):
+        groups.setdefault(id(leaf), (leaf, []))[1].append(transform)
+
+    instancedShapes = []
+    for leaf, transforms in groups.values():
+        instancedShape = gs.InstancedGPUShape(leaf).initBuffers()
+        instancedShape.fillInstances(np.array(transforms), usage)
+        pipeline.setupVAO(instancedShape)
+        instancedShapes += [instancedShape]
+
+    return instancedShapes
+
+
+def drawInstancedShapes(instancedShapes, pipeline, mode=GL_TRIANGLES):
+    """Draws a list of InstancedGPUShape, one draw call per shape."""
+    for instancedShape in instancedShapes:
+        pipeline.drawCall(instancedShape, mode)
@@ -0,0 +1,106 @@
+# coding=utf-8
+"""
+Base class for shader programs, caching the location and type of every active uniform.
+"""
+
+__all__ = ['ShaderProgram']
+
+from OpenGL.GL import *
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+
+def _uniformMatrix(function):
+    # Our matrices are row major, hence they are always sent transposed
+    return lambda location, value: function(location, 1, GL_TRUE, value)
+
+
+# How to send a value to a uniform, for each uniform type
+UNIFORM_SETTERS = {
+    GL_FLOAT: lambda location, value: glUniform1f(location, value),
+    GL_FLOAT_VEC2: lambda location, value: glUniform2f(location, *value),
+    GL_FLOAT_VEC3: lambda location, value: glUniform3f(location, *value),
+    GL_FLOAT_VEC4: lambda location, value: glUniform4f(location, *value),
+    GL_INT: lambda location, value: glUniform1i(location, value),
+    GL_INT_VEC2: lambda location, value: glUniform2i(location, *value),
+    GL_INT_VEC3: lambda location, value: glUniform3i(location, *value),
+    GL_INT_VEC4: lambda location, value: glUniform4i(location, *value),
+    GL_UNSIGNED_INT: lambda location, value: glUniform1ui(location, value),
+    GL_BOOL: lambda location, value: glUniform1i(location, value),
+    GL_FLOAT_MAT3: _uniformMatrix(glUniformMatrix3fv),
+    GL_FLOAT_MAT4: _uniformMatrix(glUniformMatrix4fv),
+}
+
+# Samplers take the texture unit, an int
+SAMPLER_TYPES = [
+    GL_SAMPLER_1D, GL_SAMPLER_2D, GL_SAMPLER_3D, GL_SAMPLER_CUBE, GL_SAMPLER_2D_ARRAY, GL_SAMPLER_2D_SHADOW,
+    GL_SAMPLER_BUFFER, GL_INT_SAMPLER_2D, GL_INT_SAMPLER_3D, GL_INT_SAMPLER_BUFFER,
+    GL_UNSIGNED_INT_SAMPLER_2D, GL_UNSIGNED_INT_SAMPLER_3D, GL_UNSIGNED_INT_SAMPLER_BUFFER,
+]
+for samplerType in SAMPLER_TYPES:
+    UNIFORM_SETTERS[samplerType] = lambda location, value: glUniform1i(location, value)
+
+
+class ShaderProgram:
+    """
+    Shader programs introspect their active uniforms once, right after linking,
+    so setting a uniform does not query its location to the driver on every call.
+    """
+
+    # Target where drawCall binds the texture of the shapes, used by grafica.draw_queue
+    textureTarget = GL_TEXTURE_2D
+
+    def cacheUniforms(self):
+        """Stores the location and type of every active uniform of self.shaderProgram."""
+        self.uniforms = {}
+        self.blocks = {}
+
+        for index in range(glGetProgramiv(self.shaderProgram, GL_ACTIVE_UNIFORMS)):
+            name, size, uniformType = glGetActiveUniform(self.shaderProgram, index)
+            name = name.decode() if isinstance(name, bytes) else name
+
+            # Members of uniform blocks have no location
+            location = glGetUniformLocation(self.shaderProgram, name)
+            if location == -1:
+                continue
+
+            # Arrays are reported as "name[0]", each element has its own location
+            if name.endswith("[0]"):
+                name = name[:-3]
+                for element in range(size):
+                    elementName = name + "[" + str(element) + "]"
+                    self.uniforms[elementName] = (glGetUniformLocation(self.shaderProgram, elementName), uniformType)
+
+            self.uniforms[name] = (location, uniformType)
+
+    def bindUniformBlocks(self, *blocks):
+        """Connects the uniform blocks (grafica.uniform_blocks) declared by this program to their binding points.
+        setUniform writes the members of those blocks into the block buffers."""
+        self.blocks = {}
+        for block in blocks:
+            if block.bindProgram(self.shaderProgram):
+                for name in block.fields:
+                    self.blocks[name] = block
+
+    def uniformLocation(self, name):
+        """Cached location of the uniform name, -1 if it is not an active uniform, as glGetUniformLocation."""
+        return self.uniforms.get(name, (-1, None))[0]
+
+    def uploadBlocks(self):
+        """Sends the uniform blocks of this program changed by setUniform, one call per block."""
+        for block in self.blocks.values():
+            block.upload()
+
+    def setUniform(self, name, value):
+        """Sends value to the uniform name, using its cached location and type.
+        As with OpenGL, setting a uniform which is not active (or optimized away) does nothing.
+        Members of uniform blocks are written into the CPU side copy of the block, shared by every program
+        using it, and sent by uploadBlocks before the next draw."""
+        location, uniformType = self.uniforms.get(name, (-1, None))
+        if location == -1:
+            block = self.blocks.get(name)
+            if block is not None:
+                block.set(name, value)
+            return
+        UNIFORM_SETTERS[uniformType](location, value)
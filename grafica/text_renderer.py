@@ -14,11 +14,13 @@ __all__ = [
 ]
 
 from OpenGL.GL import *
-import OpenGL.GL.shaders
+import grafica.program_cache as pc
 import numpy as np
 import grafica.basic_shapes as bs
 import grafica.easy_shaders as es
+import grafica.transformations as tr
 import grafica.font8x8_basic as f88
+from grafica.shader_program import ShaderProgram
 
 __author__ = "Daniel Calderon"
 __license__ = "MIT"
@@ -96,19 +98,17 @@ def getCharacterShape(char):
 
 
 def textToShape(text, charWidth, charHeight):
-    shape = bs.Shape([], [])
+    charShapes = [getCharacterShape(char) for char in text]
 
-    for i in range(len(text)):
-        char = text[i]
-        charShape = getCharacterShape(char)
-        bs.applyOffset(charShape, 6, [i, 0, 0])
-        bs.scaleVertices(charShape, 6, [charWidth, charHeight, 1])
-        bs.merge(shape, 6, charShape)
+    # Each character is moved to its place and then scaled, all of them are merged in a single pass
+    transforms = [np.matmul(tr.scale(charWidth, charHeight, 1), tr.translate(i, 0, 0)) for i in range(len(text))]
 
-    return shape
+    return bs.mergeShapes(charShapes, 6, transforms)
 
 
-class TextureTextRendererShaderProgram:
+class TextureTextRendererShaderProgram(ShaderProgram):
+
+    textureTarget = GL_TEXTURE_3D
 
     def __init__(self):
         vertex_shader = """
@@ -158,11 +158,13 @@ class TextureTextRendererShaderProgram:
         VAO = glGenVertexArrays(1)
         glBindVertexArray(VAO)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, GL_FRAGMENT_SHADER))
+        self.shaderProgram = pc.compileProgram(
+            (vertex_shader, GL_VERTEX_SHADER),
+            (fragment_shader, GL_FRAGMENT_SHADER))
+        self.cacheUniforms()
 
     def setupVAO(self, gpuShape):
+        gpuShape.stride = 6
         glBindVertexArray(gpuShape.vao)
 
         glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
@@ -186,7 +188,7 @@ class TextureTextRendererShaderProgram:
         # Binding the VAO and executing the draw call
         glBindVertexArray(gpuShape.vao)
         glBindTexture(GL_TEXTURE_3D, gpuShape.texture)
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        glDrawElements(mode, gpuShape.size, gpuShape.indexType, None)
 
         # Unbind the current VAO
         glBindVertexArray(0)
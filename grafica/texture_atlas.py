@@ -0,0 +1,212 @@
+# coding=utf-8
+"""
+Texture atlas. Many images are packed into one texture, and the texture coordinates of the shapes using them
+are rewritten to the region of their image, so shapes with different images share a texture:
+they are drawn without binding another texture, and bakeSceneGraphNode merges them into a single draw call.
+"""
+
+__all__ = ['AtlasStats', 'packShelves', 'packSkyline', 'TextureAtlas']
+
+from OpenGL.GL import *
+import os.path
+import time
+import numpy as np
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import grafica.basic_shapes as bs
+import grafica.texture_cache as tc
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+DEFAULT_PADDING = 4
+MAX_WIDTH = 4096
+
+
+def _packingOrder(sizes):
+    # Tallest first, and widest first among the same height
+    return np.lexsort((-sizes[:, 0], -sizes[:, 1]))
+
+
+def packShelves(sizes, width):
+    """
+    Shelf packing: rectangles are placed left to right in rows (shelves) as tall as their first rectangle.
+    sizes is a (n, 2) array of (width, height). Returns the (n, 2) array of (x, y) positions,
+    and the width and height used.
+    """
+    positions = np.zeros((len(sizes), 2), dtype=np.int64)
+    x = shelfY = shelfHeight = 0
+
+    for i in _packingOrder(sizes):
+        rectangleWidth, rectangleHeight = sizes[i]
+        if x + rectangleWidth > width:
+            shelfY += shelfHeight
+            x = shelfHeight = 0
+        positions[i] = (x, shelfY)
+        x += rectangleWidth
+        shelfHeight = max(shelfHeight, rectangleHeight)
+
+    return positions, int(np.max(positions[:, 0] + sizes[:, 0])), int(np.max(positions[:, 1] + sizes[:, 1]))
+
+
+def packSkyline(sizes, width):
+    """
+    Skyline packing: the top profile of the rectangles already placed is kept as a list of segments,
+    each rectangle goes to the lowest position where it fits, the leftmost one among equals.
+    Short rectangles fill the gaps left next to tall ones, which shelves waste, usually packing
+    a few images of varied sizes better. With many images, shelves are often as good.
+    Same arguments and results as packShelves.
+    """
+    positions = np.zeros((len(sizes), 2), dtype=np.int64)
+
+    # Segments [x, y, width] of the skyline, from left to right
+    skyline = [[0, 0, width]]
+
+    for i in _packingOrder(sizes):
+        rectangleWidth, rectangleHeight = sizes[i]
+        best = None
+
+        for start in range(len(skyline)):
+            x = skyline[start][0]
+            if x + rectangleWidth > width:
+                break
+
+            # The rectangle rests on the highest segment below it
+            y = 0
+            end = start
+            while skyline[end][0] < x + rectangleWidth:
+                y = max(y, skyline[end][1])
+                end += 1
+                if end == len(skyline):
+                    break
+
+            if best is None or y < best[1]:
+                best = (x, y, start, end)
+
+        x, y, start, end = best
+        positions[i] = (x, y)
+
+        # The segments below the rectangle are replaced by its top, keeping what sticks out on the right
+        last = skyline[end - 1]
+        right = last[0] + last[2] - (x + rectangleWidth)
+        newSegments = [[x, y + rectangleHeight, rectangleWidth]]
+        if right > 0:
+            newSegments += [[x + rectangleWidth, last[1], right]]
+        skyline[start:end] = newSegments
+
+        # Neighbour segments at the same height are merged
+        merged = [skyline[0]]
+        for segment in skyline[1:]:
+            if segment[1] == merged[-1][1]:
+                merged[-1] = [merged[-1][0], merged[-1][1], merged[-1][2] + segment[2]]
+            else:
+                merged += [segment]
+        skyline = merged
+
+    return positions, int(np.max(positions[:, 0] + sizes[:, 0])), int(np.max(positions[:, 1] + sizes[:, 1]))
+
+
+class AtlasStats:
+    """Packing results of a TextureAtlas."""
+
+    def __init__(self, images, width, height, efficiency, packTime, buildTime):
+        self.images = images
+        self.width = width
+        self.height = height
+        self.efficiency = efficiency
+        self.packTime = packTime
+        self.buildTime = buildTime
+
+    def __str__(self):
+        return "images=" + str(self.images) + \
+               "  size=" + str(self.width) + "x" + str(self.height) + \
+               "  efficiency=" + "{:.1f}".format(self.efficiency * 100) + "%" + \
+               "  pack=" + "{:.1f}".format(self.packTime * 1000) + " ms" + \
+               "  build=" + "{:.1f}".format(self.buildTime * 1000) + " ms"
+
+
+class TextureAtlas:
+    """
+    Packs the images imgNames into one image. Each image is surrounded by padding texels repeating its border,
+    so filtering at the edges of a region does not blend the neighbour images.
+    Padded images are placed at multiples of the largest power of two up to padding, and their mipmaps stop
+    at that level (maxLevel): deeper levels would average the texels of neighbour images.
+    Every packer (packSkyline, packShelves) is tried with every power of two width up to maxWidth,
+    keeping the atlas with the shortest longest side, and the smallest among those, as a long strip
+    would exceed the maximum texture size sooner. Efficiency is the fraction of the atlas covered by the images.
+    """
+
+    def __init__(self, imgNames, padding=DEFAULT_PADDING, packers=(packSkyline, packShelves), maxWidth=MAX_WIDTH):
+        t0 = time.perf_counter()
+        paths = [os.path.abspath(imgName) for imgName in imgNames]
+        images = [tc.readImage(path) for path in paths]
+
+        # RGB images get an opaque alpha when they share the atlas with RGBA ones
+        channels = max(image.shape[2] for image in images)
+        if channels == 4:
+            images = [image if image.shape[2] == 4 else
+                      np.concatenate([image, np.full(image.shape[0:2] + (1,), 255, dtype=np.uint8)], axis=2)
+                      for image in images]
+
+        # Sizes rounded up to the alignment keep every position aligned, as packers add them up
+        self.maxLevel = int(np.log2(padding)) if padding > 0 else 0
+        alignment = 1 << self.maxLevel
+        imageSizes = np.array([(image.shape[1], image.shape[0]) for image in images], dtype=np.int64)
+        sizes = (imageSizes + 2 * padding + alignment - 1) // alignment * alignment
+        if np.max(sizes[:, 0]) > maxWidth:
+            raise ValueError("An image is wider than the atlas, with maxWidth " + str(maxWidth) + ".")
+
+        t1 = time.perf_counter()
+        best = None
+        width = 1 << int(np.ceil(np.log2(np.max(sizes[:, 0]))))
+        widths = sorted({min(1 << i, maxWidth) for i in range(int(np.log2(width)), int(np.log2(maxWidth)) + 2)})
+        for packer in packers:
+            for width in widths:
+                positions, usedWidth, usedHeight = packer(sizes, width)
+                score = (max(usedWidth, usedHeight), usedWidth * usedHeight)
+                if best is None or score < best[0]:
+                    best = (score, positions, usedWidth, usedHeight)
+        _, positions, width, height = best
+        packTime = time.perf_counter() - t1
+
+        self.image = np.zeros((height, width, channels), dtype=np.uint8)
+        self.regions = {}
+        for path, image, (x, y), (imageWidth, imageHeight), (paddedWidth, paddedHeight) in \
+                zip(paths, images, positions, imageSizes, sizes):
+            self.image[y:y + paddedHeight, x:x + paddedWidth] = np.pad(
+                image, ((padding, paddedHeight - imageHeight - padding), (padding, paddedWidth - imageWidth - padding),
+                        (0, 0)), mode='edge')
+            x0, y0 = x + padding, y + padding
+            self.regions[path] = (x0 / width, y0 / height, (x0 + imageWidth) / width, (y0 + imageHeight) / height)
+
+        # Identifies the atlas in the TextureCache, as the path does for the images
+        self.name = "atlas:" + "|".join(paths) + ":" + str(padding)
+
+        efficiency = float(np.sum(imageSizes[:, 0] * imageSizes[:, 1])) / (width * height)
+        self.stats = AtlasStats(len(images), width, height, efficiency, packTime, time.perf_counter() - t0)
+
+    def remapShape(self, shape, imgName, stride, texCoordsOffset=3):
+        """
+        A copy of shape, an ArrayShape or Shape textured with imgName, with texture coordinates in the atlas.
+        Texture coordinates are found at texCoordsOffset of each vertex, and must be within [0, 1]:
+        repeating an image would sample its neighbours in the atlas.
+        """
+        shape = bs.toArrayShape(shape, stride)
+        u0, v0, u1, v1 = self.regions[os.path.abspath(imgName)]
+
+        vertexData = np.array(shape.vertexData, dtype=np.float32)
+        texCoords = vertexData[:, texCoordsOffset:texCoordsOffset + 2]
+        if texCoords.size > 0 and (np.min(texCoords) < 0.0 or np.max(texCoords) > 1.0):
+            raise ValueError("Texture coordinates out of [0, 1] can not be mapped to an atlas.")
+
+        texCoords *= np.array([u1 - u0, v1 - v0], dtype=np.float32)
+        texCoords += np.array([u0, v0], dtype=np.float32)
+        return bs.ArrayShape(vertexData, shape.indices, stride, shape.layout)
+
+    def texture(self, minFilterMode, maxFilterMode, anisotropy=1.0, cache=None):
+        """The atlas texture, one more reference to it in cache (the default one of textureSimpleSetup).
+        Filter presets fill the arguments: atlas.texture(*tc.TRILINEAR)."""
+        cache = tc.defaultCache() if cache is None else cache
+        return cache.acquireImage(self.name, self.image, GL_CLAMP_TO_EDGE, GL_CLAMP_TO_EDGE,
+                                  minFilterMode, maxFilterMode, anisotropy, self.maxLevel)
@@ -0,0 +1,418 @@
+# coding=utf-8
+"""
+Texture cache. Textures are identified by their image file and sampling parameters (wrap and filter modes),
+loading the same texture again returns the texture already on the GPU, with one more reference.
+Textures without references stay on the GPU, to be reused, until the textures on the GPU exceed
+the memory budget of the cache. Then, the least recently released ones are deleted first.
+Textures with a mipmap filter get their complete mipmap chain, see the filter presets TRILINEAR and ANISOTROPIC.
+Images are converted once to RGBA texels, or to S3TC compressed blocks, with their mipmaps, and kept
+in the assets cache: following launches map the texels and upload them without decoding the image again.
+"""
+
+__all__ = ['defaultCache', 'readImage', 'TextureCache', 'TextureCacheStats', 'TextureHandle']
+
+from OpenGL.GL import *
+from OpenGL.GL.EXT.texture_filter_anisotropic import GL_MAX_TEXTURE_MAX_ANISOTROPY_EXT, GL_TEXTURE_MAX_ANISOTROPY_EXT
+from OpenGL.GL.EXT.texture_compression_s3tc import GL_COMPRESSED_RGB_S3TC_DXT1_EXT, GL_COMPRESSED_RGBA_S3TC_DXT5_EXT
+import collections
+import os.path
+import numpy as np
+from PIL import Image
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import grafica.assets_cache as ac
+import grafica.texture_compression as tx
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+DEFAULT_BUDGET = 256 * 1024 * 1024
+
+# Image modes read, both are uploaded as RGBA, whose rows are always 4 bytes aligned
+IMAGE_MODES = ["RGB", "RGBA"]
+
+
+# Texel of the textures whose image is still being loaded, see grafica.texture_loader
+PLACEHOLDER_TEXEL = np.array([128, 128, 128, 255], dtype=np.uint8)
+
+# Filter presets, as the (minFilterMode, maxFilterMode, anisotropy) arguments of TextureCache.acquire:
+# es.textureSimpleSetup(imgName, GL_REPEAT, GL_REPEAT, *tc.TRILINEAR)
+NEAREST = (GL_NEAREST, GL_NEAREST, 1.0)
+BILINEAR = (GL_LINEAR, GL_LINEAR, 1.0)
+TRILINEAR = (GL_LINEAR_MIPMAP_LINEAR, GL_LINEAR, 1.0)
+ANISOTROPIC = (GL_LINEAR_MIPMAP_LINEAR, GL_LINEAR, 16.0)
+
+MIPMAP_FILTERS = [GL_NEAREST_MIPMAP_NEAREST, GL_LINEAR_MIPMAP_NEAREST,
+                  GL_NEAREST_MIPMAP_LINEAR, GL_LINEAR_MIPMAP_LINEAR]
+
+# Extensions of the driver and its maximum anisotropy, 1 without the extension. Queried when first needed
+_extensions = None
+_maxAnisotropy = None
+
+
+def _usesMipmaps(minFilterMode):
+    return int(minFilterMode) in MIPMAP_FILTERS
+
+
+def _getExtensions():
+    global _extensions
+    if _extensions is None:
+        _extensions = {glGetStringi(GL_EXTENSIONS, i).decode() for i in range(glGetIntegerv(GL_NUM_EXTENSIONS))}
+    return _extensions
+
+
+def _getMaxAnisotropy():
+    global _maxAnisotropy
+    if _maxAnisotropy is None:
+        supported = "GL_EXT_texture_filter_anisotropic" in _getExtensions() or \
+                    "GL_ARB_texture_filter_anisotropic" in _getExtensions()
+        _maxAnisotropy = float(glGetFloatv(GL_MAX_TEXTURE_MAX_ANISOTROPY_EXT)) if supported else 1.0
+    return _maxAnisotropy
+
+
+def _supportsCompression():
+    return "GL_EXT_texture_compression_s3tc" in _getExtensions()
+
+
+def _mipmapSizes(width, height):
+    """(width, height) of each level of a complete mipmap chain, from level 0 down to 1x1."""
+    sizes = [(width, height)]
+    while sizes[-1] != (1, 1):
+        width, height = sizes[-1]
+        sizes += [(max(1, width // 2), max(1, height // 2))]
+    return sizes
+
+
+def _boxMipmaps(img_data):
+    """Every level of the mipmap chain of img_data, each texel the average of a 2x2 box of the previous level.
+    Odd rows and columns are dropped, as OpenGL sizes halve rounding down."""
+    levels = {"level0": img_data}
+    level = img_data
+    for i, (width, height) in enumerate(_mipmapSizes(img_data.shape[1], img_data.shape[0])[1:]):
+        sums = level.astype(np.uint16)
+        sums = sums[0:2 * height:2] + sums[1:2 * height:2] if level.shape[0] > 1 else sums * 2
+        sums = sums[:, 0:2 * width:2] + sums[:, 1:2 * width:2] if level.shape[1] > 1 else sums * 2
+        level = ((sums + 2) // 4).astype(np.uint8)
+        levels["level" + str(i + 1)] = level
+    return levels
+
+
+def readImage(imgName):
+    """The texels of an RGB or RGBA image file, an uint8 (height, width, 3 or 4) array."""
+    image = Image.open(imgName)
+    img_data = np.array(image, np.uint8)
+
+    if image.mode not in IMAGE_MODES:
+        raise ValueError("Image mode " + image.mode + " of " + str(imgName) + " is not supported, expected one of "
+                         + ", ".join(IMAGE_MODES))
+    return img_data
+
+
+def _convertImage(img_data, mipmaps=False, compress=False):
+    """The texels of img_data as arrays: "size", its (width, height), "format", the OpenGL internal format,
+    and "level0" to "levelN". RGB images get an opaque alpha.
+    Compressed, images with an opaque alpha take BC1 blocks, the others BC3."""
+    if img_data.shape[2] == 3:
+        img_data = np.concatenate([img_data, np.full(img_data.shape[0:2] + (1,), 255, dtype=np.uint8)], axis=2)
+    levels = _boxMipmaps(img_data) if mipmaps else {"level0": img_data}
+
+    internalFormat = GL_RGBA8
+    if compress:
+        if np.all(img_data[..., 3] == 255):
+            internalFormat, compressLevel = GL_COMPRESSED_RGB_S3TC_DXT1_EXT, tx.compressBC1
+        else:
+            internalFormat, compressLevel = GL_COMPRESSED_RGBA_S3TC_DXT5_EXT, tx.compressBC3
+        levels = {name: compressLevel(level) for name, level in levels.items()}
+
+    return dict(size=np.array(img_data.shape[1::-1], dtype=np.int64),
+                format=np.array([internalFormat], dtype=np.int64), **levels)
+
+
+def _texels(arrays):
+    # Levels, their (width, height) and internal format, from the arrays of _convertImage
+    levels = [arrays["level" + str(i)] for i in range(len(arrays) - 2)]
+    width, height = (int(n) for n in arrays["size"])
+    return levels, _mipmapSizes(width, height)[0:len(levels)], int(arrays["format"][0])
+
+
+def _decodeImage(imgName, mipmaps=False, compress=False):
+    """Texels of imgName: its levels, their (width, height) and the OpenGL internal format to upload them.
+    The image is decoded and converted once, the texels are kept in the assets cache so following
+    launches map them instead. With mipmaps, the complete chain computed on the CPU.
+    It does not use OpenGL, so it may run in any thread."""
+    key = "Texels:" + ("bc" if compress else "rgba") + (":mipmaps" if mipmaps else "")
+    return _texels(ac.cachedArrays(imgName, key, lambda: _convertImage(readImage(imgName), mipmaps, compress)))
+
+
+def _createTexture(sWrapMode, tWrapMode, minFilterMode, maxFilterMode, anisotropy=1.0):
+    # wrapMode: GL_REPEAT, GL_CLAMP_TO_EDGE
+    # filterMode: GL_LINEAR, GL_NEAREST, or the MIPMAP ones for minFilterMode
+    texture = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, texture)
+
+    # texture wrapping params
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, sWrapMode)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, tWrapMode)
+
+    # texture filtering params
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, minFilterMode)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, maxFilterMode)
+
+    # Anisotropy over the driver maximum is clamped, and ignored without the extension
+    if anisotropy > 1.0 and _getMaxAnisotropy() > 1.0:
+        glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MAX_ANISOTROPY_EXT, min(anisotropy, _getMaxAnisotropy()))
+    return texture
+
+
+def _uploadImage(texture, image, mipmaps=False, maxLevel=None):
+    """Uploads the texels of _decodeImage to texture. Returns their size in bytes.
+    With mipmaps, the levels uncompressed texels lack are generated by OpenGL.
+    maxLevel limits the mipmap chain to the levels up to it, as GL_TEXTURE_MAX_LEVEL."""
+    levels, sizes, internalFormat = image
+    glBindTexture(GL_TEXTURE_2D, texture)
+
+    mipmapSizes = _mipmapSizes(*sizes[0])
+    if maxLevel is not None:
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, maxLevel)
+        levels, sizes, mipmapSizes = levels[:maxLevel + 1], sizes[:maxLevel + 1], mipmapSizes[:maxLevel + 1]
+
+    for level, (img_data, (width, height)) in enumerate(zip(levels, sizes)):
+        if internalFormat == GL_RGBA8:
+            glTexImage2D(GL_TEXTURE_2D, level, internalFormat, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, img_data)
+        else:
+            glCompressedTexImage2D(GL_TEXTURE_2D, level, internalFormat, width, height, 0,
+                                   np.ascontiguousarray(img_data))
+
+    size = sum(img_data.nbytes for img_data in levels)
+    if mipmaps and len(levels) == 1:
+        glGenerateMipmap(GL_TEXTURE_2D)
+        size = sum(width * height for width, height in mipmapSizes) * 4
+    return size
+
+
+def _uploadTexture(imgName, sWrapMode, tWrapMode, minFilterMode, maxFilterMode, anisotropy=1.0, cpuMipmaps=True,
+                   compress=False):
+    """Decodes imgName and uploads it to a new texture object. Returns the texture and its size in bytes."""
+    texture = _createTexture(sWrapMode, tWrapMode, minFilterMode, maxFilterMode, anisotropy)
+    mipmaps = _usesMipmaps(minFilterMode)
+    image = _decodeImage(imgName, mipmaps and (cpuMipmaps or compress), compress)
+    return texture, _uploadImage(texture, image, mipmaps)
+
+
+class TextureHandle(int):
+    """
+    A texture object of a TextureCache, used as the texture id itself (glBindTexture, GPUShape.texture...).
+    Each handle is one reference to the texture, release it instead of deleting the texture.
+    """
+
+    def __new__(cls, texture, cache, key, size):
+        handle = super().__new__(cls, texture)
+        handle.cache = cache
+        handle.key = key
+        handle.size = size
+        handle.loaded = True
+        return handle
+
+    def release(self):
+        self.cache.release(self)
+
+    def retain(self):
+        """One more reference to this texture, for another holder such as a second GPUShape. Returns self."""
+        return self.cache.retain(self)
+
+    def __copy__(self):
+        # Copies of a GPUShape share its texture, as with plain texture ids
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class TextureCacheStats:
+    """Counters of a TextureCache since it was created."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.residentBytes = 0
+        self.textures = 0
+
+    def hitRate(self):
+        requests = self.hits + self.misses
+        return self.hits / requests if requests > 0 else 0.0
+
+    def __str__(self):
+        return "textures=" + str(self.textures) + \
+               "  resident=" + "{:.1f}".format(self.residentBytes / (1024 * 1024)) + " MB" + \
+               "  hits=" + str(self.hits) + \
+               "  misses=" + str(self.misses) + \
+               "  evictions=" + str(self.evictions)
+
+
+class TextureCache:
+    """
+    Reference counted textures, keyed by (image path, wrap modes, filter modes, anisotropy).
+    budget is the GPU memory in bytes the textures may use before unreferenced ones are deleted.
+    Textures in use are never deleted, even over budget.
+    With compress=True, textures are S3TC compressed, taking 1/8 (BC1) or 1/4 (BC3) of the memory of RGBA,
+    when the driver supports it. Compressed mipmaps are always computed on the CPU.
+    """
+
+    def __init__(self, budget=DEFAULT_BUDGET, cpuMipmaps=True, compress=False):
+        self.budget = budget
+        self.stats = TextureCacheStats()
+
+        # Mipmaps computed on the CPU and kept in the assets cache, or generated by OpenGL after each upload
+        self.cpuMipmaps = cpuMipmaps
+        self.compress = compress
+
+        # Texture and number of references of each key, and the unreferenced keys, least recently released first
+        self.textures = {}
+        self.references = {}
+        self.unreferenced = collections.OrderedDict()
+
+    def acquire(self, imgName, sWrapMode, tWrapMode, minFilterMode, maxFilterMode, anisotropy=1.0,
+                placeholder=False):
+        """The texture for this image and sampling parameters, loaded only if it is not on the GPU yet.
+        As textures are shared, their parameters should not be modified after loading them.
+        A mipmap minFilterMode loads the complete mipmap chain, anisotropy over 1 enables anisotropic filtering.
+        With placeholder=True, a new texture only holds one placeholder texel, and its loaded attribute
+        is False until the image decoded elsewhere with decode is given to upload."""
+        key = (os.path.abspath(imgName), int(sWrapMode), int(tWrapMode), int(minFilterMode), int(maxFilterMode),
+               float(anisotropy))
+        self._checkCompression()
+
+        def load(texture):
+            if placeholder:
+                glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, 1, 1, 0, GL_RGBA, GL_UNSIGNED_BYTE, PLACEHOLDER_TEXEL)
+                return PLACEHOLDER_TEXEL.nbytes
+            return _uploadImage(texture, self.decode(imgName, minFilterMode), _usesMipmaps(minFilterMode))
+
+        return self._acquire(key, load, not placeholder)
+
+    def acquireImage(self, name, img_data, sWrapMode, tWrapMode, minFilterMode, maxFilterMode, anisotropy=1.0,
+                     maxLevel=None):
+        """As acquire, for an image already in memory, an uint8 (height, width, 3 or 4) array.
+        name identifies the image, as the path does for the files, and so its maxLevel: the last mipmap level
+        loaded, all of them if it is None."""
+        key = (name, int(sWrapMode), int(tWrapMode), int(minFilterMode), int(maxFilterMode), float(anisotropy))
+
+        self._checkCompression()
+
+        def load(texture):
+            mipmaps = _usesMipmaps(minFilterMode)
+            image = _texels(_convertImage(img_data, mipmaps and self._cpuMipmaps(), self.compress))
+            return _uploadImage(texture, image, mipmaps, maxLevel)
+
+        return self._acquire(key, load)
+
+    def _acquire(self, key, load, loaded=True):
+        # A new texture with the sampling parameters of the key is filled by load, which returns its size
+        if key in self.textures:
+            self.stats.hits += 1
+            self.unreferenced.pop(key, None)
+        else:
+            self.stats.misses += 1
+            texture = _createTexture(*key[1:])
+            size = load(texture)
+            self.textures[key] = TextureHandle(texture, self, key, size)
+            self.textures[key].loaded = loaded
+            self.references[key] = 0
+            self.stats.residentBytes += size
+            self.stats.textures += 1
+            self.evict()
+
+        self.references[key] += 1
+        return self.textures[key]
+
+    def decode(self, imgName, minFilterMode):
+        """The image as upload expects it for a texture with this minFilterMode.
+        It does not use OpenGL, so it may run in any thread."""
+        return _decodeImage(imgName, _usesMipmaps(minFilterMode) and self._cpuMipmaps(), self.compress)
+
+    def prepare(self, imgNames, minFilterMode=GL_LINEAR_MIPMAP_LINEAR):
+        """Converts the images into the assets cache ahead of time, as decode would, so even the first launch
+        only maps their texels. It does not use OpenGL: compress is kept even if the driver lacks S3TC."""
+        for imgName in imgNames:
+            self.decode(imgName, minFilterMode)
+
+    def _cpuMipmaps(self):
+        # OpenGL does not generate the mipmaps of compressed textures
+        return self.cpuMipmaps or self.compress
+
+    def _checkCompression(self):
+        # Checked in the OpenGL thread before loading, decode may run in the threads of grafica.texture_loader
+        if self.compress and not _supportsCompression():
+            self.compress = False
+
+    def upload(self, texture, image):
+        """Replaces the placeholder of texture, a handle from acquire(..., placeholder=True),
+        with an image given by decode. Textures already deleted are ignored."""
+        if self.textures.get(texture.key) is not texture or texture.loaded:
+            return
+
+        size = _uploadImage(texture, image, _usesMipmaps(texture.key[3]))
+        self.stats.residentBytes += size - texture.size
+        texture.size = size
+        texture.loaded = True
+        self.evict()
+
+    def retain(self, texture):
+        """Adds one reference to texture, a handle returned by acquire, which must be released too.
+        Textures already deleted are ignored. Returns texture."""
+        key = texture.key
+        if self.textures.get(key) is not texture:
+            return texture
+
+        self.references[key] += 1
+        self.unreferenced.pop(key, None)
+        return texture
+
+    def release(self, texture):
+        """Drops one reference to texture, a handle returned by acquire."""
+        key = texture.key
+        if self.references.get(key, 0) <= 0:
+            return
+
+        self.references[key] -= 1
+        if self.references[key] == 0:
+            self.unreferenced[key] = None
+            self.evict()
+
+    def evict(self):
+        """Deletes unreferenced textures, least recently released first, until the budget is met."""
+        while self.stats.residentBytes > self.budget and len(self.unreferenced) > 0:
+            key, _ = self.unreferenced.popitem(last=False)
+            self._delete(key)
+            self.stats.evictions += 1
+
+    def setBudget(self, budget):
+        self.budget = budget
+        self.evict()
+
+    def _delete(self, key):
+        texture = self.textures.pop(key)
+        del self.references[key]
+        glDeleteTextures(1, [int(texture)])
+        self.stats.residentBytes -= texture.size
+        self.stats.textures -= 1
+
+    def clear(self):
+        """Freeing GPU memory, every texture is deleted, even the ones in use"""
+        for key in list(self.textures):
+            self._delete(key)
+        self.unreferenced.clear()
+
+
+# Cache used by easy_shaders.textureSimpleSetup, created with the first texture
+_defaultCache = None
+
+
+def defaultCache():
+    """The cache shared by every texture loaded with easy_shaders.textureSimpleSetup."""
+    global _defaultCache
+    if _defaultCache is None:
+        _defaultCache = TextureCache()
+    return _defaultCache
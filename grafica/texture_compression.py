@@ -0,0 +1,117 @@
+# coding=utf-8
+"""
+Block compression (S3TC, also known as DXT or BCn) of RGBA images with NumPy, every block at once.
+Textures in these formats stay compressed on the GPU: BC1 takes 8 bytes per 4x4 block (0.5 bytes per texel),
+BC3 takes 16 (1 byte per texel), against 4 bytes per texel of RGBA.
+- BC1: two RGB565 end colors and a 2 bits index per texel into 4 colors interpolated between them.
+- BC3: a BC1 color block after an alpha block, with two end alphas and a 3 bits index per texel into 8 alphas.
+"""
+
+__all__ = ['compressBC1', 'compressBC3']
+
+import numpy as np
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+BLOCK_SIZE = 4
+
+
+def _blocks(img_data):
+    """(blocksY, blocksX, 16, channels) texels of the 4x4 blocks of img_data, repeating the last row and column
+    of images whose size is not a multiple of 4."""
+    height, width, channels = img_data.shape
+    blocksY = (height + BLOCK_SIZE - 1) // BLOCK_SIZE
+    blocksX = (width + BLOCK_SIZE - 1) // BLOCK_SIZE
+    padded = np.pad(img_data, ((0, blocksY * BLOCK_SIZE - height), (0, blocksX * BLOCK_SIZE - width), (0, 0)),
+                    mode='edge')
+    blocks = padded.reshape(blocksY, BLOCK_SIZE, blocksX, BLOCK_SIZE, channels).transpose(0, 2, 1, 3, 4)
+    return blocks.reshape(blocksY, blocksX, BLOCK_SIZE * BLOCK_SIZE, channels)
+
+
+def _to565(colors):
+    # colors are float RGB in [0, 255]
+    r = np.clip(np.rint(colors[..., 0] * 31 / 255), 0, 31).astype(np.uint16)
+    g = np.clip(np.rint(colors[..., 1] * 63 / 255), 0, 63).astype(np.uint16)
+    b = np.clip(np.rint(colors[..., 2] * 31 / 255), 0, 31).astype(np.uint16)
+    return (r << 11) | (g << 5) | b
+
+
+def _from565(packed):
+    r = (packed >> 11) & 31
+    g = (packed >> 5) & 63
+    b = packed & 31
+    return np.stack([r * 255 / 31, g * 255 / 63, b * 255 / 31], axis=-1).astype(np.float32)
+
+
+def _packIndices(indices, bits):
+    # Texel i of the block takes the bits from i * bits on
+    shifts = np.arange(indices.shape[-1], dtype=np.uint64) * np.uint64(bits)
+    return np.bitwise_or.reduce(indices.astype(np.uint64) << shifts, axis=-1)
+
+
+def _colorBlocks(blocks):
+    """(blocksY, blocksX, 8) uint8 BC1 blocks, in four colors mode, of the RGB texels of blocks."""
+    colors = blocks[..., 0:3].astype(np.float32)
+
+    # End colors are the extremes of the texels along their principal axis, found with a few power iterations
+    mean = colors.mean(axis=2, keepdims=True)
+    centered = colors - mean
+    covariance = np.einsum('...ti,...tj->...ij', centered, centered)
+    axis = np.ones(colors.shape[0:2] + (3,), dtype=np.float32)
+    for _ in range(4):
+        axis = np.einsum('...ij,...j->...i', covariance, axis)
+        axis /= np.maximum(np.linalg.norm(axis, axis=-1, keepdims=True), 1e-12)
+    projections = np.einsum('...ti,...i->...t', centered, axis)
+    end0 = mean[..., 0, :] + axis * projections.max(axis=-1, keepdims=True)
+    end1 = mean[..., 0, :] + axis * projections.min(axis=-1, keepdims=True)
+
+    # Four colors mode needs color0 > color1, equal end colors give a single color
+    color0 = _to565(end0)
+    color1 = _to565(end1)
+    swap = color0 < color1
+    color0, color1 = np.where(swap, color1, color0), np.where(swap, color0, color1)
+
+    c0 = _from565(color0)
+    c1 = _from565(color1)
+    palette = np.stack([c0, c1, (2 * c0 + c1) / 3, (c0 + 2 * c1) / 3], axis=2)
+    distances = np.sum((colors[..., :, np.newaxis, :] - palette[..., np.newaxis, :, :]) ** 2, axis=-1)
+    indices = np.argmin(distances, axis=-1)
+    indices[color0 == color1] = 0
+
+    encoded = np.empty(colors.shape[0:2] + (8,), dtype=np.uint8)
+    encoded[..., 0:2] = color0.astype('<u2')[..., np.newaxis].view(np.uint8).reshape(colors.shape[0:2] + (2,))
+    encoded[..., 2:4] = color1.astype('<u2')[..., np.newaxis].view(np.uint8).reshape(colors.shape[0:2] + (2,))
+    encoded[..., 4:8] = _packIndices(indices, 2).astype('<u4')[..., np.newaxis].view(np.uint8)
+    return encoded
+
+
+def _alphaBlocks(blocks):
+    """(blocksY, blocksX, 8) uint8 BC3 alpha blocks, in eight alphas mode, of the alpha of blocks."""
+    alpha = blocks[..., 3].astype(np.int32)
+    alpha0 = alpha.max(axis=-1)
+    alpha1 = alpha.min(axis=-1)
+
+    # Alphas 0 and 1 are the ends, 2 to 7 are interpolated between them
+    weights = np.array([7, 0, 6, 5, 4, 3, 2, 1], dtype=np.int32)
+    palette = (weights * alpha0[..., np.newaxis] + (7 - weights) * alpha1[..., np.newaxis] + 3) // 7
+    indices = np.argmin(np.abs(alpha[..., :, np.newaxis] - palette[..., np.newaxis, :]), axis=-1)
+
+    encoded = np.empty(alpha.shape[0:2] + (8,), dtype=np.uint8)
+    encoded[..., 0] = alpha0
+    encoded[..., 1] = alpha1
+    encoded[..., 2:8] = _packIndices(indices, 3).astype('<u8')[..., np.newaxis].view(np.uint8)[..., 0:6]
+    return encoded
+
+
+def compressBC1(img_data):
+    """BC1 blocks of img_data, an uint8 (height, width, 3 or 4) array, ignoring its alpha.
+    Returns a (blocksY, blocksX, 8) uint8 array, the data of glCompressedTexImage2D."""
+    return _colorBlocks(_blocks(img_data))
+
+
+def compressBC3(img_data):
+    """BC3 blocks of img_data, an uint8 (height, width, 4) array.
+    Returns a (blocksY, blocksX, 16) uint8 array, the data of glCompressedTexImage2D."""
+    blocks = _blocks(img_data)
+    return np.concatenate([_alphaBlocks(blocks), _colorBlocks(blocks)], axis=-1)
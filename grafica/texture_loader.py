@@ -0,0 +1,119 @@
+# coding=utf-8
+"""
+Asynchronous texture loading. Images are decoded in a pool of threads (PIL releases the GIL while decoding),
+while OpenGL calls stay in the main thread: each frame, update uploads the images already decoded,
+up to a budget of bytes, so loading many textures does not stall the rendering.
+Textures are usable right away, they show a placeholder texel until their image is uploaded.
+"""
+
+__all__ = ['AsyncTextureLoader', 'defaultLoader']
+
+import concurrent.futures
+import logging
+import time
+import grafica.texture_cache as tc
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+DEFAULT_UPLOAD_BUDGET = 4 * 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTextureLoader:
+    """
+    Loads the textures of a TextureCache in the background.
+    workers is the number of decoding threads (None, as concurrent.futures decides),
+    uploadBudget the bytes uploaded by each call to update. At least one image is uploaded per call.
+    """
+
+    def __init__(self, cache=None, workers=None, uploadBudget=DEFAULT_UPLOAD_BUDGET):
+        self.cache = tc.defaultCache() if cache is None else cache
+        self.uploadBudget = uploadBudget
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers,
+                                                              thread_name_prefix="texture_loader")
+
+        # Textures waiting for their image, with its decoding, in the order they were requested
+        self.pending = {}
+
+        # Images uploaded by the last update, and the time it took
+        self.uploaded = 0
+        self.uploadTime = 0.0
+
+    def load(self, imgName, sWrapMode, tWrapMode, minFilterMode, maxFilterMode, anisotropy=1.0):
+        """
+        As TextureCache.acquire, but returning without waiting for the image.
+        The texture shows a placeholder until update uploads it. Its future attribute is a
+        concurrent.futures.Future resolved with the texture when it is loaded, or with the decoding error.
+        """
+        texture = self.cache.acquire(imgName, sWrapMode, tWrapMode, minFilterMode, maxFilterMode, anisotropy,
+                                     placeholder=True)
+
+        if not hasattr(texture, "future"):
+            texture.future = concurrent.futures.Future()
+            if texture.loaded:
+                texture.future.set_result(texture)
+
+        if not texture.loaded and texture.key not in self.pending:
+            # The loader keeps its own reference, so the texture is not evicted while its image is decoded
+            self.cache.acquire(imgName, sWrapMode, tWrapMode, minFilterMode, maxFilterMode, anisotropy)
+            self.pending[texture.key] = (texture, self.executor.submit(self.cache.decode, imgName, minFilterMode))
+
+        return texture
+
+    def update(self, budget=None):
+        """Uploads decoded images until the budget of this call is spent, by default uploadBudget bytes.
+        To be called once per frame. Returns the number of textures still waiting."""
+        t0 = time.perf_counter()
+        self.uploaded = 0
+        budget = self.uploadBudget if budget is None else budget
+
+        for key, (texture, decoding) in list(self.pending.items()):
+            if budget <= 0:
+                break
+            if not decoding.done():
+                continue
+
+            del self.pending[key]
+            try:
+                self.cache.upload(texture, decoding.result())
+            except Exception as error:
+                # The texture keeps its placeholder, as textureSimpleSetup would have raised this
+                logger.warning("Texture %s could not be loaded: %s", key[0], error)
+                texture.future.set_exception(error)
+            else:
+                budget -= texture.size
+                self.uploaded += 1
+                texture.future.set_result(texture)
+            texture.release()
+
+        self.uploadTime = time.perf_counter() - t0
+        return len(self.pending)
+
+    def wait(self):
+        """Blocks until every pending texture is uploaded."""
+        while self.pending:
+            concurrent.futures.wait([decoding for _, decoding in self.pending.values()],
+                                    return_when=concurrent.futures.FIRST_COMPLETED)
+            self.update(float("inf"))
+
+    def clear(self):
+        """Stops the decoding threads, pending textures keep their placeholder"""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        for texture, decoding in self.pending.values():
+            texture.future.cancel()
+            texture.release()
+        self.pending.clear()
+
+
+# Loader used by easy_shaders.textureAsyncSetup, created with the first texture
+_defaultLoader = None
+
+
+def defaultLoader():
+    """The loader of easy_shaders.textureAsyncSetup, over the default TextureCache."""
+    global _defaultLoader
+    if _defaultLoader is None:
+        _defaultLoader = AsyncTextureLoader()
+    return _defaultLoader
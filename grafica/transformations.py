@@ -5,82 +5,117 @@ Transformation matrices for computer graphics.
 
 __all__ = [
     'frustum',
+    'frustumPlanes',
+    'identities',
     'identity',
     'lookAt',
     'matmul',
+    'matmulStacks',
     'ortho',
     'perspective',
     'rotationA',
     'rotationAxis',
+    'rotationsA',
+    'rotationsX',
+    'rotationsY',
+    'rotationsZ',
     'rotationX',
     'rotationY',
     'rotationZ',
     'scale',
+    'scales',
     'shearing',
+    'shearings',
     'translate',
-    'uniformScale'
+    'translations',
+    'trs',
+    'uniformScale',
+    'uniformScales'
 ]
 
+import math
 import numpy as np
 
 __author__ = "Daniel Calderon"
 __license__ = "MIT"
 
+# Every function building a single matrix accepts an optional out, a 4x4 float32 array where the
+# matrix is written (and returned) instead of allocating a new one. Reusing these buffers on every
+# frame avoids creating new NumPy arrays in the render loop.
 
-def identity():
-    return np.identity(4, dtype=np.float32)
 
+def _matrix(out, rows):
+    if out is None:
+        return np.array(rows, dtype=np.float32)
 
-def uniformScale(s):
-    return np.array([
+    # Element by element, so no temporary array is created
+    for i in range(4):
+        row = rows[i]
+        for j in range(4):
+            out[i, j] = row[j]
+    return out
+
+
+def identity(out=None):
+    if out is None:
+        return np.identity(4, dtype=np.float32)
+
+    out.fill(0)
+    for i in range(4):
+        out[i, i] = 1
+    return out
+
+
+def uniformScale(s, out=None):
+    return _matrix(out, [
         [s, 0, 0, 0],
         [0, s, 0, 0],
         [0, 0, s, 0],
-        [0, 0, 0, 1]], dtype=np.float32)
+        [0, 0, 0, 1]])
 
 
-def scale(sx, sy, sz):
-    return np.array([
+def scale(sx, sy, sz, out=None):
+    return _matrix(out, [
         [sx, 0, 0, 0],
         [0, sy, 0, 0],
         [0, 0, sz, 0],
-        [0, 0, 0, 1]], dtype=np.float32)
+        [0, 0, 0, 1]])
 
 
-def rotationX(theta):
+def rotationX(theta, out=None):
     sin_theta = np.sin(theta)
     cos_theta = np.cos(theta)
 
-    return np.array([
+    return _matrix(out, [
         [1, 0, 0, 0],
         [0, cos_theta, -sin_theta, 0],
         [0, sin_theta, cos_theta, 0],
-        [0, 0, 0, 1]], dtype=np.float32)
+        [0, 0, 0, 1]])
 
 
-def rotationY(theta):
+def rotationY(theta, out=None):
     sin_theta = np.sin(theta)
     cos_theta = np.cos(theta)
 
-    return np.array([
+    return _matrix(out, [
         [cos_theta, 0, sin_theta, 0],
         [0, 1, 0, 0],
         [-sin_theta, 0, cos_theta, 0],
-        [0, 0, 0, 1]], dtype=np.float32)
+        [0, 0, 0, 1]])
 
 
-def rotationZ(theta):
+def rotationZ(theta, out=None):
     sin_theta = np.sin(theta)
     cos_theta = np.cos(theta)
 
-    return np.array([
+    return _matrix(out, [
         [cos_theta, -sin_theta, 0, 0],
         [sin_theta, cos_theta, 0, 0],
         [0, 0, 1, 0],
-        [0, 0, 0, 1]], dtype=np.float32)
+        [0, 0, 0, 1]])
 
 
-def rotationA(theta, axis):
+def rotationA(theta, axis, out=None):
     s = np.sin(theta)
     c = np.cos(theta)
 
@@ -90,7 +125,7 @@ def rotationA(theta, axis):
     y = axis[1]
     z = axis[2]
 
-    return np.array([
+    return _matrix(out, [
         # First row
         [c + (1 - c) * x * x,
          (1 - c) * x * y - s * z,
@@ -107,7 +142,7 @@ def rotationA(theta, axis):
          c + (1 - c) * z * z,
          0],
         # Fourth row
-        [0, 0, 0, 1]], dtype=np.float32)
+        [0, 0, 0, 1]])
 
 
 def rotationAxis(theta, point1, point2):
@@ -148,35 +183,58 @@ def rotationAxis(theta, point1, point2):
     return matmul([Tinv, Ryinv, Rzinv, Rx, Rz, Ry, T])
 
 
-def translate(tx, ty, tz):
-    return np.array([
+def translate(tx, ty, tz, out=None):
+    return _matrix(out, [
         [1, 0, 0, tx],
         [0, 1, 0, ty],
         [0, 0, 1, tz],
-        [0, 0, 0, 1]], dtype=np.float32)
+        [0, 0, 0, 1]])
 
 
-def shearing(xy, yx, xz, zx, yz, zy):
-    return np.array([
+def shearing(xy, yx, xz, zx, yz, zy, out=None):
+    return _matrix(out, [
         [1, xy, xz, 0],
         [yx, 1, yz, 0],
         [zx, zy, 1, 0],
-        [0, 0, 0, 1]], dtype=np.float32)
+        [0, 0, 0, 1]])
 
 
-def matmul(mats):
-    out = mats[0]
+def matmul(mats, out=None, scratch=None):
+    if out is None:
+        out = mats[0]
+        for i in range(1, len(mats)):
+            out = np.matmul(out, mats[i])
+
+        return out
+
+    # Products alternate between out and a scratch matrix, so that the last one is written to out.
+    # The scratch matrix is given by the caller, to reuse it as out, or allocated here: a shared one
+    # would be overwritten by calls from other threads.
+    # NumPy only protects each single product, a factor after the first one may be out or scratch,
+    # and it would be overwritten by an earlier product before being read: it is copied first.
+    if len(mats) == 1:
+        out[...] = mats[0]
+        return out
+
+    if scratch is None:
+        scratch = np.empty_like(out)
+
+    mats = [mats[0]] + [np.copy(mat) if mat is out or mat is scratch else mat for mat in mats[1:]]
+
+    previous = mats[0]
     for i in range(1, len(mats)):
-        out = np.matmul(out, mats[i])
+        destination = out if (len(mats) - 1 - i) % 2 == 0 else scratch
+        np.matmul(previous, mats[i], out=destination)
+        previous = destination
 
     return out
 
 
-def frustum(left, right, bottom, top, near, far):
+def frustum(left, right, bottom, top, near, far, out=None):
     r_l = right - left
     t_b = top - bottom
     f_n = far - near
-    return np.array([
+    return _matrix(out, [
         [2 * near / r_l,
          0,
          (right + left) / r_l,
@@ -192,20 +250,29 @@ def frustum(left, right, bottom, top, near, far):
         [0,
          0,
          -1,
-         0]], dtype=np.float32)
+         0]])
 
 
-def perspective(fovy, aspect, near, far):
+def frustumPlanes(viewProjection):
+    """
+    The 6 planes (left, right, bottom, top, near, far) of the frustum of a projection @ view matrix,
+    as a (6, 4) array: each plane (a, b, c, d) keeps inside the points with a*x + b*y + c*z + d >= 0.
+    """
+    m = np.asarray(viewProjection, dtype=np.float64)
+    return np.array([m[3] + m[0], m[3] - m[0], m[3] + m[1], m[3] - m[1], m[3] + m[2], m[3] - m[2]])
+
+
+def perspective(fovy, aspect, near, far, out=None):
     halfHeight = np.tan(np.pi * fovy / 360) * near
     halfWidth = halfHeight * aspect
-    return frustum(-halfWidth, halfWidth, -halfHeight, halfHeight, near, far)
+    return frustum(-halfWidth, halfWidth, -halfHeight, halfHeight, near, far, out)
 
 
-def ortho(left, right, bottom, top, near, far):
+def ortho(left, right, bottom, top, near, far, out=None):
     r_l = right - left
     t_b = top - bottom
     f_n = far - near
-    return np.array([
+    return _matrix(out, [
         [2 / r_l,
          0,
          0,
@@ -221,22 +288,180 @@ def ortho(left, right, bottom, top, near, far):
         [0,
          0,
          0,
-         1]], dtype=np.float32)
+         1]])
 
 
-def lookAt(eye, at, up):
-    forward = (at - eye)
-    forward = forward / np.linalg.norm(forward)
+def lookAt(eye, at, up, out=None):
+    # Computed component by component, eye, at and up may be any sequence of 3 numbers
+    ex, ey, ez = float(eye[0]), float(eye[1]), float(eye[2])
+    ux, uy, uz = float(up[0]), float(up[1]), float(up[2])
 
-    side = np.cross(forward, up)
-    side = side / np.linalg.norm(side)
+    fx, fy, fz = float(at[0]) - ex, float(at[1]) - ey, float(at[2]) - ez
+    norm = math.sqrt(fx * fx + fy * fy + fz * fz)
+    fx, fy, fz = fx / norm, fy / norm, fz / norm
 
-    newUp = np.cross(side, forward)
-    newUp = newUp / np.linalg.norm(newUp)
+    # side = forward x up
+    sx, sy, sz = fy * uz - fz * uy, fz * ux - fx * uz, fx * uy - fy * ux
+    norm = math.sqrt(sx * sx + sy * sy + sz * sz)
+    sx, sy, sz = sx / norm, sy / norm, sz / norm
 
-    return np.array([
-        [side[0], side[1], side[2], -np.dot(side, eye)],
-        [newUp[0], newUp[1], newUp[2], -np.dot(newUp, eye)],
-        [-forward[0], -forward[1], -forward[2], np.dot(forward, eye)],
+    # newUp = side x forward
+    nx, ny, nz = sy * fz - sz * fy, sz * fx - sx * fz, sx * fy - sy * fx
+    norm = math.sqrt(nx * nx + ny * ny + nz * nz)
+    nx, ny, nz = nx / norm, ny / norm, nz / norm
+
+    return _matrix(out, [
+        [sx, sy, sz, -(sx * ex + sy * ey + sz * ez)],
+        [nx, ny, nz, -(nx * ex + ny * ey + nz * ez)],
+        [-fx, -fy, -fz, fx * ex + fy * ey + fz * ez],
         [0, 0, 0, 1]
-    ], dtype=np.float32)
+    ])
+
+
+def trs(tx, ty, tz, theta, axis, sx, sy, sz, out=None):
+    """
+    Same as matmul([translate(tx, ty, tz), rotationA(theta, axis), scale(sx, sy, sz)]), up to rounding,
+    built directly: no intermediate matrix is created.
+    """
+    s = math.sin(theta)
+    c = math.cos(theta)
+    x, y, z = float(axis[0]), float(axis[1]), float(axis[2])
+
+    return _matrix(out, [
+        [(c + (1 - c) * x * x) * sx,
+         ((1 - c) * x * y - s * z) * sy,
+         ((1 - c) * x * z + s * y) * sz,
+         tx],
+        [((1 - c) * x * y + s * z) * sx,
+         (c + (1 - c) * y * y) * sy,
+         ((1 - c) * y * z - s * x) * sz,
+         ty],
+        [((1 - c) * x * z - s * y) * sx,
+         ((1 - c) * y * z + s * x) * sy,
+         (c + (1 - c) * z * z) * sz,
+         tz],
+        [0, 0, 0, 1]])
+
+
+# Batched versions: each parameter is a scalar or an array of N values (broadcast together),
+# and the result is a (N, 4, 4) float32 stack with one matrix per parameter set.
+def _broadcast(*params):
+    params = np.broadcast_arrays(*[np.asarray(param, dtype=np.float64) for param in params])
+    return [param.reshape(-1) for param in params]
+
+
+def identities(n):
+    return np.tile(np.identity(4, dtype=np.float32), (n, 1, 1))
+
+
+def uniformScales(s):
+    s, = _broadcast(s)
+    out = identities(len(s))
+    out[:, 0, 0] = s
+    out[:, 1, 1] = s
+    out[:, 2, 2] = s
+    return out
+
+
+def scales(sx, sy, sz):
+    sx, sy, sz = _broadcast(sx, sy, sz)
+    out = identities(len(sx))
+    out[:, 0, 0] = sx
+    out[:, 1, 1] = sy
+    out[:, 2, 2] = sz
+    return out
+
+
+def rotationsX(theta):
+    theta, = _broadcast(theta)
+    sin_theta = np.sin(theta)
+    cos_theta = np.cos(theta)
+
+    out = identities(len(theta))
+    out[:, 1, 1] = cos_theta
+    out[:, 1, 2] = -sin_theta
+    out[:, 2, 1] = sin_theta
+    out[:, 2, 2] = cos_theta
+    return out
+
+
+def rotationsY(theta):
+    theta, = _broadcast(theta)
+    sin_theta = np.sin(theta)
+    cos_theta = np.cos(theta)
+
+    out = identities(len(theta))
+    out[:, 0, 0] = cos_theta
+    out[:, 0, 2] = sin_theta
+    out[:, 2, 0] = -sin_theta
+    out[:, 2, 2] = cos_theta
+    return out
+
+
+def rotationsZ(theta):
+    theta, = _broadcast(theta)
+    sin_theta = np.sin(theta)
+    cos_theta = np.cos(theta)
+
+    out = identities(len(theta))
+    out[:, 0, 0] = cos_theta
+    out[:, 0, 1] = -sin_theta
+    out[:, 1, 0] = sin_theta
+    out[:, 1, 1] = cos_theta
+    return out
+
+
+def rotationsA(theta, axis):
+    """axis is a single (3,) axis, or a (N, 3) array with one axis per rotation."""
+    axis = np.asarray(axis, dtype=np.float64)
+    assert axis.shape[-1] == 3
+
+    theta, x, y, z = _broadcast(theta, axis[..., 0], axis[..., 1], axis[..., 2])
+    s = np.sin(theta)
+    c = np.cos(theta)
+
+    out = identities(len(theta))
+    # First row
+    out[:, 0, 0] = c + (1 - c) * x * x
+    out[:, 0, 1] = (1 - c) * x * y - s * z
+    out[:, 0, 2] = (1 - c) * x * z + s * y
+    # Second row
+    out[:, 1, 0] = (1 - c) * x * y + s * z
+    out[:, 1, 1] = c + (1 - c) * y * y
+    out[:, 1, 2] = (1 - c) * y * z - s * x
+    # Third row
+    out[:, 2, 0] = (1 - c) * x * z - s * y
+    out[:, 2, 1] = (1 - c) * y * z + s * x
+    out[:, 2, 2] = c + (1 - c) * z * z
+    return out
+
+
+def translations(tx, ty, tz):
+    tx, ty, tz = _broadcast(tx, ty, tz)
+    out = identities(len(tx))
+    out[:, 0, 3] = tx
+    out[:, 1, 3] = ty
+    out[:, 2, 3] = tz
+    return out
+
+
+def shearings(xy, yx, xz, zx, yz, zy):
+    xy, yx, xz, zx, yz, zy = _broadcast(xy, yx, xz, zx, yz, zy)
+    out = identities(len(xy))
+    out[:, 0, 1] = xy
+    out[:, 0, 2] = xz
+    out[:, 1, 0] = yx
+    out[:, 1, 2] = yz
+    out[:, 2, 0] = zx
+    out[:, 2, 1] = zy
+    return out
+
+
+def matmulStacks(mats):
+    """Composes a list of (N, 4, 4) stacks and single 4x4 matrices, as matmul does with single matrices.
+    Single matrices are broadcast, so they are applied to every element of the stacks."""
+    out = mats[0]
+    for i in range(1, len(mats)):
+        out = np.matmul(out, mats[i])
+
+    return out
@@ -0,0 +1,156 @@
+# coding=utf-8
+"""
+Uniform buffer objects with std140 layout, holding the camera and lighting parameters shared by every
+pipeline which declares the Camera and Lighting uniform blocks. They are written once per frame,
+instead of setting each uniform of each shader program.
+"""
+
+__all__ = ['CAMERA_BINDING', 'CAMERA_FIELDS', 'cameraBlock', 'LIGHTING_BINDING', 'LIGHTING_FIELDS',
+           'lightingBlock', 'UniformBlock']
+
+from OpenGL.GL import *
+import numpy as np
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+# Binding points of the shared blocks
+CAMERA_BINDING = 0
+LIGHTING_BINDING = 1
+
+# Fields of each block, in the order they are declared in the shaders:
+#   layout(std140, row_major) uniform Camera { ... };
+# Matrices are row_major, so ours are stored as they are
+CAMERA_FIELDS = [
+    ("projection", "mat4"),
+    ("view", "mat4"),
+    ("viewPosition", "vec3"),
+]
+
+LIGHTING_FIELDS = [
+    ("lightPosition", "vec3"),
+    ("La", "vec3"),
+    ("Ld", "vec3"),
+    ("Ls", "vec3"),
+    ("Ka", "vec3"),
+    ("Kd", "vec3"),
+    ("Ks", "vec3"),
+    ("shininess", "uint"),
+    ("constantAttenuation", "float"),
+    ("linearAttenuation", "float"),
+    ("quadraticAttenuation", "float"),
+]
+
+# std140 base alignment, size in bytes, numpy type and shape of each GLSL type
+STD140_TYPES = {
+    "float": (4, 4, np.float32, ()),
+    "int": (4, 4, np.int32, ()),
+    "uint": (4, 4, np.uint32, ()),
+    "vec2": (8, 8, np.float32, (2,)),
+    "vec3": (16, 12, np.float32, (3,)),
+    "vec4": (16, 16, np.float32, (4,)),
+    "mat4": (16, 64, np.float32, (4, 4)),
+}
+
+
+def _std140Offsets(fields):
+    """Offset of each field and the total size of a block with std140 layout."""
+    offsets = {}
+    offset = 0
+    for name, glslType in fields:
+        alignment, size, _, _ = STD140_TYPES[glslType]
+        offset = (offset + alignment - 1) // alignment * alignment
+        offsets[name] = offset
+        offset += size
+
+    # The size of a block is rounded up to a multiple of the alignment of a vec4
+    return offsets, (offset + 15) // 16 * 16
+
+
+class UniformBlock:
+    """
+    A uniform buffer object bound to a binding point. Fields are written to a CPU side copy with set,
+    and sent with a single glBufferSubData by upload.
+    """
+
+    def __init__(self, name, fields, binding):
+        self.name = name
+        self.binding = binding
+
+        offsets, self.size = _std140Offsets(fields)
+        self.data = np.zeros(self.size, dtype=np.uint8)
+
+        # Each field is a numpy view over its bytes in data
+        self.fields = {}
+        for fieldName, glslType in fields:
+            _, size, dtype, shape = STD140_TYPES[glslType]
+            offset = offsets[fieldName]
+            self.fields[fieldName] = self.data[offset:offset + size].view(dtype).reshape(shape)
+
+        self.dirty = True
+        self.uploads = 0
+
+        self.buffer = glGenBuffers(1)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.buffer)
+        glBufferData(GL_UNIFORM_BUFFER, self.size, None, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        glBindBufferBase(GL_UNIFORM_BUFFER, self.binding, self.buffer)
+
+    def __contains__(self, name):
+        return name in self.fields
+
+    def set(self, name, value):
+        """Writes a field in the CPU side copy, it reaches the shaders after upload."""
+        # Compared as stored, float64 values would never match their float32 copy
+        field = self.fields[name]
+        if np.array_equal(field, np.asarray(value, dtype=field.dtype)):
+            return
+        field[...] = value
+        self.dirty = True
+
+    def get(self, name):
+        return self.fields[name]
+
+    def upload(self):
+        """Sends the whole block with a single call, only if some field changed since the last upload."""
+        if not self.dirty:
+            return
+
+        # Shaders read the buffer through its binding point, the generic binding is left as it is
+        glBindBuffer(GL_UNIFORM_BUFFER, self.buffer)
+        glBufferSubData(GL_UNIFORM_BUFFER, 0, self.size, self.data)
+        self.dirty = False
+        self.uploads += 1
+
+    def bindProgram(self, shaderProgram):
+        """Connects the block with this name in shaderProgram to our binding point, if it is declared there."""
+        index = glGetUniformBlockIndex(shaderProgram, self.name)
+        if index == GL_INVALID_INDEX:
+            return False
+
+        glUniformBlockBinding(shaderProgram, index, self.binding)
+        return True
+
+    def clear(self):
+        """Freeing GPU memory"""
+        glDeleteBuffers(1, [self.buffer])
+
+
+# Blocks shared by every pipeline, created with the first pipeline using them
+_sharedBlocks = {}
+
+
+def _sharedBlock(name, fields, binding):
+    if name not in _sharedBlocks:
+        _sharedBlocks[name] = UniformBlock(name, fields, binding)
+    return _sharedBlocks[name]
+
+
+def cameraBlock():
+    """The Camera block shared by every pipeline: projection, view and viewPosition."""
+    return _sharedBlock("Camera", CAMERA_FIELDS, CAMERA_BINDING)
+
+
+def lightingBlock():
+    """The Lighting block shared by every pipeline: light, material and attenuation parameters."""
+    return _sharedBlock("Lighting", LIGHTING_FIELDS, LIGHTING_BINDING)
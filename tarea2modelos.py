@@ -17,6 +17,8 @@ import grafica.easy_shaders as es
 import grafica.lighting_shaders as ls
 from grafica.assets_path import getAssetPath
 import grafica.scene_graph as sg
+import grafica.assets_cache as ac
+import grafica.texture_cache as tc
 
 
 
@@ -29,75 +31,9 @@ def createGPUShape(pipeline, shape):
     return gpuShape
 
 
-def readFaceVertex(faceDescription):
-    aux = faceDescription.split('/')
-
-    assert len(aux[0]), "Vertex index has not been defined."
-
-    faceVertex = [int(aux[0]), None, None]
-
-    assert len(aux) == 3, "Only faces where its vertices require 3 indices are defined."
-
-    if len(aux[1]) != 0:
-        faceVertex[1] = int(aux[1])
-
-    if len(aux[2]) != 0:
-        faceVertex[2] = int(aux[2])
-
-    return faceVertex
-
-
 def readOBJ(filename):
-    vertices = []
-    normals = []
-    textCoords = []
-    faces = []
-
-    with open(filename, 'r') as file:
-        for line in file.readlines():
-            aux = line.strip().split(' ')
-
-            if aux[0] == 'v':
-                vertices += [[float(coord) for coord in aux[1:]]]
-
-            elif aux[0] == 'vn':
-                normals += [[float(coord) for coord in aux[1:]]]
-
-            elif aux[0] == 'vt':
-                assert len(aux[1:]) == 2, "Texture coordinates with different than 2 dimensions are not supported"
-                textCoords += [[float(coord) for coord in aux[1:]]]
-
-            elif aux[0] == 'f':
-                N = len(aux)
-                faces += [[readFaceVertex(faceVertex) for faceVertex in aux[1:4]]]
-                for i in range(3, N - 1):
-                    faces += [[readFaceVertex(faceVertex) for faceVertex in [aux[i], aux[i + 1], aux[1]]]]
-
-        vertexData = []
-        indices = []
-        index = 0
-
-        # Per previous construction, each face is a triangle
-        for face in faces:
-
-            # Checking each of the triangle vertices
-            for i in range(0, 3):
-                vertex = vertices[face[i][0] - 1]
-                textCoord = textCoords[face[i][1] - 1]
-                normal = normals[face[i][2] - 1]
-
-
-                vertexData += [
-                    vertex[0], vertex[1], vertex[2],
-                    textCoord[0], textCoord[1],
-                    normal[0], normal[1], normal[2]
-                ]
-
-            # Connecting the 3 vertices to create a triangle
-            indices += [index, index + 1, index + 2]
-            index += 3
-
-        return bs.Shape(vertexData, indices)
+    # The parsing is done in bulk with NumPy, see grafica.basic_shapes.readOBJ
+    return bs.readOBJ(filename)
 
 
 
@@ -106,8 +42,9 @@ def create_floor(pipeline):
     shapeFloor = bs.createTextureQuadWithNormal(8, 8)
     gpuFloor = es.GPUShape().initBuffers()
     pipeline.setupVAO(gpuFloor)
-    gpuFloor.texture = es.textureSimpleSetup(
-        getAssetPath("grass.jfif"), GL_REPEAT, GL_REPEAT, GL_LINEAR, GL_LINEAR)
+    # The floor is seen at grazing angles, anisotropic filtering keeps it sharp without aliasing
+    gpuFloor.texture = es.textureAsyncSetup(
+        getAssetPath("grass.jfif"), GL_REPEAT, GL_REPEAT, *tc.ANISOTROPIC)
     gpuFloor.fillBuffers(shapeFloor.vertices, shapeFloor.indices, GL_STATIC_DRAW)
 
     floor = sg.SceneGraphNode("floor")
@@ -276,15 +213,24 @@ def createEmpireState(object):
   return empireState
   
   
-def createBurjAlArab(object, pipeline):
+def createTexturedGPUShape(pipeline, shape, imgName, atlas=None):
+  # With an atlas holding imgName, the shape samples its region of the atlas texture
+  if atlas is None:
+    gpuShape = createGPUShape(pipeline, shape)
+    gpuShape.texture = es.textureAsyncSetup(imgName, GL_REPEAT, GL_REPEAT, *tc.TRILINEAR)
+  else:
+    gpuShape = createGPUShape(pipeline, atlas.remapShape(shape, imgName, 8))
+    gpuShape.texture = atlas.texture(*tc.TRILINEAR)
+  return gpuShape
+
+
+def createBurjAlArab(object, pipeline, atlas=None):
   
-  shapeBase = readOBJ(getAssetPath('cilinder_triangle_base.obj'))
-  gpuBase = createGPUShape(pipeline, shapeBase)
-  gpuBase.texture = es.textureSimpleSetup(getAssetPath("dice5.jpg"), GL_REPEAT, GL_REPEAT, GL_LINEAR, GL_LINEAR)
+  shapeBase = ac.getCachedShape(getAssetPath('cilinder_triangle_base.obj'), bs.readOBJ)
+  gpuBase = createTexturedGPUShape(pipeline, shapeBase, getAssetPath("dice5.jpg"), atlas)
   
-  shape2Base = readOBJ(getAssetPath('bender_pillar.obj'))
-  gpu2Base = createGPUShape(pipeline, shape2Base)
-  gpu2Base.texture = es.textureSimpleSetup(getAssetPath("dice6.jpg"), GL_REPEAT, GL_REPEAT, GL_LINEAR, GL_LINEAR)
+  shape2Base = ac.getCachedShape(getAssetPath('bender_pillar.obj'), bs.readOBJ)
+  gpu2Base = createTexturedGPUShape(pipeline, shape2Base, getAssetPath("dice6.jpg"), atlas)
   
   
   left_pillar = sg.SceneGraphNode("left_pillar")